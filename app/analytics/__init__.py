@@ -1 +1,7 @@
-from .probability import estimate_success_prob  # noqa: F401
+from .award_sim import AwardSimulation, simulate_awards  # noqa: F401
+from .probability import (  # noqa: F401
+    AwardHistory,
+    AwardHistoryStore,
+    estimate_layer_probs,
+    estimate_success_prob,
+)
@@ -0,0 +1,190 @@
+"""Seniority-ordered replay of PBS awards for a whole base.
+
+PBS processes bids from the most senior pilot down, so a pairing a junior
+pilot ranks highly may already be gone by the time their bid is read. The
+simulator replays that: each pilot, in descending ``seniority_percentile``,
+walks their optimizer top-K and claims every pairing that still has
+capacity, fits their calendar and keeps their line under its credit target.
+"""
+
+from __future__ import annotations
+
+import math
+from collections.abc import Sequence
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+from app.models import BatchPilot, FeatureBundle
+from app.services.batch import optimize_batch
+from app.services.optimizer import ScoringPlan
+from app.services.pairing_frame import pairing_field
+from app.services.pairing_repo import pairing_frame_for, pairings_of
+
+DEFAULT_LINE_CREDIT = 75.0
+DEFAULT_SPREAD = 0.05
+
+
+class AwardSimulation(BaseModel):
+    """Outcome of :func:`simulate_awards`.
+
+    ``cutoffs`` maps every pairing whose capacity ran out to the seniority
+    percentile of the last pilot awarded it; pairings never exhausted are
+    open to everyone and have no cutoff. ``next_cutoffs`` maps an exhausted
+    pairing to the seniority of the first pilot turned away from it who
+    could otherwise have flown it: the cutoff its awardees are measured
+    against, absent when nobody else wanted it. ``probabilities`` holds, per
+    pilot, the estimated award odds of each of their top-K pairings.
+    """
+
+    order: list[str]
+    awards: dict[str, list[str]]
+    probabilities: dict[str, dict[str, float]]
+    cutoffs: dict[str, float]
+    next_cutoffs: dict[str, float] = {}
+
+
+def award_probability(
+    seniority: float, cutoff: Optional[float], spread: float = DEFAULT_SPREAD
+) -> float:
+    """Odds that a pilot at ``seniority`` holds a pairing going to ``cutoff``.
+
+    A logistic curve centred on the cutoff; ``spread`` is the percentile
+    distance over which the odds move from ~27% to ~73%.
+    """
+
+    if cutoff is None:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-(seniority - cutoff) / spread))
+
+
+def simulate_awards(
+    pairing_features: dict[str, Any],
+    pilots: Sequence[BatchPilot],
+    K: int = 50,
+    analytics_features: Optional[dict[str, Any]] = None,
+    workers: Optional[int] = None,
+    spread: float = DEFAULT_SPREAD,
+) -> AwardSimulation:
+    """Replay awards for ``pilots`` bidding on one shared packet.
+
+    Top-K lists come from :func:`app.services.batch.optimize_batch` (nothing
+    is persisted). Each pairing starts with ``capacity`` seats (default 1)
+    tracked in a per-row remaining counter, and a pilot's line is a calendar
+    bitmask, so checking and claiming a pairing is O(1). Pairings with no
+    place on the month's calendar are never awarded. A line stops at
+    their ``soft_prefs.credit.max``, or once it reaches ``credit.min`` (or
+    :data:`DEFAULT_LINE_CREDIT` without one).
+
+    A pilot is scored against the cutoff of each pairing, except on the
+    pairings they were awarded: there the cutoff is the one the other pilots
+    set (``next_cutoffs``), so the awardee is not pinned at even odds by their
+    own seniority.
+
+    Parameters
+    ----------
+    pairing_features: dict
+        Shared bid packet (``{"pairings": [...]}``).
+    pilots: Sequence[BatchPilot]
+        Every pilot of the base.
+    K: int
+        Candidates each pilot bids, in optimizer order.
+    analytics_features: dict, optional
+        Shared analytics passed through to the optimizer.
+    workers: int, optional
+        Worker processes for the optimizer fan-out.
+    spread: float
+        Logistic spread for :func:`award_probability`.
+
+    Returns
+    -------
+    AwardSimulation
+        Seniority order, awards, per-pilot probabilities and pairing cutoffs.
+    """
+
+    pairings = pairings_of(pairing_features)
+    frame = pairing_frame_for(pairing_features)
+    row_of = {pid: i for i, pid in enumerate(frame.ids)}
+    remaining = [max(int(pairing_field(p, "capacity", 1) or 0), 0) for p in pairings]
+    masks = frame.day_masks.tolist()
+    credits = frame.block_hours.tolist()
+
+    topk = {
+        res.ctx_id: [c.candidate_id for c in res.candidates]
+        for res in optimize_batch(
+            pairing_features,
+            pilots,
+            K,
+            analytics_features=analytics_features,
+            workers=workers,
+            persist=False,
+        )
+    }
+
+    ranked = sorted(
+        range(len(pilots)),
+        key=lambda i: (-pilots[i].context.seniority_percentile, i),
+    )
+    cutoffs: dict[str, float] = {}
+    next_cutoffs: dict[str, float] = {}
+    awards: dict[str, list[str]] = {}
+    order: list[str] = []
+    for i in ranked:
+        pilot = pilots[i]
+        seniority = pilot.context.seniority_percentile
+        plan = ScoringPlan.from_bundle(
+            FeatureBundle.model_construct(
+                context=pilot.context,
+                preference_schema=pilot.preference_schema,
+                analytics_features={},
+                compliance_flags={},
+                pairing_features={},
+            )
+        )
+        credit_min, credit_max = plan.credit_window
+        target = credit_min or DEFAULT_LINE_CREDIT
+        mask, credit = 0, 0.0
+        line: list[str] = []
+        for pid in topk.get(pilot.context.ctx_id, []):
+            if credit >= target:
+                break
+            row = row_of.get(pid)
+            if row is None:
+                continue
+            fits = masks[row] and not masks[row] & mask and credit + credits[row] <= credit_max
+            if not remaining[row]:
+                if fits and pid in cutoffs:
+                    next_cutoffs.setdefault(pid, seniority)
+                continue
+            if not fits:
+                continue
+            mask |= masks[row]
+            credit += credits[row]
+            line.append(pid)
+            remaining[row] -= 1
+            if not remaining[row]:
+                cutoffs[pid] = seniority
+        order.append(pilot.context.pilot_id)
+        awards[pilot.context.pilot_id] = line
+
+    probabilities = {}
+    for pilot in pilots:
+        own = set(awards.get(pilot.context.pilot_id, ()))
+        probabilities[pilot.context.pilot_id] = {
+            pid: award_probability(
+                pilot.context.seniority_percentile,
+                (next_cutoffs if pid in own else cutoffs).get(pid),
+                spread,
+            )
+            for pid in topk.get(pilot.context.ctx_id, [])
+        }
+    return AwardSimulation(
+        order=order,
+        awards=awards,
+        probabilities=probabilities,
+        cutoffs=cutoffs,
+        next_cutoffs=next_cutoffs,
+    )
+
+
+__all__ = ["AwardSimulation", "award_probability", "simulate_awards"]
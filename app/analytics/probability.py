@@ -1,9 +1,219 @@
-from typing import Any
+"""Layer success odds from historical seniority cutoffs.
 
-from app.models import ContextSnapshot
+An :class:`AwardHistory` keeps, for one base/fleet/seat/month, the pairing
+columns of that month's packet (:class:`PairingFrame`) next to a ``cutoffs``
+array: the seniority percentile of the most junior pilot awarded each
+pairing, ``NaN`` when the pairing never ran out. Its awardees are measured
+against ``next_cutoffs`` instead, the seniority of the first pilot turned away
+from it. A bid layer's filters become boolean masks over those columns, so a
+whole list of layers is scored with a few array operations.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import Any, Optional, Union
+
+import numpy as np
+
+from app.analytics.award_sim import DEFAULT_SPREAD, AwardSimulation
+from app.models import ContextSnapshot, Filter
+from app.services.pairing_frame import PairingFrame, day_mask, report_minutes
+
+DEFAULT_SUCCESS_PROB = 0.5
+
+HistoryKey = tuple[str, str, str, str]
+FilterLike = Union[Filter, dict[str, Any]]
+
+_IN_OPS = {"IN", "EQUALS", "=="}
+_NOT_IN_OPS = {"NOT IN", "NOT_IN", "!="}
+_COMPARE_OPS = {">=", "<=", ">", "<", "BETWEEN"}
+_CATEGORICAL = {
+    "LayoverCity": ("city_codes", "city_vocab"),
+    "Equipment": ("equip_codes", "equip_vocab"),
+}
+_NUMERIC = {
+    "TripLength": "trip_length",
+    "Credit": "block_hours",
+    "BlockHours": "block_hours",
+    "DutyHours": "duty_hours",
+    "ReportTime": "report_minutes",
+}
+
+
+class AwardHistory:
+    """Pairing columns and seniority cutoffs for one base/fleet/seat/month."""
+
+    __slots__ = ("frame", "cutoffs", "next_cutoffs", "awards", "_rows")
+
+    def __init__(
+        self,
+        pairings: Sequence[Any],
+        cutoffs: dict[str, float],
+        next_cutoffs: Optional[dict[str, float]] = None,
+        awards: Optional[dict[str, list[str]]] = None,
+    ) -> None:
+        self.frame = PairingFrame(pairings)
+        next_cutoffs = next_cutoffs or {}
+        self.cutoffs = np.array(
+            [cutoffs.get(pid, np.nan) for pid in self.frame.ids], dtype=np.float64
+        )
+        self.next_cutoffs = np.array(
+            [next_cutoffs.get(pid, np.nan) for pid in self.frame.ids], dtype=np.float64
+        )
+        self.awards = dict(awards or {})
+        self._rows = {pid: i for i, pid in enumerate(self.frame.ids)}
+
+    @classmethod
+    def from_simulation(cls, pairings: Sequence[Any], sim: AwardSimulation) -> AwardHistory:
+        return cls(pairings, sim.cutoffs, sim.next_cutoffs, sim.awards)
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def hold_probs(
+        self, seniority: float, spread: float = DEFAULT_SPREAD, pilot_id: Optional[str] = None
+    ) -> np.ndarray:
+        """Per-pairing odds of still being available at ``seniority``.
+
+        Pairings awarded to ``pilot_id`` use their ``next_cutoffs``.
+        """
+
+        cutoffs = self.cutoffs
+        own = [self._rows[pid] for pid in self.awards.get(pilot_id, ()) if pid in self._rows]
+        if own:
+            cutoffs = cutoffs.copy()
+            cutoffs[own] = self.next_cutoffs[own]
+        with np.errstate(over="ignore"):
+            probs = 1.0 / (1.0 + np.exp(-(seniority - cutoffs) / spread))
+        return np.where(np.isnan(cutoffs), 1.0, probs)
+
+    def mask(self, f: FilterLike) -> np.ndarray:
+        """Boolean mask of pairings matching one PBS filter."""
+
+        if isinstance(f, Filter):
+            f = f.model_dump()
+        ftype = f.get("type")
+        op = str(f.get("op", "")).upper()
+        values = list(f.get("values") or [])
+        if op not in _IN_OPS | _NOT_IN_OPS | _COMPARE_OPS:
+            raise ValueError(f"unsupported filter op: {f.get('op')}")
+
+        frame = self.frame
+        if ftype == "PairingId":
+            out = np.zeros(len(frame), dtype=bool)
+            out[[self._rows[v] for v in values if v in self._rows]] = True
+        elif ftype in _CATEGORICAL:
+            codes_attr, vocab_attr = _CATEGORICAL[ftype]
+            wanted = set(values)
+            per_code = np.array([v in wanted for v in getattr(frame, vocab_attr)], dtype=bool)
+            out = per_code[getattr(frame, codes_attr)] if len(per_code) else per_code
+        elif ftype == "DutyDate":
+            out = (frame.day_masks & np.uint64(day_mask(values, frame.month))) != 0
+        elif ftype in _NUMERIC:
+            col = getattr(frame, _NUMERIC[ftype])
+            if ftype == "ReportTime":
+                nums = [report_minutes(v) if isinstance(v, str) else float(v) for v in values]
+            else:
+                nums = [float(v) for v in values]
+            if op in _COMPARE_OPS:
+                return _compare(col, op, nums)
+            out = np.isin(col, nums)
+        else:
+            raise ValueError(f"unsupported filter type: {ftype}")
+        return ~out if op in _NOT_IN_OPS else out
+
+
+def _compare(col: np.ndarray, op: str, nums: list[float]) -> np.ndarray:
+    if op == "BETWEEN":
+        lo, hi = nums
+        return (col >= lo) & (col <= hi)
+    (value,) = nums
+    if op == ">=":
+        return col >= value
+    if op == "<=":
+        return col <= value
+    if op == ">":
+        return col > value
+    return col < value
+
+
+class AwardHistoryStore:
+    """Award histories keyed by ``(base, fleet, seat, month)``."""
+
+    def __init__(self) -> None:
+        self._histories: dict[HistoryKey, AwardHistory] = {}
+
+    def put(self, base: str, fleet: str, seat: str, month: str, history: AwardHistory) -> None:
+        self._histories[(base, fleet, seat, month)] = history
+
+    def get(self, base: str, fleet: str, seat: str, month: str) -> Optional[AwardHistory]:
+        return self._histories.get((base, fleet, seat, month))
+
+
+def _history_for(ctx: ContextSnapshot, analytics: dict[str, Any]) -> Optional[AwardHistory]:
+    history = analytics.get("award_history")
+    if isinstance(history, AwardHistoryStore):
+        fleet = ctx.equip[0] if ctx.equip else ""
+        return history.get(ctx.base, fleet, ctx.seat, str(analytics.get("month", "")))
+    return history
+
+
+def estimate_layer_probs(
+    layers: Sequence[Sequence[FilterLike]], ctx: ContextSnapshot, analytics: dict[str, Any]
+) -> np.ndarray:
+    """Success odds for many filter sets at once.
+
+    A layer succeeds when at least one pairing matching all of its filters is
+    still available at the pilot's seniority. Pairings are treated as
+    independent: ``1 - prod(1 - p)`` over the matches, evaluated as a masked
+    sum of ``log(1 - p)``. Identical filters are masked once per call.
+
+    ``analytics["award_history"]`` is an :class:`AwardHistory` or an
+    :class:`AwardHistoryStore` (looked up by the context's base, first
+    equipment, seat and ``analytics["month"]``). Without a history every
+    layer gets :data:`DEFAULT_SUCCESS_PROB`.
+    """
+
+    history = _history_for(ctx, analytics)
+    if history is None:
+        return np.full(len(layers), DEFAULT_SUCCESS_PROB)
+    if not layers or not len(history):
+        return np.zeros(len(layers))
+
+    spread = float(analytics.get("spread", DEFAULT_SPREAD))
+    held = history.hold_probs(ctx.seniority_percentile, spread, ctx.pilot_id)
+    miss = np.log1p(-np.minimum(held, 1 - 1e-12))
+
+    cache: dict[tuple, np.ndarray] = {}
+    log_fail = np.zeros(len(layers))
+    for i, filters in enumerate(layers):
+        matches: Optional[np.ndarray] = None
+        for f in filters:
+            fd = f.model_dump() if isinstance(f, Filter) else f
+            key = (fd.get("type"), str(fd.get("op", "")).upper(), tuple(fd.get("values") or ()))
+            m = cache.get(key)
+            if m is None:
+                m = cache[key] = history.mask(fd)
+            matches = m if matches is None else matches & m
+        log_fail[i] = miss.sum() if matches is None else miss[matches].sum()
+    return 1.0 - np.exp(log_fail)
 
 
 def estimate_success_prob(
     filters: list[dict[str, Any]], ctx: ContextSnapshot, analytics: dict[str, Any]
 ) -> float:
-    raise NotImplementedError("Implemented in PR2")
+    """Odds that a layer with ``filters`` yields an award for ``ctx``.
+
+    See :func:`estimate_layer_probs`.
+    """
+
+    return float(estimate_layer_probs([filters], ctx, analytics)[0])
+
+
+__all__ = [
+    "AwardHistory",
+    "AwardHistoryStore",
+    "estimate_layer_probs",
+    "estimate_success_prob",
+]
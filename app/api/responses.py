@@ -0,0 +1,72 @@
+"""JSON responses encoded straight from pydantic models.
+
+For a route returning ``{"candidates": [c.model_dump() for c in topk]}``,
+FastAPI dumps every model to a dict, serializes those dicts again against
+the route's return annotation and finally runs :func:`json.dumps`.
+:class:`ModelJSONResponse` takes the models themselves (inside plain dicts
+and lists) and encodes them in one :func:`pydantic_core.to_json` call.
+
+The bytes are the same as :class:`fastapi.responses.JSONResponse` would send
+for the dumped content. pydantic's encoder only differs in how it writes
+some floats (``1e-7`` for ``1e-07``, ``0.00001`` for ``1e-05``, ``1e16``
+for ``1e+16``); output that may hold one of those is decoded and written
+again by :func:`json.dumps`. Bare NaN/Infinity is refused as before, while
+inside a model field it is written as ``null``, as
+:meth:`~pydantic.BaseModel.model_dump_json` does.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import Any
+
+import pydantic_core
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# Markers of floats pydantic writes differently from ``repr`` (exponent form,
+# below 1e-4) or that json.dumps refuses. Substring and literal searches keep
+# the check far cheaper than the encoding it saves; a hit inside a string
+# only costs a second encoding pass.
+_EXPONENT = re.compile(rb"e[-1-9]")
+_DIGITS = frozenset(b"0123456789")
+_REPR_MARKERS = (b"0.0000", b"NaN", b"Infinity")
+
+
+def dumps(content: Any) -> bytes:
+    """``content`` as :class:`JSONResponse` would encode its dumped form."""
+
+    try:
+        body = pydantic_core.to_json(content)
+    except pydantic_core.PydanticSerializationError:
+        return _standard_dumps(jsonable_encoder(content))
+    if _repr_mismatch(body):
+        return _standard_dumps(json.loads(body))
+    return body
+
+
+def _repr_mismatch(body: bytes) -> bool:
+    if any(marker in body for marker in _REPR_MARKERS):
+        return True
+    return any(body[m.start() - 1] in _DIGITS for m in _EXPONENT.finditer(body))
+
+
+def _standard_dumps(content: Any) -> bytes:
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class ModelJSONResponse(JSONResponse):
+    """:class:`JSONResponse` whose content may hold pydantic models."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+__all__ = ["ModelJSONResponse", "dumps"]
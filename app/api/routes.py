@@ -8,9 +8,11 @@ from pathlib import Path
 from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import TypeAdapter
 
-from app.audit import log_event
+from app.api.responses import ModelJSONResponse
+from app.audit import flush_events, log_event
 from app.db import Audit, SessionLocal
 from app.explain.legal import explain as explain_legal
 from app.export.audit import get_record, insert_record
@@ -18,18 +20,22 @@ from app.export.storage import write_artifact
 from app.generate.layers import candidates_to_layers
 from app.generate.lint import lint_layers
 from app.models import (
+    BatchPilot,
     BidLayerArtifact,
     CandidateSchedule,
     ContextSnapshot,
     FeatureBundle,
-    HardConstraints,
     PreferenceSchema,
-    SoftPrefs,
     StrategyDirectives,
 )
+from app.rules.cache import cached_set_id
 from app.rules.engine import load_rule_pack, validate_feasibility
 from app.security.api_key import require_api_key
+from app.services.batch import optimize_batch
+from app.services.candidate_store import candidate_store
 from app.services.optimizer import retune_candidates, select_topk
+from app.services.pairing_repo import UnknownPairingSet, pairing_repository
+from app.services.preferences import parse_preference_text
 from app.strategy.engine import propose_strategy
 
 router = APIRouter()
@@ -37,7 +43,8 @@ router = APIRouter()
 
 RULE_PACK_PATH = "rule_packs/UAL/2025.08.yml"
 _RULES = load_rule_pack(RULE_PACK_PATH)
-CANDIDATE_STORE: dict[str, CandidateSchedule] = {}
+# Validates a whole list of candidate dicts in one call.
+_CANDIDATES = TypeAdapter(list[CandidateSchedule])
 
 
 @router.post("/parse", tags=["Parse"])
@@ -103,10 +110,8 @@ def parse_preferences(payload: dict[str, Any]) -> dict[str, Any]:
 def parse_preview(payload: dict[str, Any]) -> dict[str, Any]:
     """Return a PreferenceSchema preview without persistence."""
     try:
-        text = payload.get("text", "")
         persona = payload.get("persona")
-        hard = HardConstraints(no_red_eyes="red-eye" in text.lower() or "redeye" in text.lower())
-        soft = SoftPrefs(weekend_priority={"weight": 0.9} if "weekend" in text.lower() else {})
+        hard, soft = parse_preference_text(payload.get("text", ""))
         schema = PreferenceSchema(
             pilot_id="preview",
             airline="UAL",
@@ -150,38 +155,126 @@ def validate(payload: dict[str, Any]) -> dict[str, Any]:
         raise HTTPException(status_code=400, detail=str(e)) from e
 
 
-@router.post("/optimize", tags=["Optimize"])
-def optimize(payload: dict[str, Any]) -> dict[str, Any]:
+@router.post("/pairing_sets", tags=["Optimize"], dependencies=[Depends(require_api_key)])
+def register_pairing_set(payload: dict[str, Any]) -> dict[str, Any]:
+    """
+    Body:
+      {"pairings": [...], "airline": "UAL", "month": "2025-09", "base": "SFO", "fleet": "73G"}
+    Returns: {"pairing_set_id": "...", "count": N}
+
+    Later requests can pass ``{"pairing_set_id": "..."}`` as their pairing
+    features instead of the full list, in this or any other worker process.
+    Each distinct set is written to disk as a snapshot, so this requires the
+    same credentials as ``/export``.
+    """
+    pairings = payload.get("pairings")
+    if not isinstance(pairings, list):
+        raise HTTPException(status_code=400, detail="pairings must be a list")
+    pset = pairing_repository.put(
+        pairings,
+        airline=str(payload.get("airline", "")),
+        month=str(payload.get("month", "")),
+        base=str(payload.get("base", "")),
+        fleet=str(payload.get("fleet", "")),
+    )
+    pairing_repository.save_snapshot(pset)
+    return {"pairing_set_id": pset.set_id, "count": len(pset)}
+
+
+@router.get("/pairing_sets/{set_id}", tags=["Optimize"])
+def get_pairing_set(set_id: str) -> dict[str, Any]:
+    try:
+        pset = pairing_repository.get(set_id)
+    except UnknownPairingSet as e:
+        raise HTTPException(status_code=404, detail="pairing set not found") from e
+    airline, month, base, fleet = pset.key
+    return {
+        "pairing_set_id": pset.set_id,
+        "count": len(pset),
+        "airline": airline,
+        "month": month,
+        "base": base,
+        "fleet": fleet,
+    }
+
+
+@router.post("/optimize", tags=["Optimize"], response_class=ModelJSONResponse)
+def optimize(payload: dict[str, Any]) -> ModelJSONResponse:
     bundle = FeatureBundle(**payload["feature_bundle"])
     K = int(payload.get("K", 50))
-    topk = select_topk(bundle, K)
+    try:
+        topk = select_topk(bundle, K)
+    except UnknownPairingSet as e:
+        raise HTTPException(status_code=404, detail="pairing set not found") from e
     report = validate_feasibility(bundle, _RULES)
+    set_id = cached_set_id(bundle) or ""
     for cand in topk:
         cand.rationale.notes.extend(explain_legal(cand, report))
         # Store candidates for later retrieval
-        CANDIDATE_STORE[cand.candidate_id] = cand
-    return {"candidates": [c.model_dump() for c in topk]}
+        candidate_store.put(cand, set_id)
+    return ModelJSONResponse({"candidates": topk})
+
+
+@router.post("/optimize/batch", tags=["Optimize"])
+def optimize_batch_route(payload: dict[str, Any]) -> StreamingResponse:
+    """
+    Body:
+      {
+        "pairing_features": {"pairings": [...]},
+        "analytics_features": {...},
+        "pilots": [{"context": {...}, "preference_schema": {...}}, ...],
+        "K": 50
+      }
+    Streams NDJSON, one ``{"ctx_id", "pilot_id", "candidates"}`` line per pilot
+    in input order. Every pilot's bundle and the shared packet are checked
+    before the first line is sent, so bad input is a 400 (an unknown
+    ``pairing_set_id`` a 404) rather than a stream cut short after a 200.
+    """
+    try:
+        pilots = [BatchPilot(**p) for p in payload["pilots"]]
+        K = int(payload.get("K", 50))
+        pairing_features = payload["pairing_features"]
+        analytics = payload.get("analytics_features") or {}
+        for pilot in pilots:
+            FeatureBundle(
+                context=pilot.context,
+                preference_schema=pilot.preference_schema,
+                analytics_features=analytics,
+                compliance_flags={},
+                pairing_features=pairing_features,
+            )
+        results = optimize_batch(pairing_features, pilots, K, analytics_features=analytics)
+    except UnknownPairingSet as e:
+        raise HTTPException(status_code=404, detail="pairing set not found") from e
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    def _lines():
+        for result in results:
+            yield result.model_dump_json() + "\n"
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
 
 
-@router.get("/candidates/{candidate_id}", tags=["Candidates"])
-def get_candidate(candidate_id: str) -> dict[str, Any]:
-    cand = CANDIDATE_STORE.get(candidate_id)
+@router.get("/candidates/{candidate_id}", tags=["Candidates"], response_class=ModelJSONResponse)
+def get_candidate(candidate_id: str) -> ModelJSONResponse:
+    cand = candidate_store.get(candidate_id)
     if not cand:
         raise HTTPException(status_code=404, detail="candidate not found")
-    return {"candidate": cand.model_dump()}
+    return ModelJSONResponse({"candidate": cand})
 
 
-@router.post("/optimize/retune", tags=["Optimize"])
-def retune(payload: dict[str, Any]) -> dict[str, Any]:
+@router.post("/optimize/retune", tags=["Optimize"], response_class=ModelJSONResponse)
+def retune(payload: dict[str, Any]) -> ModelJSONResponse:
     _candidate_id = payload.get("candidate_id")  # for API symmetry; unused
-    candidates = [CandidateSchedule(**c) for c in payload.get("candidates", [])]
+    candidates = _CANDIDATES.validate_python(payload.get("candidates", []))
     weight_deltas = payload.get("weight_deltas", {})
     adjusted = retune_candidates(candidates, weight_deltas)
-    return {"candidates": [c.model_dump() for c in adjusted]}
+    return ModelJSONResponse({"candidates": adjusted})
 
 
-@router.post("/strategy", tags=["Strategy"])
-def strategy(payload: dict[str, Any]) -> dict[str, Any]:
+@router.post("/strategy", tags=["Strategy"], response_class=ModelJSONResponse)
+def strategy(payload: dict[str, Any]) -> ModelJSONResponse:
     """
     Body:
       {"feature_bundle": {...}, "candidates": [...]}
@@ -190,15 +283,15 @@ def strategy(payload: dict[str, Any]) -> dict[str, Any]:
     """
     try:
         bundle = FeatureBundle(**payload["feature_bundle"])
-        topk = [CandidateSchedule(**c) for c in payload["candidates"]]
+        topk = _CANDIDATES.validate_python(payload["candidates"])
         directives: StrategyDirectives = propose_strategy(bundle, topk)
-        return {"directives": directives.model_dump()}
+        return ModelJSONResponse({"directives": directives})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
 
 
-@router.post("/generate_layers", tags=["Generate"])
-def generate_layers(payload: dict[str, Any]) -> dict[str, Any]:
+@router.post("/generate_layers", tags=["Generate"], response_class=ModelJSONResponse)
+def generate_layers(payload: dict[str, Any]) -> ModelJSONResponse:
     """
     Body:
       {"feature_bundle": {...}, "candidates": [...]}
@@ -207,9 +300,9 @@ def generate_layers(payload: dict[str, Any]) -> dict[str, Any]:
     """
     try:
         bundle = FeatureBundle(**payload["feature_bundle"])
-        topk = [CandidateSchedule(**c) for c in payload["candidates"]]
+        topk = _CANDIDATES.validate_python(payload["candidates"])
         artifact: BidLayerArtifact = candidates_to_layers(topk, bundle)
-        return {"artifact": artifact.model_dump()}
+        return ModelJSONResponse({"artifact": artifact})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
 
@@ -306,6 +399,7 @@ def download_export(export_id: str) -> FileResponse:
 @router.get("/audit/{ctx_id}", tags=["Audit"])
 def get_audit(ctx_id: str) -> dict[str, Any]:
     """Return audit trail for a given context."""
+    flush_events()
     with SessionLocal() as db:
         rows = db.query(Audit).filter(Audit.ctx_id == ctx_id).order_by(Audit.timestamp.asc()).all()
         events = [
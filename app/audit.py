@@ -1,22 +1,398 @@
+"""Buffered audit trail.
+
+``log_event`` used to open a session and commit one ``Audit`` row per call,
+so a single validate/optimize/export run paid for several fsync'd commits on
+the request path. Events now go to an :class:`AuditSink`: they are appended to
+a local spool file (so a crash loses nothing that was logged), buffered in
+memory, and written with one executemany ``INSERT`` when the buffer reaches
+``max_batch`` events or ``flush_interval`` seconds pass, whichever is first.
+
+Spool files live in ``AUDIT_SPOOL_DIR`` (default ``./audit_spool``), one per
+process and flush generation. A file is deleted once its events are
+committed; files left behind by a dead process are replayed by
+:func:`recover_spool` at startup. Every worker runs that recovery, so a file
+is first claimed by renaming it to ``*.claimed-<pid>``; only the worker whose
+rename succeeds replays it. Readers that need to see their own events
+immediately call :func:`flush_events` first.
+
+Each commit also records the names of the spool files it covers in
+``audit_segments``, so a file whose events were committed just before a crash
+is deleted by recovery instead of being replayed a second time. Once the
+file is gone its row is dropped in the next flush's commit (or by
+:meth:`AuditSink.close`), so the table holds at most one flush's worth of
+names per process. If a batch fails, its events are tried one at a time;
+events that fail on their own are moved to ``<spool_dir>/dead`` (or logged
+when there is no spool) and the rest are committed, so one bad payload never
+holds back later events.
+"""
+
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Any
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Sequence
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from app.db import Audit, AuditSegment, SessionLocal
+
+DEFAULT_MAX_BATCH = 500
+DEFAULT_FLUSH_INTERVAL_S = 0.5
+
+
+def _default_spool_dir() -> Path:
+    return Path(os.environ.get("AUDIT_SPOOL_DIR", Path.cwd() / "audit_spool"))
+
+
+class AuditSink:
+    """In-memory audit buffer backed by an append-only spool file."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        spool_dir: Optional[Path] = None,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL_S,
+    ) -> None:
+        self.session_factory = session_factory
+        self.spool_dir = Path(spool_dir) if spool_dir is not None else None
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._rows: list[dict[str, Any]] = []
+        self._segments: list[Path] = []  # spool files holding the buffered rows
+        self._unlinked: list[str] = []  # committed segments whose files are deleted
+        self._spool: Optional[Any] = None
+        self._generation = 0
+        self._started_ns = time.time_ns()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def emit(self, ctx_id: str, stage: str, payload: Optional[dict[str, Any]] = None) -> None:
+        row = {
+            "ctx_id": ctx_id,
+            "stage": stage,
+            "payload": payload or {},
+            "timestamp": datetime.utcnow(),
+        }
+        with self._lock:
+            self._append_spool(row)
+            self._rows.append(row)
+            full = len(self._rows) >= self.max_batch
+        self._ensure_started()
+        if full:
+            self._wake.set()
+
+    def flush(self) -> None:
+        """Write every buffered event now (synchronously)."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+                segments, self._segments = self._segments, []
+                self._close_spool()
+            if not rows:
+                _unlink(segments)
+                return
+            names = [p.stem for p in segments]
+            # Segment rows of files the previous flush deleted go in this commit.
+            forget, self._unlinked = self._unlinked, []
+            try:
+                _commit(self.session_factory, rows, names, forget)
+            except Exception:
+                logging.warning(
+                    "audit flush of %s events failed; retrying one by one", len(rows), exc_info=True
+                )
+                bad = self._failing(rows)
+                self._dead_letter(bad)
+                dropped = {id(row) for row in bad}
+                good = [row for row in rows if id(row) not in dropped]
+                try:
+                    _commit(self.session_factory, good, names, forget)
+                except Exception:
+                    logging.exception(
+                        "audit flush failed again; dead-lettering %s events", len(good)
+                    )
+                    self._dead_letter(good)
+                    self._unlinked.extend(forget)
+            _unlink(segments)
+            self._unlinked.extend(names)
+
+    def _failing(self, rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Rows that cannot be inserted on their own (each tried and rolled back)."""
+        bad = []
+        with self.session_factory() as db:
+            for row in rows:
+                try:
+                    db.execute(insert(Audit), [row])
+                except Exception:
+                    bad.append(row)
+                db.rollback()
+        return bad
+
+    def _dead_letter(self, rows: list[dict[str, Any]]) -> None:
+        if not rows:
+            return
+        self.dropped += len(rows)
+        if self.spool_dir is not None:
+            try:
+                dead = self.spool_dir / "dead"
+                dead.mkdir(parents=True, exist_ok=True)
+                path = dead / f"audit-{os.getpid()}-{self._started_ns}.jsonl"
+                with path.open("a", encoding="utf-8") as f:
+                    for row in rows:
+                        f.write(_spool_line(row))
+                logging.error("audit dropped %s events; kept in %s", len(rows), path)
+                return
+            except OSError:
+                logging.exception("audit dead-letter write failed")
+        for row in rows:
+            logging.error("audit dropped event: %s", _spool_line(row).rstrip())
+
+    def close(self) -> None:
+        """Flush and stop the background flusher."""
+        thread = self._thread
+        if thread is not None:
+            self._stopped.set()
+            self._wake.set()
+            thread.join()
+            self._thread = None
+            self._stopped.clear()
+        self.flush()
+        with self._flush_lock:
+            forget, self._unlinked = self._unlinked, []
+            _forget(self.session_factory, forget)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    def owns(self, path: Path) -> bool:
+        with self._lock:
+            return path in self._segments
+
+    # -- spool -------------------------------------------------------------
+    def _append_spool(self, row: dict[str, Any]) -> None:
+        if self.spool_dir is None:
+            return
+        try:
+            if self._spool is None:
+                self.spool_dir.mkdir(parents=True, exist_ok=True)
+                self._generation += 1
+                path = self.spool_dir / (
+                    f"audit-{os.getpid()}-{self._started_ns}-{self._generation}.jsonl"
+                )
+                self._spool = path.open("a", encoding="utf-8")
+                self._segments.append(path)
+            self._spool.write(_spool_line(row))
+            self._spool.flush()
+        except OSError:
+            logging.exception("audit spool write failed")
+
+    def _close_spool(self) -> None:
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    # -- background flusher -------------------------------------------------
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self.pending():
+                self.flush()
+
+
+def _spool_line(row: dict[str, Any]) -> str:
+    record = dict(row, timestamp=row["timestamp"].isoformat())
+    return json.dumps(record, default=str) + "\n"
+
+
+def _commit(
+    session_factory: Callable[[], Session],
+    rows: list[dict[str, Any]],
+    segments: list[str],
+    forget: Sequence[str] = (),
+) -> None:
+    """Insert ``rows``, mark ``segments`` committed and drop ``forget`` in one transaction."""
+    with session_factory() as db:
+        if rows:
+            db.execute(insert(Audit), rows)
+        if segments:
+            db.execute(insert(AuditSegment), [{"segment": name} for name in segments])
+        if forget:
+            db.execute(delete(AuditSegment).where(AuditSegment.segment.in_(forget)))
+        db.commit()
+
+
+def _forget(session_factory: Callable[[], Session], segments: list[str]) -> None:
+    """Drop the ``audit_segments`` rows of spool files that are now deleted."""
+    if not segments:
+        return
+    try:
+        with session_factory() as db:
+            db.execute(delete(AuditSegment).where(AuditSegment.segment.in_(segments)))
+            db.commit()
+    except Exception:
+        logging.warning("audit could not forget %s spool segments", len(segments), exc_info=True)
+
+
+def _unlink(paths: list[Path]) -> None:
+    for p in paths:
+        try:
+            p.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _claim(path: Path) -> Optional[Path]:
+    """Atomically take ``path`` for this process, or None if another got it."""
+    claimed = path.with_suffix(f".claimed-{os.getpid()}")
+    try:
+        path.rename(claimed)
+    except FileNotFoundError:
+        return None
+    return claimed
+
+
+def _unclaimed(spool_dir: Path, owner: Optional[AuditSink]) -> list[Path]:
+    """Spool files whose writer (or claimer) is gone."""
+    stale = []
+    for path in sorted(spool_dir.glob("audit-*")):
+        try:
+            if path.suffix == ".jsonl":
+                pid = int(path.stem.split("-")[1])
+            elif path.suffix.startswith(".claimed-"):
+                pid = int(path.suffix[len(".claimed-") :])
+            else:
+                continue
+        except (IndexError, ValueError):
+            continue
+        if pid != os.getpid() and _pid_alive(pid):
+            continue
+        if owner is not None and owner.owns(path):
+            continue
+        stale.append(path)
+    return stale
 
-from app.db import Audit, SessionLocal
+
+def recover_spool(
+    spool_dir: Optional[Path] = None,
+    session_factory: Callable[[], Session] = SessionLocal,
+    owner: Optional[AuditSink] = None,
+) -> int:
+    """Replay spool files left by processes that are no longer running.
+
+    Files of live processes and files ``owner`` is still writing are left
+    alone; anything else with this process's pid belongs to a previous
+    incarnation (e.g. a restarted container) and is replayed. Each file is
+    claimed by renaming it before it is read, so workers recovering the same
+    directory at once never replay a file twice; a claim left by a dead
+    worker is taken over. A file already recorded in ``audit_segments`` (its
+    events were committed but the file outlived the commit) is only deleted,
+    and its ``audit_segments`` row with it; rows older than every remaining
+    file are pruned. Returns the number of events written.
+    """
+
+    spool_dir = Path(spool_dir) if spool_dir is not None else _default_spool_dir()
+    if not spool_dir.is_dir():
+        return 0
+    started = datetime.utcnow()
+    recovered = 0
+    for path in _unclaimed(spool_dir, owner):
+        claimed = _claim(path)
+        if claimed is None:
+            continue
+        rows = []
+        with claimed.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                    row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+                except (ValueError, KeyError):
+                    continue  # torn final line from the crash
+                rows.append(row)
+        with session_factory() as db:
+            done = db.execute(
+                select(AuditSegment.segment).where(AuditSegment.segment == claimed.stem)
+            ).first()
+        if done is None:
+            _commit(session_factory, rows, [claimed.stem])
+            recovered += len(rows)
+        claimed.unlink()
+        _forget(session_factory, [claimed.stem])
+    _prune_segments(spool_dir, session_factory, started)
+    return recovered
+
+
+def _prune_segments(
+    spool_dir: Path, session_factory: Callable[[], Session], before: datetime
+) -> None:
+    """Drop segment rows committed before the oldest spool file still on disk.
+
+    A file is last written before its commit, so no remaining file can be
+    named by such a row. This clears rows left by a process that died
+    between deleting its files and its next commit.
+    """
+    cutoff = before
+    for path in spool_dir.glob("audit-*"):
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        cutoff = min(cutoff, datetime.fromtimestamp(mtime, timezone.utc).replace(tzinfo=None))
+    try:
+        with session_factory() as db:
+            db.execute(delete(AuditSegment).where(AuditSegment.committed_at < cutoff))
+            db.commit()
+    except Exception:
+        logging.warning("audit could not prune spool segments", exc_info=True)
+
+
+sink = AuditSink(spool_dir=_default_spool_dir())
+atexit.register(sink.close)
 
 
 def log_event(ctx_id: str, stage: str, payload: Optional[dict[str, Any]] = None) -> None:
-    """Persist an audit event for a context."""
+    """Record an audit event for a context (buffered; see :class:`AuditSink`)."""
     if not ctx_id:
         return
-    with SessionLocal() as db:
-        db.add(
-            Audit(
-                ctx_id=ctx_id,
-                stage=stage,
-                payload=payload or {},
-                timestamp=datetime.utcnow(),
-            )
-        )
-        db.commit()
+    sink.emit(ctx_id, stage, payload)
+
+
+def recover() -> int:
+    """Replay stale spool files into the database (run at startup)."""
+    return recover_spool(sink.spool_dir, sink.session_factory, owner=sink)
+
+
+def flush_events() -> None:
+    """Write buffered audit events to the database now."""
+    sink.flush()
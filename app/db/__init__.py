@@ -1,5 +1,6 @@
 from . import models
 from .database import Base, SessionLocal, engine
+from .writer import PersistenceQueue, persistence
 
 Base.metadata.create_all(bind=engine)
 
@@ -10,6 +11,7 @@ BidPackage = models.BidPackage
 Candidate = models.Candidate
 Export = models.Export
 Audit = models.Audit
+AuditSegment = models.AuditSegment
 
 __all__ = [
     "Base",
@@ -22,4 +24,7 @@ __all__ = [
     "Candidate",
     "Export",
     "Audit",
+    "AuditSegment",
+    "PersistenceQueue",
+    "persistence",
 ]
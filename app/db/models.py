@@ -75,6 +75,15 @@ class Audit(Base):
     timestamp = Column(DateTime, default=datetime.utcnow, index=True, nullable=False)
 
 
+class AuditSegment(Base):
+    """Audit spool files whose events have been committed."""
+
+    __tablename__ = "audit_segments"
+
+    segment = Column(String, primary_key=True)
+    committed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 # Helpful composite indices
 Index("ix_bid_packages_ctx_airline", BidPackage.ctx_id, BidPackage.airline)
 Index("ix_candidates_ctx_created", Candidate.ctx_id, Candidate.created_at)
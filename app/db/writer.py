@@ -0,0 +1,222 @@
+"""Background persistence queue for request-path DB writes.
+
+Validation and optimization record what they saw (pilot, preference, rule
+pack and candidate rows), but nothing reads those rows back while the request
+is running. Instead of opening a session per call, request handlers enqueue
+rows and return. A single writer thread collects everything queued within a
+flush interval and writes it in one transaction, one executemany ``INSERT``
+per table.
+
+The queue is bounded: when the writer falls behind, ``add`` blocks for up to
+``put_timeout`` seconds and then writes the row inline, so producers slow down
+instead of growing memory. :meth:`PersistenceQueue.flush` waits for every row
+queued before it, and :meth:`PersistenceQueue.close` drains the queue and stops
+the writer (called on app shutdown and at interpreter exit). If a batch fails,
+its rows are retried one per transaction, so only the rows that fail on their
+own are dropped (and logged).
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+
+DEFAULT_MAX_QUEUE = 10_000
+DEFAULT_FLUSH_INTERVAL_S = 0.05
+DEFAULT_MAX_BATCH = 2_000
+DEFAULT_PUT_TIMEOUT_S = 1.0
+
+INSERT = "insert"
+MERGE = "merge"
+
+_STOP = object()
+
+
+class PersistenceQueue:
+    """Bounded queue of pending rows drained by a background writer thread.
+
+    Two kinds of rows are supported: plain inserts (:meth:`add`) and
+    insert-unless-exists by primary key (:meth:`merge`), which covers the
+    ``db.merge(Pilot(pilot_id=...))`` idiom. Within a flush, merges are
+    written before inserts so foreign keys resolve.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        maxsize: int = DEFAULT_MAX_QUEUE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL_S,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        put_timeout: float = DEFAULT_PUT_TIMEOUT_S,
+    ) -> None:
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.put_timeout = put_timeout
+        self.written = 0
+        self.failed = 0
+        self.inline_writes = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # -- producers -----------------------------------------------------
+    def add(self, model: type, **values: Any) -> None:
+        """Queue an ``INSERT`` of one ``model`` row."""
+        self._put((INSERT, model, _with_created_at(model, values)))
+
+    def merge(self, model: type, **values: Any) -> None:
+        """Queue a row that is inserted only if its primary key is new."""
+        self._put((MERGE, model, _with_created_at(model, values)))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every row queued before this call is written.
+
+        Returns False if ``timeout`` expired first.
+        """
+        if self._thread is None and self._queue.empty():
+            return True
+        done = threading.Event()
+        self._put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Drain the queue and stop the writer. A later ``add`` restarts it."""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+            thread.join(timeout)
+            self._thread = None
+
+    def _put(self, item: Any) -> None:
+        self._ensure_started()
+        try:
+            self._queue.put(item, timeout=self.put_timeout)
+        except queue.Full:
+            if isinstance(item, threading.Event):
+                # flush() under backpressure: wait for room instead.
+                self._queue.put(item)
+                return
+            logging.warning("persistence queue full; writing inline")
+            self.inline_writes += 1
+            self._write([item])
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="persistence-writer", daemon=True
+                )
+                self._thread.start()
+
+    # -- writer ----------------------------------------------------------
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch: list[tuple[str, type, dict[str, Any]]] = []
+            waiters: list[threading.Event] = []
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.max_batch:
+                    break
+                remaining = deadline - time.monotonic()
+                try:
+                    item = (
+                        self._queue.get(timeout=remaining)
+                        if remaining > 0
+                        else self._queue.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+            if stop:
+                # Everything queued before the stop marker is written below.
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                    elif item is not _STOP:
+                        batch.append(item)
+            if batch:
+                self._write(batch)
+            for w in waiters:
+                w.set()
+            if stop:
+                return
+
+    def _write(self, batch: list[tuple[str, type, dict[str, Any]]]) -> None:
+        try:
+            self._commit(batch)
+            self.written += len(batch)
+        except Exception:
+            if len(batch) == 1:
+                self.failed += 1
+                logging.exception("persistence writer dropped a %s row", batch[0][1].__name__)
+                return
+            # One bad row (e.g. a primary-key race) must not take its
+            # neighbours with it: retry each row in its own transaction.
+            logging.warning(
+                "persistence writer failed to write %s rows; retrying one by one",
+                len(batch),
+                exc_info=True,
+            )
+            for item in sorted(batch, key=lambda item: item[0] != MERGE):
+                self._write([item])
+
+    def _commit(self, batch: list[tuple[str, type, dict[str, Any]]]) -> None:
+        merges: dict[type, dict[Any, dict[str, Any]]] = {}
+        inserts: dict[type, list[dict[str, Any]]] = {}
+        for kind, model, values in batch:
+            if kind == MERGE:
+                merges.setdefault(model, {}).setdefault(_pk(model, values), values)
+            else:
+                inserts.setdefault(model, []).append(values)
+        with self.session_factory() as db:
+            for model, rows in merges.items():
+                (pk_col,) = model.__table__.primary_key.columns
+                existing = set(db.execute(select(pk_col).where(pk_col.in_(list(rows)))).scalars())
+                new = [v for k, v in rows.items() if k not in existing]
+                if new:
+                    db.execute(insert(model), new)
+            for model, rows in inserts.items():
+                db.execute(insert(model), rows)
+            db.commit()
+
+
+def _with_created_at(model: type, values: dict[str, Any]) -> dict[str, Any]:
+    # Stamp rows when queued, not when the writer gets to them.
+    if "created_at" in model.__table__.columns and "created_at" not in values:
+        values["created_at"] = datetime.utcnow()
+    return values
+
+
+def _pk(model: type, values: dict[str, Any]) -> Any:
+    (pk_col,) = model.__table__.primary_key.columns
+    return values[pk_col.key]
+
+
+persistence = PersistenceQueue()
+atexit.register(persistence.close)
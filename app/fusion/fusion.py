@@ -10,4 +10,16 @@ def fuse(
     analytics: dict[str, Any],
     pairings: dict[str, Any],
 ) -> FeatureBundle:
-    raise NotImplementedError("Implemented in PR2")
+    """Assemble stage outputs into the bundle the optimizer consumes.
+
+    Precheck violations become ``compliance_flags``; pairings flagged there
+    stay in ``pairing_features`` because the optimizer does not hard-filter.
+    """
+
+    return FeatureBundle(
+        context=ctx,
+        preference_schema=pref,
+        analytics_features=analytics,
+        compliance_flags={"violations": list(precheck.get("violations", []))},
+        pairing_features=pairings,
+    )
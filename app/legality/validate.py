@@ -1,11 +1,25 @@
 from __future__ import annotations
 
+import ast
+import logging
+from functools import cache
 from pathlib import Path
 from typing import Any, Optional
 
+import numpy as np
 import yaml  # type: ignore[import-untyped]
 from pydantic import BaseModel, Field
 
+from app.rules_engine.dsl import DSLParseError, DSLParser, DSLSecurityError
+from app.rules_engine.vectorized import (
+    ROW_ALIASES,
+    VectorPack,
+    VectorRule,
+    compile_vector_rule,
+)
+
+_ROW_NAMES = (*ROW_ALIASES, "obj")
+
 
 class Rule(BaseModel):
     id: str
@@ -36,42 +50,52 @@ def _load_rules() -> list[Rule]:
     return [Rule.model_validate(r) for r in data.get("rules", [])]
 
 
-_RULES = _load_rules()
+class CompiledLegality:
+    """Legality rules parsed once through the safe DSL.
 
-
-def validate(trips: list[dict[str, Any]], context: dict[str, Any]) -> ValidationReport:
-    """Validate trips against hard legality rules.
-
-    Trips with hard rule hits are excluded from the returned ``valid_trips``.
-    ``rule_hits`` include clause references for downstream reporting.
+    Each ``evaluate`` expression is compiled by the rules-engine vector
+    backend and classified by its AST: rules reading ``trip`` are checked for
+    all trips at once as column masks (falling back to a per-trip loop when
+    an expression or the data cannot be vectorized); rules reading only
+    ``context`` are evaluated once per call. A rule whose evaluation raises
+    counts as a hit. A rule the DSL rejects is logged and fails closed: it
+    is a hit for every trip (or once, if it reads only ``context``).
     """
 
-    rule_hits: list[RuleHit] = []
-    valid_trips: list[dict[str, Any]] = []
-
-    for trip in trips:
-        trip_hits: list[RuleHit] = []
-        for rule in _RULES:
-            if "trip" in rule.evaluate:
-                env = {"trip": trip, "context": context}
-                ok = bool(eval(rule.evaluate, {}, env))  # noqa: S307
-                if not ok:
-                    hit = RuleHit(
+    def __init__(self, rules: list[Rule]) -> None:
+        parser = DSLParser()
+        compiled = [_compile_rule(parser, r) for r in rules]
+        self.trip_rules = [r for r, c in zip(rules, compiled) if c.row_scoped]
+        self.context_rules = [r for r, c in zip(rules, compiled) if not c.row_scoped]
+        self._trip_pack = VectorPack([c for c in compiled if c.row_scoped])
+        self._context_fns = [c.row_fn for c in compiled if not c.row_scoped]
+        self._hard = np.array([r.severity == "hard" for r in self.trip_rules], dtype=bool)
+
+    def validate(self, trips: list[dict[str, Any]], context: dict[str, Any]) -> ValidationReport:
+        rule_hits: list[RuleHit] = []
+        passed = self._trip_pack.evaluate(trips, context)
+        failed = ~passed
+        for i in np.flatnonzero(failed.any(axis=1)).tolist():
+            trip_id = trips[i].get("id")
+            for j in np.flatnonzero(failed[i]).tolist():
+                rule = self.trip_rules[j]
+                rule_hits.append(
+                    RuleHit(
                         id=rule.id,
                         desc=rule.desc,
                         clause=rule.clause,
                         severity=rule.severity,
-                        trip_id=trip.get("id"),
+                        trip_id=trip_id,
                     )
-                    rule_hits.append(hit)
-                    trip_hits.append(hit)
-        if not any(h.severity == "hard" for h in trip_hits):
-            valid_trips.append(trip)
-
-    for rule in _RULES:
-        if "trip" not in rule.evaluate:
-            env = {"context": context}
-            ok = bool(eval(rule.evaluate, {}, env))  # noqa: S307
+                )
+        invalid = (failed & self._hard).any(axis=1)
+        valid_trips = [trips[i] for i in np.flatnonzero(~invalid).tolist()]
+
+        for rule, fn in zip(self.context_rules, self._context_fns):
+            try:
+                ok = bool(fn(None, context))
+            except Exception:
+                ok = False
             if not ok:
                 rule_hits.append(
                     RuleHit(
@@ -83,4 +107,43 @@ def validate(trips: list[dict[str, Any]], context: dict[str, Any]) -> Validation
                     )
                 )
 
-    return ValidationReport(valid_trips=valid_trips, rule_hits=rule_hits)
+        return ValidationReport(valid_trips=valid_trips, rule_hits=rule_hits)
+
+
+def _compile_rule(parser: DSLParser, rule: Rule) -> VectorRule:
+    try:
+        return compile_vector_rule(parser, rule.id, rule.evaluate)
+    except (DSLParseError, DSLSecurityError) as e:
+        logging.error(
+            "legality rule %s is rejected by the DSL; it fails every check: %s", rule.id, e
+        )
+    return VectorRule(rule.id, rule.evaluate, None, _fail, row_scoped=_reads_trip(rule.evaluate))
+
+
+def _fail(trip: Any, context: Any) -> bool:
+    return False
+
+
+def _reads_trip(expr: str) -> bool:
+    """Whether ``expr`` names the trip, by its AST; True when it does not parse."""
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError:
+        return True
+    return any(isinstance(n, ast.Name) and n.id in _ROW_NAMES for n in ast.walk(tree))
+
+
+@cache
+def _engine() -> CompiledLegality:
+    # Compiled on first use, so a bad rule pack never breaks importing the app.
+    return CompiledLegality(_load_rules())
+
+
+def validate(trips: list[dict[str, Any]], context: dict[str, Any]) -> ValidationReport:
+    """Validate trips against hard legality rules.
+
+    Trips with hard rule hits are excluded from the returned ``valid_trips``.
+    ``rule_hits`` include clause references for downstream reporting.
+    """
+
+    return _engine().validate(trips, context)
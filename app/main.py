@@ -7,6 +7,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 
+from app import audit
 from app.api.routes import (
     export as api_export,
     generate_layers as api_generate_layers,
@@ -16,6 +17,7 @@ from app.api.routes import (
     strategy as api_strategy,
 )
 from app.compat.validate_router import router as compat_validate_router
+from app.db import persistence
 from app.logging_utils import install_pii_filter
 from app.middleware import RequestIDMiddleware
 from app.models import (
@@ -32,6 +34,7 @@ from app.routes.meta import router as meta_router
 from app.routes.ops import router as ops_router
 from app.routes.ui import router as ui_router
 from app.security.api_key import require_api_key
+from app.services.ingest_jobs import ingest_jobs
 
 MODELS = [
     PreferenceSchema,
@@ -59,8 +62,12 @@ def _export_model_schemas() -> None:
 async def lifespan(_: FastAPI):
     # on startup
     _export_model_schemas()
+    audit.recover()
     yield
-    # on shutdown (noop)
+    # on shutdown: finish ingestion jobs, drain queued DB writes and audit events
+    ingest_jobs.close()
+    persistence.close()
+    audit.sink.close()
 
 
 app = FastAPI(
@@ -70,6 +70,19 @@ class CandidateSchedule(BaseModel):
     rationale: CandidateRationale = CandidateRationale()
 
 
+class BatchPilot(BaseModel):
+    """One pilot's inputs to a batch optimization over a shared bid packet."""
+
+    context: ContextSnapshot
+    preference_schema: PreferenceSchema
+
+
+class BatchResult(BaseModel):
+    ctx_id: str
+    pilot_id: str
+    candidates: list[CandidateSchedule]
+
+
 class StrategyDirectives(BaseModel):
     weight_deltas: dict[str, float] = {}
     focus_hints: dict[str, list[str]] = {}
@@ -106,6 +119,7 @@ class IngestionRequest(BaseModel):
     fleet: str
     seat: str
     pilot_id: str
+    revises: Optional[str] = None  # pairing_set_id of the packet this upload revises
 
 
 class IngestionResponse(BaseModel):
@@ -113,6 +127,21 @@ class IngestionResponse(BaseModel):
     summary: dict[str, Any]
     message: Optional[str] = None
     error: Optional[str] = None
+    job_id: Optional[str] = None
+
+
+class IngestionJob(BaseModel):
+    """Status of an upload being parsed and stored in the background."""
+
+    job_id: str
+    status: Literal["queued", "running", "done", "failed"] = "queued"
+    filename: str
+    size: int
+    sha256: str
+    created_at: datetime = Field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+    result: Optional[IngestionResponse] = None
+    error: Optional[str] = None
 
 
 class BidPackage(BaseModel):
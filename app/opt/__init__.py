@@ -1,5 +1,6 @@
 """Optimization strategies and search algorithms."""
 
 from .beam import search
+from .exact import ExactResult, solve
 
-__all__ = ["search"]
+__all__ = ["search", "solve", "ExactResult"]
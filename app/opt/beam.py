@@ -1,112 +1,214 @@
 from __future__ import annotations
 
-import heapq
 import time
-from operator import itemgetter
-from typing import Any
+from typing import NamedTuple
+
+import numpy as np
 
 from app.models import CandidateRationale, CandidateSchedule, FeatureBundle
 from app.rules.engine import DEFAULT_RULES, validate_feasibility
 from app.services.optimizer import (
+    BREAKDOWN_KEYS,
+    ScoringPlan,
     _generate_rationale,
-    _get_scoring_weights,
-    _get_seniority_adjustment,
     _rule_hits_misses,
-    _score_block_hours,
-    _score_commutability,
-    _score_days_off,
-    _score_duty_hours,
-    _score_equipment,
-    _score_layover_quality,
-    _score_report_time,
-    _score_trip_length,
+    _score_frame,
+    _sum_breakdown,
 )
+from app.services.pairing_frame import PairingFrame, day_mask
+from app.utils.hashing import stable_hash
+
+
+class _State(NamedTuple):
+    """Partial monthly schedule.
+
+    ``chosen`` holds positions into the score-sorted candidate list; children
+    only add positions after ``chosen[-1]`` so every pairing set is generated
+    exactly once.
+    """
+
+    score: float
+    mask: int
+    credit: float
+    chosen: tuple[int, ...]
+
+
+class _Pool:
+    """Feasible pairings sorted best-first with Python-native columns."""
+
+    def __init__(self, frame: PairingFrame, scores: np.ndarray, allowed: np.ndarray) -> None:
+        idx = np.flatnonzero(allowed)
+        order = idx[np.lexsort((idx, -scores[idx]))]
+        self.rows: list[int] = order.tolist()
+        self.scores: list[float] = scores[order].tolist()
+        self.masks: list[int] = frame.day_masks[order].tolist()
+        self.credits: list[float] = frame.block_hours[order].tolist()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def fits(self, pos: int, mask: int, credit: float, credit_max: float) -> bool:
+        return not (self.masks[pos] & mask) and credit + self.credits[pos] <= credit_max
+
+
+def _prepare(bundle: FeatureBundle) -> tuple[ScoringPlan, PairingFrame, np.ndarray, _Pool]:
+    """Score feasible pairings once and build the best-first candidate pool.
+
+    Pairings that cannot be placed on the month's calendar (no dates, or
+    dates outside it), touch a requested day off or exceed the credit
+    ceiling on their own are dropped from the pool.
+    """
+
+    # Fetch feasible pairings with memoization via rules engine
+    feas = validate_feasibility(bundle, DEFAULT_RULES)["feasible_pairings"]
+
+    plan = ScoringPlan.from_bundle(bundle)
+    frame = PairingFrame(feas)
+    breakdowns = _score_frame(plan, frame)
+    scores = _sum_breakdown(breakdowns) * plan.seniority_factor
+
+    allowed = frame.day_masks != 0
+    allowed &= (frame.day_masks & np.uint64(day_mask(plan.days_off, frame.month))) == 0
+    allowed &= frame.block_hours <= plan.credit_window[1]
+    return plan, frame, breakdowns, _Pool(frame, scores, allowed)
+
+
+def _extend(state: _State, pool: _Pool, pos: int) -> _State:
+    return _State(
+        state.score + pool.scores[pos],
+        state.mask | pool.masks[pos],
+        state.credit + pool.credits[pos],
+        state.chosen + (pos,),
+    )
+
+
+def _complete(state: _State, pool: _Pool, credit_max: float) -> _State:
+    """Greedily fill any remaining calendar gaps so the schedule is maximal."""
+
+    taken = set(state.chosen)
+    for pos in range(len(pool)):
+        if pos not in taken and pool.fits(pos, state.mask, state.credit, credit_max):
+            state = _extend(state, pool, pos)
+    return state._replace(chosen=tuple(sorted(state.chosen)))
+
+
+def _to_candidate(
+    state: _State,
+    pool: _Pool,
+    frame: PairingFrame,
+    breakdowns: np.ndarray,
+    plan: ScoringPlan,
+) -> CandidateSchedule:
+    rows = [pool.rows[pos] for pos in state.chosen]
+    ids = [frame.ids[r] for r in rows]
+    totals = breakdowns[rows].sum(axis=0) if rows else np.zeros(len(BREAKDOWN_KEYS))
+    breakdown = dict(zip(BREAKDOWN_KEYS, totals.tolist()))
+
+    hits: list[str] = []
+    misses: list[str] = []
+    for r in rows:
+        p_hits, p_misses = _rule_hits_misses(plan, frame.records[r])
+        hits.extend(h for h in p_hits if h not in hits)
+        misses.extend(m for m in p_misses if m not in misses)
+    hits = [h for h in hits if h not in misses]
+
+    notes = _generate_rationale(None, breakdown)
+    notes.append(f"{len(ids)} pairings, {state.credit:.1f} credit hours")
+    return CandidateSchedule(
+        candidate_id=f"sched-{stable_hash(ids)[:12]}",
+        score=state.score,
+        hard_ok=not misses,
+        soft_breakdown=breakdown,
+        pairings=ids,
+        rationale=CandidateRationale(hard_hits=hits, hard_misses=misses, notes=notes),
+    )
 
 
 def search(
     bundle: FeatureBundle,
     k: int,
     time_budget_ms: int,
-    max_nodes: int = 1000,
+    max_nodes: int = 50_000,
+    beam_width: int = 32,
+    branch_factor: int = 8,
 ) -> list[CandidateSchedule]:
-    """Beam search over pairings with time and node limits.
+    """Beam search over partial monthly schedules.
+
+    A schedule is a set of feasible pairings whose calendar days do not
+    overlap, that avoids the pilot's requested days off and whose total
+    credit stays inside ``ScoringPlan.credit_window``. Each layer extends every
+    beam state with up to ``branch_factor`` compatible pairings (scores are
+    updated incrementally, overlaps are pruned with day bitmasks) and keeps
+    the best ``beam_width`` children. States that cannot be extended are
+    completed greedily and collected as full schedules.
+
+    The search is anytime: once ``time_budget_ms`` or ``max_nodes`` child
+    expansions are exhausted, the live beam is completed and returned
+    alongside whatever full schedules were already found.
 
     Parameters
     ----------
     bundle: FeatureBundle
         Input features including context, prefs, analytics and pairings.
     k: int
-        Number of candidates to return.
+        Number of candidate schedules to return.
     time_budget_ms: int
-        Stop processing after this many milliseconds.
+        Stop expanding after this many milliseconds.
     max_nodes: int
-        Maximum pairings to evaluate.
+        Maximum child states to generate.
+    beam_width: int
+        Partial schedules kept per layer.
+    branch_factor: int
+        Children generated per beam state.
 
     Returns
     -------
     list[CandidateSchedule]
-        Top ``k`` candidate schedules scored individually.
+        Up to ``k`` distinct full schedules, those meeting the minimum credit
+        first, then by descending score. ``pairings`` lists every pairing id.
     """
 
     start = time.perf_counter()
-    # Fetch feasible pairings with memoization via rules engine
-    feas = validate_feasibility(bundle, DEFAULT_RULES)["feasible_pairings"]
+    deadline = start + time_budget_ms / 1000
+    plan, frame, breakdowns, pool = _prepare(bundle)
+    credit_min, credit_max = plan.credit_window
 
-    weights = _get_scoring_weights(bundle)
-    seniority_factor = _get_seniority_adjustment(bundle)
+    finished: dict[tuple[int, ...], _State] = {}
 
-    items: list[tuple[float, int, str, dict[str, float], Any]] = []
-    for i, p in enumerate(feas):
-        if i >= max_nodes:
+    def _finish(state: _State) -> None:
+        done = _complete(state, pool, credit_max)
+        finished.setdefault(done.chosen, done)
+
+    beam = [_State(0.0, 0, 0.0, ())]
+    nodes = 0
+    while beam:
+        children: list[_State] = []
+        for state in beam:
+            first = state.chosen[-1] + 1 if state.chosen else 0
+            grown = 0
+            for pos in range(first, len(pool)):
+                if grown >= branch_factor or nodes >= max_nodes:
+                    break
+                if pool.fits(pos, state.mask, state.credit, credit_max):
+                    children.append(_extend(state, pool, pos))
+                    grown += 1
+                    nodes += 1
+            if not grown and state.chosen:
+                _finish(state)
+        if not children:
             break
-        elapsed_ms = (time.perf_counter() - start) * 1000
-        if elapsed_ms >= time_budget_ms:
+        children.sort(key=lambda s: (-s.score, s.chosen))
+        beam = children[:beam_width]
+        if nodes >= max_nodes or time.perf_counter() >= deadline:
+            for state in beam:
+                _finish(state)
             break
-        pid = p.get("id", "")
-        city = p.get("layover_city")
-        award = bundle.analytics_features.get("base_stats", {}).get(city, {}).get("award_rate", 0.5)
-        prefs_d = bundle.preference_schema.soft_prefs.model_dump()
-        layover_pref = prefs_d.get("layovers") or {}
-        prefer = set(layover_pref.get("prefer") or [])
-        avoid = set(layover_pref.get("avoid") or [])
-        pref_w = layover_pref.get("weight", 1.0)
-        if city in prefer:
-            pref_score = 1.0
-        elif city in avoid:
-            pref_score = 0.0
-        else:
-            pref_score = 0.5
-        breakdown: dict[str, float] = {
-            "award_rate": weights.get("award_rate", 0.0) * award,
-            "layovers": weights.get("layovers", 0.0) * pref_w * pref_score,
-            "days_off": _score_days_off(bundle, p, weights),
-            "block_hours": _score_block_hours(p, weights),
-            "duty_hours": _score_duty_hours(p, weights),
-            "layover_quality": _score_layover_quality(p, weights),
-            "report_time": _score_report_time(bundle, p, weights),
-            "commutability": _score_commutability(p, weights),
-            "trip_length": _score_trip_length(bundle, p, weights),
-            "equipment": _score_equipment(bundle, p, weights),
-        }
-        score = sum(breakdown.values()) * seniority_factor
-        items.append((score, -i, pid, breakdown, p))
-
-    winners = heapq.nlargest(k, items, key=itemgetter(0, 1))
-    result: list[CandidateSchedule] = []
-    for winner_score, _neg_i, pid, breakdown, pairing in winners:
-        hits, misses = _rule_hits_misses(bundle, pairing)
-        result.append(
-            CandidateSchedule(
-                candidate_id=pid,
-                score=winner_score,
-                hard_ok=len(misses) == 0,
-                soft_breakdown=breakdown,
-                pairings=[pid],
-                rationale=CandidateRationale(
-                    hard_hits=hits,
-                    hard_misses=misses,
-                    notes=_generate_rationale(pairing, breakdown),
-                ),
-            )
-        )
-    return result
+
+    ranked = sorted(
+        finished.values(),
+        key=lambda s: (s.credit < credit_min, -s.score, s.chosen),
+    )
+    return [_to_candidate(s, pool, frame, breakdowns, plan) for s in ranked[: max(k, 0)]]
+
+
+__all__ = ["search"]
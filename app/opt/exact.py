@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import math
+import time
+from typing import Optional
+
+from pydantic import BaseModel
+
+from app.models import CandidateSchedule, FeatureBundle
+from app.opt.beam import _complete, _Pool, _prepare, _State, _to_candidate
+from app.services.pairing_frame import LAST_DAY
+
+MEMO_LIMIT = 500_000
+
+
+class ExactResult(BaseModel):
+    """Outcome of :func:`solve`.
+
+    ``optimal`` is True when the search space was exhausted. Otherwise
+    ``upper_bound`` is the best score any unexplored schedule could still
+    reach and ``gap`` is ``(upper_bound - score) / |upper_bound|``.
+    """
+
+    schedule: Optional[CandidateSchedule] = None
+    optimal: bool
+    upper_bound: float
+    gap: float
+    nodes: int
+    elapsed_ms: float
+
+
+def _first_day(mask: int) -> int:
+    return (mask & -mask).bit_length() - 1
+
+
+class _Slots:
+    """Day-ordered decision slots over the best-first pool.
+
+    Slot ``t`` in 1..:data:`LAST_DAY` decides which pairing (if any) starts
+    on day ``t``; every pooled pairing has a place on the calendar (see
+    :func:`app.opt.beam._prepare`). ``bound[t]`` is an admissible upper bound
+    on what slots ``t..`` can still add: a weighted interval scheduling DP
+    over days, with pairings on non-consecutive days relaxed to block only
+    their first day.
+    """
+
+    def __init__(self, pool: _Pool) -> None:
+        self.starts: list[list[int]] = [[] for _ in range(LAST_DAY + 2)]
+        for pos, mask in enumerate(pool.masks):
+            self.starts[_first_day(mask)].append(pos)
+        self.end = LAST_DAY + 1
+
+        days = [0.0] * (LAST_DAY + 2)
+        for t in range(LAST_DAY, 0, -1):
+            best = days[t + 1]
+            for pos in self.starts[t]:
+                mask = pool.masks[pos]
+                last = mask.bit_length() - 1
+                contiguous = mask == (1 << (last + 1)) - (1 << t)
+                rest = days[last + 1] if contiguous else days[t + 1]
+                best = max(best, pool.scores[pos] + rest)
+            days[t] = best
+        self.bound = days
+
+    def next_free(self, slot: int, mask: int) -> int:
+        while slot <= LAST_DAY and (mask >> slot) & 1:
+            slot += 1
+        return slot
+
+    def options(self, slot: int) -> list[int]:
+        """Pool positions that may be taken at ``slot``, best first."""
+
+        return self.starts[slot]
+
+
+def _dominated(
+    seen: list[tuple[float, float]], score: float, credit: float, window: tuple[float, float]
+) -> bool:
+    """True when an earlier state at the same slot and calendar is at least as good.
+
+    More credit only helps reach the monthly minimum and only hurts against
+    the maximum, so credit is compared in whichever direction is binding.
+    """
+
+    credit_min, credit_max = window
+    for s, c in seen:
+        if s < score:
+            continue
+        if credit_min <= 0 and c <= credit:
+            return True
+        if math.isinf(credit_max) and c >= credit:
+            return True
+        if c == credit:
+            return True
+    return False
+
+
+def solve(
+    bundle: FeatureBundle,
+    time_budget_ms: int = 60_000,
+    max_nodes: int = 5_000_000,
+) -> ExactResult:
+    """Branch-and-bound search for the highest scoring monthly schedule.
+
+    Uses the same feasible pool, per-pairing scores and calendar/credit
+    constraints as :func:`app.opt.beam.search`, so its result upper-bounds the
+    beam's best schedule. The month is decided day by day (see
+    :class:`_Slots`); the incumbent is seeded greedily, subtrees whose
+    admissible bound cannot beat it are pruned, day overlaps are rejected
+    with bitmasks and states dominated by an earlier state with the same slot
+    and remaining calendar are skipped. Without a binding credit window the
+    dominance check collapses the search to the interval DP.
+
+    When ``time_budget_ms`` or ``max_nodes`` is hit the best schedule found
+    so far is returned with ``optimal=False`` and the remaining gap.
+    """
+
+    start = time.perf_counter()
+    deadline = start + time_budget_ms / 1000
+    plan, frame, breakdowns, pool = _prepare(bundle)
+    window = plan.credit_window
+    credit_min, credit_max = window
+    slots = _Slots(pool)
+    bound = slots.bound
+
+    best: Optional[_State] = None
+    seed = _complete(_State(0.0, 0, 0.0, ()), pool, credit_max)
+    if seed.chosen and seed.credit >= credit_min:
+        best = seed
+    best_score = best.score if best else -math.inf
+
+    memo: dict[tuple[int, int], list[tuple[float, float]]] = {}
+
+    def _admit(slot: int, mask: int, score: float, credit: float) -> bool:
+        key = (slot, mask >> slot)
+        seen = memo.get(key)
+        if seen is not None and _dominated(seen, score, credit, window):
+            return False
+        if seen is None and len(memo) < MEMO_LIMIT:
+            memo[key] = seen = []
+        if seen is not None:
+            seen.append((score, credit))
+        return True
+
+    # node: [score, mask, credit, chosen, slot, next option index]
+    stack: list[list] = [[0.0, 0, 0.0, (), slots.next_free(1, 0), 0]]
+    nodes = steps = 0
+    exhausted = True
+    while stack:
+        steps += 1
+        if nodes >= max_nodes or ((steps & 0xFF) == 1 and time.perf_counter() >= deadline):
+            exhausted = False
+            break
+        node = stack[-1]
+        score, mask, credit, chosen, slot, opt = node
+        if slot >= slots.end or score + bound[slot] <= best_score:
+            stack.pop()
+            continue
+        options = slots.options(slot)
+        child = None
+        while child is None and opt <= len(options):
+            if opt == len(options):
+                # leave this slot empty
+                nxt = slots.next_free(slot + 1, mask)
+                if score + bound[nxt] > best_score and _admit(nxt, mask, score, credit):
+                    child = [score, mask, credit, chosen, nxt, 0]
+            else:
+                pos = options[opt]
+                if pool.fits(pos, mask, credit, credit_max):
+                    c_score = score + pool.scores[pos]
+                    c_mask = mask | pool.masks[pos]
+                    nxt = slots.next_free(slot + 1, c_mask)
+                    if c_score + bound[nxt] > best_score:
+                        c_credit = credit + pool.credits[pos]
+                        if _admit(nxt, c_mask, c_score, c_credit):
+                            child = [c_score, c_mask, c_credit, chosen + (pos,), nxt, 0]
+            opt += 1
+        node[5] = opt
+        if child is None:
+            stack.pop()
+            continue
+        nodes += 1
+        if child[0] > best_score and child[2] >= credit_min and child[3]:
+            best = _State(child[0], child[1], child[2], child[3])
+            best_score = child[0]
+        stack.append(child)
+
+    if exhausted:
+        upper = best_score
+    else:
+        upper = max([best_score] + [nd[0] + bound[nd[4]] for nd in stack if nd[4] < slots.end])
+    if best is None:
+        gap = math.inf
+    elif upper <= best_score:
+        gap = 0.0
+    else:
+        gap = (upper - best_score) / max(abs(upper), 1e-12)
+
+    schedule = None
+    if best is not None:
+        best = best._replace(chosen=tuple(sorted(best.chosen)))
+        schedule = _to_candidate(best, pool, frame, breakdowns, plan)
+    return ExactResult(
+        schedule=schedule,
+        optimal=exhausted,
+        upper_bound=max(upper, best_score),
+        gap=gap,
+        nodes=nodes,
+        elapsed_ms=(time.perf_counter() - start) * 1000,
+    )
+
+
+__all__ = ["ExactResult", "solve"]
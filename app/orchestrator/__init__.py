@@ -1 +1 @@
-from .run import compile_inputs  # noqa: F401
+from .run import CompiledInputs, Stage, StageTiming, compile_inputs, run_stages  # noqa: F401
@@ -1,8 +1,230 @@
-from typing import Any
+"""Concurrent input compilation for one optimization request.
 
-from app.models import ContextSnapshot
+``compile_inputs`` runs the request's independent stages as a small DAG on
+the event loop: preference parsing, context enrichment and analytics lookup
+start together, and the rule precheck starts as soon as parsing is done.
+Blocking stages (the precheck touches the DB) run on a bounded thread pool.
+Every stage has its own timeout; when one fails or times out the others are
+cancelled and the error is raised.
+"""
 
+from __future__ import annotations
 
-async def compile_inputs(ctx: ContextSnapshot, text: str, sliders: dict[str, Any]):
-    # Will run NLP, precheck, analytics via asyncio.gather in PR2
-    raise NotImplementedError("Implemented in PR2")
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+from app.analytics.probability import AwardHistoryStore
+from app.fusion import fuse
+from app.models import (
+    ContextSnapshot,
+    FeatureBundle,
+    PreferenceSchema,
+)
+from app.rules.engine import DEFAULT_RULES, validate_feasibility
+from app.services.preferences import parse_preference_text
+
+DEFAULT_STAGE_TIMEOUT_S = 10.0
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="compile-inputs")
+
+
+class StageTiming(BaseModel):
+    """Offsets are milliseconds from the start of the run."""
+
+    start_ms: float
+    end_ms: float
+    elapsed_ms: float
+
+
+class CompiledInputs(BaseModel):
+    bundle: FeatureBundle
+    timings: dict[str, StageTiming]
+    critical_path: list[str]
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One DAG node.
+
+    ``fn`` receives the results of ``deps`` as keyword arguments. Coroutine
+    functions are awaited on the loop; plain functions are treated as
+    blocking and run on the executor.
+    """
+
+    name: str
+    fn: Callable[..., Any]
+    deps: tuple[str, ...] = ()
+    timeout: float = DEFAULT_STAGE_TIMEOUT_S
+
+
+async def run_stages(
+    stages: list[Stage], executor: Optional[Executor] = None
+) -> tuple[dict[str, Any], dict[str, StageTiming]]:
+    """Run ``stages`` as soon as their dependencies finish.
+
+    Returns each stage's result and timing. The first failure (including
+    ``asyncio.TimeoutError`` from a stage timeout) cancels every stage still
+    pending or running and is re-raised. A blocking stage already running
+    in a worker thread cannot be interrupted; its result is discarded.
+    """
+
+    by_name = {s.name: s for s in stages}
+    for s in stages:
+        missing = [d for d in s.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"stage {s.name} depends on unknown stages {missing}")
+
+    loop = asyncio.get_running_loop()
+    t0 = time.perf_counter()
+    timings: dict[str, StageTiming] = {}
+    tasks: dict[str, asyncio.Task] = {}
+
+    async def _run(stage: Stage) -> Any:
+        kwargs = {d: await tasks[d] for d in stage.deps}
+        start = time.perf_counter()
+        if asyncio.iscoroutinefunction(stage.fn):
+            work: Awaitable[Any] = stage.fn(**kwargs)
+        else:
+            work = loop.run_in_executor(executor or _EXECUTOR, lambda: stage.fn(**kwargs))
+        result = await asyncio.wait_for(work, stage.timeout)
+        end = time.perf_counter()
+        timings[stage.name] = StageTiming(
+            start_ms=(start - t0) * 1000,
+            end_ms=(end - t0) * 1000,
+            elapsed_ms=(end - start) * 1000,
+        )
+        return result
+
+    # Creation order does not matter: a task only awaits its deps once it runs.
+    for s in stages:
+        tasks[s.name] = asyncio.ensure_future(_run(s))
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    return {name: task.result() for name, task in tasks.items()}, timings
+
+
+def critical_path(stages: list[Stage], timings: dict[str, StageTiming]) -> list[str]:
+    """Chain of stages that determined the finish time, first to last.
+
+    Starts at the stage that ended last and repeatedly steps to the
+    dependency that finished last.
+    """
+
+    if not timings:
+        return []
+    deps = {s.name: s.deps for s in stages}
+    node = max(timings, key=lambda n: timings[n].end_ms)
+    path = [node]
+    while deps.get(node):
+        node = max(deps[node], key=lambda n: timings[n].end_ms)
+        path.append(node)
+    return path[::-1]
+
+
+def _parse_preferences(
+    ctx: ContextSnapshot, text: str, sliders: dict[str, Any]
+) -> PreferenceSchema:
+    hard, soft = parse_preference_text(text)
+    return PreferenceSchema(
+        pilot_id=ctx.pilot_id,
+        airline="UAL",
+        base=ctx.base,
+        seat=ctx.seat,
+        equip=list(ctx.equip),
+        hard_constraints=hard,
+        soft_prefs=soft,
+        source={"text": text, "sliders": dict(sliders)},
+    )
+
+
+def _enrich_context(ctx: ContextSnapshot, sliders: dict[str, Any]) -> ContextSnapshot:
+    weights = dict(ctx.default_weights)
+    weights.update(
+        {
+            k: float(v)
+            for k, v in sliders.items()
+            if isinstance(v, (int, float)) and not isinstance(v, bool)
+        }
+    )
+    return ctx.model_copy(update={"default_weights": weights})
+
+
+def _lookup_analytics(ctx: ContextSnapshot, analytics: dict[str, Any]) -> dict[str, Any]:
+    out = dict(analytics)
+    store = out.get("award_history")
+    if isinstance(store, AwardHistoryStore):
+        fleet = ctx.equip[0] if ctx.equip else ""
+        out["award_history"] = store.get(ctx.base, fleet, ctx.seat, str(out.get("month", "")))
+    return out
+
+
+async def compile_inputs(
+    ctx: ContextSnapshot,
+    text: str,
+    sliders: dict[str, Any],
+    pairings: Optional[dict[str, Any]] = None,
+    analytics: Optional[dict[str, Any]] = None,
+    rules: Optional[dict[str, Any]] = None,
+    timeouts: Optional[dict[str, float]] = None,
+    executor: Optional[Executor] = None,
+) -> CompiledInputs:
+    """Build a :class:`FeatureBundle` from free text, sliders and the packet.
+
+    Stages: ``parse`` (free text to :class:`PreferenceSchema`), ``enrich``
+    (sliders folded into ``default_weights``), ``analytics`` (award history
+    resolved for the pilot's base/fleet/seat/month), ``precheck``
+    (:func:`validate_feasibility`, after ``parse``) and ``fuse``.
+    ``timeouts`` overrides the per-stage timeout in seconds.
+
+    The result carries per-stage timings and the critical path, the chain of
+    stages that bounded the total latency.
+    """
+
+    pairings = pairings if pairings is not None else {"pairings": []}
+    timeouts = timeouts or {}
+
+    def _precheck(parse: PreferenceSchema) -> dict[str, Any]:
+        bundle = FeatureBundle(
+            context=ctx,
+            preference_schema=parse,
+            analytics_features={},
+            compliance_flags={},
+            pairing_features=pairings,
+        )
+        return validate_feasibility(bundle, rules or DEFAULT_RULES)
+
+    def _fuse(
+        parse: PreferenceSchema,
+        enrich: ContextSnapshot,
+        analytics: dict[str, Any],
+        precheck: dict[str, Any],
+    ) -> FeatureBundle:
+        return fuse(enrich, parse, precheck, analytics, pairings)
+
+    def _stage(name: str, fn: Callable[..., Any], deps: tuple[str, ...] = ()) -> Stage:
+        return Stage(name, fn, deps, timeouts.get(name, DEFAULT_STAGE_TIMEOUT_S))
+
+    stages = [
+        _stage("parse", lambda: _parse_preferences(ctx, text, sliders)),
+        _stage("enrich", lambda: _enrich_context(ctx, sliders)),
+        _stage("analytics", lambda: _lookup_analytics(ctx, analytics or {})),
+        _stage("precheck", _precheck, ("parse",)),
+        _stage("fuse", _fuse, ("parse", "enrich", "analytics", "precheck")),
+    ]
+    results, timings = await run_stages(stages, executor)
+    return CompiledInputs(
+        bundle=results["fuse"],
+        timings=timings,
+        critical_path=critical_path(stages, timings),
+    )
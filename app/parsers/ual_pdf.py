@@ -1,11 +1,18 @@
 from __future__ import annotations
 
+import hashlib
+import multiprocessing
+import os
 import re
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from functools import cache, lru_cache
+from typing import Any, NamedTuple, Optional, Union
 
 import pytz
 from pydantic import BaseModel
+from pytz.tzinfo import BaseTzInfo
 
 # Minimal timezone mapping for airports we expect in tests.
 AIRPORT_TZ = {
@@ -37,30 +44,208 @@ TRIP_BLOCK_RE = re.compile(
     r"EFF\s*(?P<date>\d{2}/\d{2}/\d{2}).*?ID\s*(?P<id>[A-Z]\d{4})(?P<body>.*?CRD-\s*(?P<credit>\d+\.\d{2}))",
     re.DOTALL,
 )
+# The leading \b does not change what matches (a match starting mid-word also
+# matches from the word's start, which is found first); it only skips
+# hopeless starting positions.
 LEG_RE = re.compile(
-    r"(?P<equip>\w+)\s+(?P<flight>\d+)\s+(?P<dep>[A-Z]{3})\s+(?P<arr>[A-Z]{3})\s+"
+    r"\b(?P<equip>\w+)\s+(?P<flight>\d+)\s+(?P<dep>[A-Z]{3})\s+(?P<arr>[A-Z]{3})\s+"
     r"(?P<dep_time>\d{4})\s+(?P<arr_time>\d{4})",
 )
 
 
-def parse_bid_pdf(path: str) -> list[Trip]:
-    """Parse a UAL bid packet text file into Trip models.
+CHUNK_SIZE = 1 << 20
+PAGE_BATCH = 16
+MAX_BLOCK_CHARS = 1 << 14
 
-    The production system reads PDFs, but the tests supply plain text that was
-    extracted from real bid packets to avoid committing binary fixtures.
+# A PDF path, or the file's bytes.
+PdfSource = Union[str, bytes]
+
+
+class LegRecord(NamedTuple):
+    """Compact leg: a plain tuple until :meth:`to_model` is called."""
+
+    flight: str
+    departure_airport: str
+    arrival_airport: str
+    departure: datetime
+    arrival: datetime
+    equipment: Optional[str]
+
+    def to_model(self) -> Leg:
+        return Leg(**self._asdict())
+
+
+class TripRecord(NamedTuple):
+    """Compact trip holding :class:`LegRecord` tuples."""
+
+    trip_id: str
+    credit: float
+    legs: tuple[LegRecord, ...]
+
+    def to_model(self) -> Trip:
+        return Trip(
+            trip_id=self.trip_id, credit=self.credit, legs=[leg.to_model() for leg in self.legs]
+        )
+
+
+class TripBlock(NamedTuple):
+    """A ``TRIP_BLOCK_RE`` match and its :func:`block_fingerprint`.
+
+    Revised packets repeat most blocks verbatim, so callers holding the
+    previous parse can skip :meth:`parse` for fingerprints they have seen.
+    """
+
+    fingerprint: str
+    match: re.Match[str]
+
+    def parse(self) -> TripRecord:
+        return _trip_record(self.match)
+
+
+@cache
+def _airport_tz(airport: str) -> BaseTzInfo:
+    return pytz.timezone(AIRPORT_TZ.get(airport, "UTC"))
+
+
+@lru_cache(maxsize=1 << 16)
+def _localize(airport: str, naive: datetime) -> datetime:
+    # Packets repeat the same local times at the same stations all month.
+    return _airport_tz(airport).localize(naive)
+
+
+@lru_cache(maxsize=4096)
+def _eff_date(text: str) -> datetime:
+    return datetime.strptime(text, "%m/%d/%y")
+
+
+def parse_bid_pdf(path: str, workers: Optional[int] = None) -> list[Trip]:
+    """Parse a UAL bid packet into Trip models.
+
+    ``.pdf`` files go through :func:`iter_pdf_trips`. Anything else is read as
+    text extracted from a packet; the tests supply such text to avoid
+    committing more binary fixtures.
     """
+    if str(path).lower().endswith(".pdf"):
+        records = iter_pdf_trips(path, workers=workers)
+    else:
+        records = iter_trips(path)
+    trips = [record.to_model() for record in records]
+    if not trips:
+        raise ValueError("no trips found")
+    return trips
+
+
+def iter_trips(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[TripRecord]:
+    """Yield :class:`TripRecord` objects from a bid packet text file as it is read."""
     with open(path, encoding="utf-8") as fh:
-        text = fh.read()
-    return _parse_text(text)
+        yield from iter_trip_stream(iter(lambda: fh.read(chunk_size), ""))
 
 
-def _parse_text(text: str) -> list[Trip]:
-    trips: list[Trip] = []
+def iter_trip_stream(chunks: Iterable[str]) -> Iterator[TripRecord]:
+    """Yield trips from consecutive pieces of packet text (file chunks, PDF pages)."""
+    for block in iter_trip_blocks(chunks):
+        yield block.parse()
+
+
+def iter_trip_blocks(chunks: Iterable[str]) -> Iterator[TripBlock]:
+    """Yield the trip blocks found in consecutive pieces of packet text, unparsed.
+
+    Only the unfinished tail of the previous piece is kept, so a packet never
+    sits in memory as a whole and a trip block may straddle pieces. Trip
+    blocks have no lookahead, so a block found in the buffer is final and the
+    output equals :func:`iter_trip_records` over the joined text, except that
+    a "block" longer than ``MAX_BLOCK_CHARS`` is never completed. Real blocks
+    are a few KB; longer spans only arise when an ``EFF`` line never reaches
+    a matching ``ID``, and carrying those would rescan a growing tail on
+    every piece.
+    """
+    tail = ""
+    for chunk in chunks:
+        buf = tail + chunk
+        end = 0
+        for match in TRIP_BLOCK_RE.finditer(buf):
+            yield TripBlock(block_fingerprint(match.group(0)), match)
+            end = match.end()
+        # Text before the next "EFF" can never start a block.
+        start = buf.find("EFF", max(end, len(buf) - MAX_BLOCK_CHARS))
+        tail = buf[start:] if start >= 0 else buf[-2:]
+
+
+def block_fingerprint(block: str) -> str:
+    """Digest of a trip block's text; equal digests parse to equal trips."""
+    return hashlib.blake2b(block.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def iter_pdf_trips(
+    source: PdfSource, workers: Optional[int] = None, batch: int = PAGE_BATCH
+) -> Iterator[TripRecord]:
+    """Yield trips from a PDF packet while its pages are still being extracted."""
+    return iter_trip_stream(iter_pdf_pages(source, workers=workers, batch=batch))
+
+
+def iter_pdf_pages(
+    source: PdfSource, workers: Optional[int] = None, batch: int = PAGE_BATCH
+) -> Iterator[str]:
+    """Yield the text of each page of a PDF (a path or its bytes), in order.
+
+    Text extraction is CPU bound, so packets longer than one ``batch`` of
+    pages are split into page ranges extracted by a process pool of
+    ``workers`` (default ``PDF_EXTRACT_WORKERS`` or the CPU count). Pages are
+    yielded as soon as their range and all earlier ones are done.
+    """
+    if workers is None:
+        workers = int(os.environ.get("PDF_EXTRACT_WORKERS", os.cpu_count() or 1))
+    with _open_pdf(source) as doc:
+        page_count = doc.page_count
+        if workers <= 1 or page_count <= batch:
+            for page in doc:
+                yield page.get_text()
+            return
+
+    starts = range(0, page_count, batch)
+    stops = [min(start + batch, page_count) for start in starts]
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(starts)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_extract_worker,
+        initargs=(source,),
+    ) as pool:
+        for pages in pool.map(_extract_pages, starts, stops):
+            yield from pages
+
+
+def _open_pdf(source: PdfSource) -> Any:
+    try:
+        import pymupdf
+    except ImportError:  # PyMuPDF before 1.24.3 only ships the ``fitz`` name
+        import fitz as pymupdf
+
+    if isinstance(source, bytes):
+        return pymupdf.open(stream=source, filetype="pdf")
+    return pymupdf.open(source)
+
+
+_WORKER_DOC: Any = None
+
+
+def _init_extract_worker(source: PdfSource) -> None:
+    # Each worker opens the packet once and keeps it for all its page ranges.
+    global _WORKER_DOC
+    _WORKER_DOC = _open_pdf(source)
+
+
+def _extract_pages(start: int, stop: int) -> list[str]:
+    return [_WORKER_DOC[i].get_text() for i in range(start, stop)]
+
+
+def iter_trip_records(text: str) -> Iterator[TripRecord]:
+    """Yield a :class:`TripRecord` per trip block in ``text``."""
     for match in TRIP_BLOCK_RE.finditer(text):
-        block = match.group(0)
-        trip = _parse_trip_block(block)
-        if trip:
-            trips.append(trip)
+        yield _trip_record(match)
+
+
+def _parse_text(text: str) -> list[Trip]:
+    trips = [record.to_model() for record in iter_trip_records(text)]
     if not trips:
         raise ValueError("no trips found")
     return trips
@@ -70,32 +255,30 @@ def _parse_trip_block(block: str) -> Optional[Trip]:
     m = TRIP_BLOCK_RE.search(block)
     if not m:
         return None
-    trip_id = m.group("id")
-    credit = float(m.group("credit"))
-    base_date = datetime.strptime(m.group("date"), "%m/%d/%y")
-    legs: list[Leg] = []
-    current = base_date
-    for leg_match in LEG_RE.finditer(block):
-        dep_time_str = leg_match.group("dep_time")
-        arr_time_str = leg_match.group("arr_time")
-        dep_naive = _combine(current, dep_time_str)
-        arr_naive = _combine(dep_naive, arr_time_str)
-        dep_tz = pytz.timezone(AIRPORT_TZ.get(leg_match.group("dep"), "UTC"))
-        arr_tz = pytz.timezone(AIRPORT_TZ.get(leg_match.group("arr"), "UTC"))
-        dep_dt = dep_tz.localize(dep_naive)
-        arr_dt = arr_tz.localize(arr_naive)
+    return _trip_record(m).to_model()
+
+
+def _trip_record(match: re.Match[str]) -> TripRecord:
+    """Build a trip from a ``TRIP_BLOCK_RE`` match, scanning only its span for legs."""
+    current = _eff_date(match.group("date"))
+    legs: list[LegRecord] = []
+    for equip, flight, dep, arr, dep_time, arr_time in LEG_RE.findall(
+        match.string, match.start(), match.end()
+    ):
+        dep_naive = _combine(current, dep_time)
+        arr_naive = _combine(dep_naive, arr_time)
         legs.append(
-            Leg(
-                flight=leg_match.group("flight"),
-                departure_airport=leg_match.group("dep"),
-                arrival_airport=leg_match.group("arr"),
-                departure=dep_dt,
-                arrival=arr_dt,
-                equipment=leg_match.group("equip"),
+            LegRecord(
+                flight,
+                dep,
+                arr,
+                _localize(dep, dep_naive),
+                _localize(arr, arr_naive),
+                equip,
             )
         )
         current = arr_naive
-    return Trip(trip_id=trip_id, credit=credit, legs=legs)
+    return TripRecord(match.group("id"), float(match.group("credit")), tuple(legs))
 
 
 def _combine(base: datetime, time_str: str) -> datetime:
@@ -107,4 +290,18 @@ def _combine(base: datetime, time_str: str) -> datetime:
     return candidate
 
 
-__all__ = ["Trip", "Leg", "parse_bid_pdf"]
+__all__ = [
+    "Leg",
+    "LegRecord",
+    "Trip",
+    "TripBlock",
+    "TripRecord",
+    "block_fingerprint",
+    "iter_pdf_pages",
+    "iter_pdf_trips",
+    "iter_trip_blocks",
+    "iter_trip_records",
+    "iter_trip_stream",
+    "iter_trips",
+    "parse_bid_pdf",
+]
@@ -1,16 +1,22 @@
 """Ingestion routes for bid package uploads."""
 
-from typing import Annotated
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, File, Form, HTTPException, Query, UploadFile
+from fastapi.responses import JSONResponse
 
-from app.models import IngestionRequest, IngestionResponse
+from app.models import IngestionJob, IngestionRequest, IngestionResponse
+from app.services.ingest_jobs import ingest_jobs
 from app.services.ingestion import ingestion_service
 
 router = APIRouter()
 
 
-@router.post("/api/ingest", response_model=IngestionResponse)
+@router.post(
+    "/api/ingest",
+    response_model=IngestionResponse,
+    responses={202: {"model": IngestionJob, "description": "Queued (`wait=false`)"}},
+)
 async def ingest_bid_package(
     file: Annotated[UploadFile, File(description="Bid package file (PDF, CSV, TXT, JSONL)")],
     airline: Annotated[str, Form(description="Airline code (e.g., UAL)")],
@@ -19,19 +25,29 @@ async def ingest_bid_package(
     fleet: Annotated[str, Form(description="Aircraft fleet (e.g., 737)")],
     seat: Annotated[str, Form(description="Pilot seat (FO or CA)")],
     pilot_id: Annotated[str, Form(description="Pilot identifier")],
-) -> IngestionResponse:
+    revises: Annotated[
+        Optional[str], Form(description="pairing_set_id of the packet this file revises")
+    ] = None,
+    wait: Annotated[
+        bool, Query(description="Wait for the parse; false returns 202 with a job")
+    ] = True,
+):
     """
     Ingest a bid package file and return parsed summary.
 
     Supports PDF, CSV, TXT, and JSONL formats.
     Returns summary with trip count, legs, date span, and credit total.
+    The upload is spooled to disk and parsed by a background job; with
+    ``wait=false`` the job is returned immediately (poll ``/api/ingest/{job_id}``).
+
+    A revised packet can name the set it replaces in ``revises``: unchanged
+    trip blocks are reused rather than parsed again, and the summary carries
+    the pairing-level ``delta``.
     """
     try:
-        # Read file content
-        file_content = await file.read()
-
-        if not file_content:
-            raise HTTPException(status_code=400, detail="Empty file uploaded")
+        error = ingestion_service.format_error(file.filename)
+        if error is not None:
+            raise HTTPException(status_code=400, detail=error)
 
         # Create ingestion request
         request = IngestionRequest(
@@ -41,10 +57,20 @@ async def ingest_bid_package(
             fleet=fleet,
             seat=seat,
             pilot_id=pilot_id,
+            revises=revises,
         )
 
-        # Process the file
-        response = ingestion_service.ingest(file_content, file.filename, request)
+        # Copy the upload to disk in chunks, hashing as we go
+        upload = await ingest_jobs.spool(file.file)
+        if not upload.size:
+            upload.discard()
+            raise HTTPException(status_code=400, detail="Empty file uploaded")
+
+        # Parse and store it off the event loop
+        job = ingest_jobs.submit(upload, file.filename, request)
+        if not wait:
+            return JSONResponse(status_code=202, content=job.model_dump(mode="json"))
+        response = await ingest_jobs.wait(job.job_id)
 
         if not response.success:
             raise HTTPException(status_code=400, detail=response.error)
@@ -55,3 +81,12 @@ async def ingest_bid_package(
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}") from e
+
+
+@router.get("/api/ingest/{job_id}", response_model=IngestionJob)
+async def ingest_job_status(job_id: str) -> IngestionJob:
+    """Status of an ingestion job, with its response once finished."""
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingestion job: {job_id}")
+    return job
@@ -0,0 +1,174 @@
+"""Bounded cache of pilot-independent feasibility results.
+
+The FAR 117 rest check in :func:`app.rules.engine.validate_feasibility` only
+depends on the pairing set, so its result is shared by every pilot bidding
+the same packet. Entries are keyed by nothing but the id of a set held in
+:data:`~app.services.pairing_repo.pairing_repository`. That id is the
+server's own hash of the packet, so a client cannot read another packet's
+entry or pin a stale one. Inline pairings are not cached: a key that is safe
+to share needs a hash of the whole payload, which costs more than the rest
+check it would save. The cache only pays off for bundles that reference a
+``pairing_set_id``.
+Pilot-specific filters (such as no red-eyes) are applied afterwards as a mask
+over the cached rows.
+
+The cache is LRU with two bounds: the number of entries and the total number
+of pairings held. Hits, misses and evictions are exported as Prometheus
+counters and show up on ``/metrics``.
+
+When a revised packet supersedes a cached one, :meth:`FeasibilityCache.derive`
+carries the old entry over to the new set id through a patch function
+instead of leaving the next request to recompute from scratch.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+import numpy as np
+from prometheus_client import Counter, Gauge
+
+from app.models import FeatureBundle
+from app.services.pairing_repo import pairing_set_of
+
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_MAX_PAIRINGS = 1_000_000
+
+CACHE_HITS = Counter(
+    "vectorbid_feasibility_cache_hits_total", "Feasibility cache lookups served from memory"
+)
+CACHE_MISSES = Counter(
+    "vectorbid_feasibility_cache_misses_total", "Feasibility cache lookups that recomputed"
+)
+CACHE_EVICTIONS = Counter(
+    "vectorbid_feasibility_cache_evictions_total", "Feasibility cache entries evicted"
+)
+CACHE_ENTRIES = Gauge("vectorbid_feasibility_cache_entries", "Feasibility cache entries held")
+
+
+def cached_set_id(bundle: FeatureBundle) -> Optional[str]:
+    """Repository set id of ``bundle``'s pairings, or None when they are inline.
+
+    A ``pairing_set_id`` counts only when the repository holds that set
+    (:class:`~app.services.pairing_repo.UnknownPairingSet` otherwise); its id
+    is the server's own hash of the packet.
+    """
+
+    pset = pairing_set_of(bundle.pairing_features)
+    return pset.set_id if pset is not None else None
+
+
+@dataclass(frozen=True)
+class BaseFeasibility:
+    """Pilot-independent part of a feasibility check.
+
+    ``redeye`` is aligned with ``feasible_pairings`` so pilot filters can be
+    applied as a boolean mask.
+    """
+
+    violations: tuple[dict[str, Any], ...]
+    feasible_pairings: tuple[dict[str, Any], ...]
+    redeye: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.violations) + len(self.feasible_pairings)
+
+
+class FeasibilityCache:
+    """Thread-safe LRU of :class:`BaseFeasibility` results."""
+
+    def __init__(
+        self, max_entries: int = DEFAULT_MAX_ENTRIES, max_pairings: int = DEFAULT_MAX_PAIRINGS
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_pairings = max_pairings
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, BaseFeasibility] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_compute(
+        self, key: Hashable, compute: Callable[[], BaseFeasibility]
+    ) -> BaseFeasibility:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                CACHE_HITS.inc()
+                return entry
+            self.misses += 1
+            CACHE_MISSES.inc()
+        entry = compute()
+        self.put(key, entry)
+        return entry
+
+    def put(self, key: Hashable, entry: BaseFeasibility) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = entry
+            self._size += len(entry)
+            # The newest entry is always kept, even when it alone exceeds the budget.
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self._size > self.max_pairings
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+                CACHE_EVICTIONS.inc()
+            CACHE_ENTRIES.set(len(self._entries))
+
+    def get(self, key: Hashable) -> Optional[BaseFeasibility]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def derive(
+        self,
+        old_id: str,
+        new_id: str,
+        rebuild: Callable[[BaseFeasibility], BaseFeasibility],
+    ) -> int:
+        """Add ``rebuild(entry)`` under ``new_id`` if an entry is keyed by ``old_id``.
+
+        The old entry stays until evicted. Returns the number of entries
+        derived (0 or 1).
+        """
+        entry = self.get(old_id)
+        if entry is None:
+            return 0
+        self.put(new_id, rebuild(entry))
+        return 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            CACHE_ENTRIES.set(0)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "pairings": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+__all__ = [
+    "BaseFeasibility",
+    "FeasibilityCache",
+    "cached_set_id",
+]
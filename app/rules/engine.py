@@ -2,15 +2,18 @@ from __future__ import annotations
 
 import logging
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
+import numpy as np
 import yaml
 from pydantic import ValidationError
 
 from app.audit import log_event
-from app.db import Pilot, Preference, RulePack as RulePackModel, SessionLocal
+from app.db import Pilot, Preference, RulePack as RulePackModel, persistence
 from app.models import FeatureBundle
+from app.rules.cache import BaseFeasibility, FeasibilityCache, cached_set_id
 from app.rules.models import RulePack
+from app.services.pairing_repo import PairingDelta, pairing_repository, pairings_of
 
 DEFAULT_RULES: dict[str, Any] = {
     "hard": [
@@ -24,22 +27,78 @@ DEFAULT_RULES: dict[str, Any] = {
 }
 
 _RULE_CACHE: dict[str, dict[str, Any]] = {}
-_PAIRING_CACHE: dict[
-    tuple[str, str, str, str, str, str], tuple[tuple[str, ...], dict[str, Any]]
-] = {}
+_PAIRING_CACHE = FeasibilityCache()
 
 
-def _cache_key(bundle: FeatureBundle) -> tuple[str, str, str, str, str, str]:
-    ctx = bundle.context
-    pairings = bundle.pairing_features.get("pairings", []) or []
-    month = ""
+def _rest_violation(p: dict[str, Any]) -> Optional[dict[str, Any]]:
+    if p.get("rest_hours", 999) < 10:
+        return {"pairing_id": p.get("id"), "rule": "FAR117_MIN_REST"}
+    return None
+
+
+def _base_feasibility(pairings: list[dict[str, Any]]) -> BaseFeasibility:
+    violations: list[dict[str, Any]] = []
+    feasible: list[dict[str, Any]] = []
+    for p in pairings:
+        violation = _rest_violation(p)
+        if violation is not None:
+            violations.append(violation)
+        else:
+            feasible.append(p)
+    redeye = np.fromiter((bool(p.get("redeye")) for p in feasible), dtype=bool, count=len(feasible))
+    return BaseFeasibility(tuple(violations), tuple(feasible), redeye)
+
+
+def _patch_feasibility(
+    old: BaseFeasibility, delta: PairingDelta, pairings: list[dict[str, Any]]
+) -> BaseFeasibility:
+    """``old`` brought up to date with ``delta``, in the order of ``pairings``.
+
+    Only added and changed pairings are checked again; the rest keep their
+    previous outcome. Falls back to a full check when ids are not unique.
+    """
+    if not delta.exact:
+        return _base_feasibility(pairings)
+    stale = delta.affected_ids
+    failed = {v["pairing_id"]: v for v in old.violations if v["pairing_id"] not in stale}
+    passed = {
+        p.get("id"): (p, red)
+        for p, red in zip(old.feasible_pairings, old.redeye.tolist())
+        if p.get("id") not in stale
+    }
+    violations: list[dict[str, Any]] = []
+    feasible: list[dict[str, Any]] = []
+    redeye: list[bool] = []
     for p in pairings:
-        m = p.get("month")
-        if m:
-            month = str(m)
-            break
-    equip = ",".join(sorted(ctx.equip))
-    return (ctx.airline, month, ctx.base, equip, ctx.seat, ctx.pilot_id)
+        pid = p.get("id")
+        if pid in failed:
+            violations.append(failed[pid])
+            continue
+        kept = passed.get(pid)
+        if kept is not None:
+            feasible.append(kept[0])
+            redeye.append(kept[1])
+            continue
+        violation = _rest_violation(p)
+        if violation is not None:
+            violations.append(violation)
+        else:
+            feasible.append(p)
+            redeye.append(bool(p.get("redeye")))
+    return BaseFeasibility(tuple(violations), tuple(feasible), np.array(redeye, dtype=bool))
+
+
+def _apply_delta(delta: PairingDelta) -> None:
+    """Carry cached results for a revised packet over to its new pairing set."""
+    pairings = pairing_repository.get(delta.new_set_id).pairings
+    _PAIRING_CACHE.derive(
+        delta.old_set_id,
+        delta.new_set_id,
+        lambda entry: _patch_feasibility(entry, delta, pairings) if delta else entry,
+    )
+
+
+pairing_repository.subscribe(_apply_delta)
 
 
 def _merge_sections(data: dict[str, Any]) -> dict[str, Any]:
@@ -99,56 +158,49 @@ def validate_feasibility(bundle: FeatureBundle, rules: dict[str, Any]) -> dict[s
     Flags pairings that are red-eyes when the preference disallows them or
     whose rest_hours fall below 10. Returns a dict with ``violations`` and
     ``feasible_pairings`` lists.
+
+    For a ``pairing_set_id`` packet the rest check is cached and shared
+    across pilots (see :mod:`app.rules.cache`); inline pairings are checked
+    directly. The red-eye preference is applied on top. The pilot,
+    preference and rule pack rows are queued on :data:`app.db.persistence`
+    rather than written inline.
     """
 
-    key = _cache_key(bundle)
     pref = bundle.preference_schema.model_dump()
-    pairings = bundle.pairing_features.get("pairings", [])
+    pairings = pairings_of(bundle.pairing_features)
     no_red = pref.get("hard_constraints", {}).get("no_red_eyes")
-    sig = tuple(sorted(p.get("id", "") for p in pairings))
-
-    cached = _PAIRING_CACHE.get(key)
-    if cached and cached[0] == sig:
-        base = cached[1]
+    set_id = cached_set_id(bundle)
+    if set_id is None:
+        base = _base_feasibility(pairings)
     else:
-        base_violations: list[dict[str, Any]] = []
-        base_feasible: list[dict[str, Any]] = []
-        for p in pairings:
-            pid = p.get("id")
-            if p.get("rest_hours", 999) < 10:
-                base_violations.append({"pairing_id": pid, "rule": "FAR117_MIN_REST"})
-            else:
-                base_feasible.append(p)
-        base = {"violations": base_violations, "feasible_pairings": base_feasible}
-        _PAIRING_CACHE[key] = (sig, base)
-
-    violations: list[dict[str, Any]] = list(base["violations"])
-    feasible: list[dict[str, Any]] = []
-    for p in base["feasible_pairings"]:
-        if no_red and p.get("redeye"):
-            violations.append({"pairing_id": p.get("id"), "rule": "NO_REDEYE_IF_SET"})
-        else:
-            feasible.append(p)
+        base = _PAIRING_CACHE.get_or_compute(set_id, lambda: _base_feasibility(pairings))
+
+    violations: list[dict[str, Any]] = list(base.violations)
+    if no_red and base.redeye.any():
+        rows = base.feasible_pairings
+        feasible = [rows[i] for i in np.flatnonzero(~base.redeye).tolist()]
+        violations.extend(
+            {"pairing_id": rows[i].get("id"), "rule": "NO_REDEYE_IF_SET"}
+            for i in np.flatnonzero(base.redeye).tolist()
+        )
+    else:
+        feasible = list(base.feasible_pairings)
 
     ctx = bundle.context
-    with SessionLocal() as db:
-        db.merge(Pilot(pilot_id=ctx.pilot_id))
-        db.add(
-            Preference(
-                ctx_id=ctx.ctx_id,
-                pilot_id=ctx.pilot_id,
-                data=bundle.preference_schema.model_dump(),
-            )
-        )
-        db.add(
-            RulePackModel(
-                ctx_id=ctx.ctx_id,
-                airline=ctx.airline,
-                version="",  # version unknown
-                data=rules,
-            )
-        )
-        db.commit()
+    persistence.merge(Pilot, pilot_id=ctx.pilot_id)
+    persistence.add(
+        Preference,
+        ctx_id=ctx.ctx_id,
+        pilot_id=ctx.pilot_id,
+        data=pref,
+    )
+    persistence.add(
+        RulePackModel,
+        ctx_id=ctx.ctx_id,
+        airline=ctx.airline,
+        version="",  # version unknown
+        data=rules,
+    )
 
     log_event(ctx.ctx_id, "validate", {"violations": len(violations)})
 
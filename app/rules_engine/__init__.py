@@ -15,6 +15,7 @@ from .health import (
 from .models import DerivedRule, HardRule, RulePack, ScoreBreakdown, SoftRule, Violation
 from .resolver import PackResolver
 from .validator import RulePackValidator, score_schedule
+from .vectorized import ColumnTable, VectorPack, compile_pack_vectorized
 
 __all__ = [
     "RulePack",
@@ -31,4 +32,7 @@ __all__ = [
     "pack_registry_health",
     "pack_validation_health",
     "dsl_health",
+    "ColumnTable",
+    "VectorPack",
+    "compile_pack_vectorized",
 ]
@@ -3,11 +3,17 @@ Domain Specific Language (DSL) for rule expressions.
 
 Safe expression compiler that converts rule expressions to callables.
 No eval() - only whitelisted functions and safe operations.
+
+A validated expression is lowered once into a real Python function
+``(obj, ctx) -> value`` whose only globals are the whitelisted functions, so
+evaluating a rule is a plain function call: no per-call ``eval`` and no
+shared mutable namespace, which makes compiled rules safe to share across
+threads.
 """
 
 import ast
 import re
-from collections.abc import Callable
+from collections.abc import Callable, Iterable
 from typing import Any
 
 # Whitelist of allowed domain functions (pure, deterministic)
@@ -19,6 +25,9 @@ SAFE_FUNCS = {
     <= time_obj.hour
     <= end_hour,
     "count_legs": lambda pairing: len(getattr(pairing, "legs", [])),
+    "get": lambda source, key, default=None: (
+        source.get(key, default) if isinstance(source, dict) else getattr(source, key, default)
+    ),
     "min": min,
     "max": max,
     "abs": abs,
@@ -40,6 +49,43 @@ class DSLSecurityError(Exception):
     pass
 
 
+def _function_globals() -> dict[str, Any]:
+    return {"__builtins__": {}, **SAFE_FUNCS}
+
+
+def iter_checks(rules: Iterable[Any]) -> Iterable[tuple[str, str]]:
+    """``(rule_id, expression)`` for ``HardRule`` objects or rule dicts.
+
+    Dicts name their expression ``check``, ``predicate`` or ``evaluate``.
+    """
+    for r in rules:
+        if isinstance(r, dict):
+            yield r["id"], r.get("check", r.get("predicate", r.get("evaluate", "True")))
+        else:
+            yield r.name, r.check
+
+
+class CompiledPack:
+    """All hard rules of a pack fused into one function.
+
+    Calling it with ``(obj, ctx)`` returns the ids of the rules that fail, in
+    pack order. A rule whose expression raises counts as failed.
+    """
+
+    __slots__ = ("rule_ids", "fn")
+
+    def __init__(self, rule_ids: tuple[str, ...], fn: Callable[[Any, Any], list[int]]):
+        self.rule_ids = rule_ids
+        self.fn = fn
+
+    def __call__(self, obj: Any, ctx: Any) -> list[str]:
+        ids = self.rule_ids
+        return [ids[i] for i in self.fn(obj, ctx)]
+
+    def __len__(self) -> int:
+        return len(self.rule_ids)
+
+
 class DSLParser:
     """Safe DSL parser that compiles expressions to callables."""
 
@@ -80,19 +126,7 @@ class DSLParser:
             # Validate AST nodes
             self._validate_ast(tree.body)
 
-            # Create a safe execution environment
-            safe_globals = {"__builtins__": {}}
-            safe_locals = {**SAFE_FUNCS}
-
-            # Compile the expression
-            code = compile(tree, "<string>", "eval")
-
-            # Create a function that executes the compiled code
-            def compiled_func(obj, ctx):
-                # Update locals with current obj and ctx
-                safe_locals.update({"obj": obj, "ctx": ctx})
-                return eval(code, safe_globals, safe_locals)
-
+            compiled_func = self._build_function(tree.body)
             self.rules_compiled += 1
             return compiled_func
 
@@ -188,6 +222,8 @@ class DSLParser:
                 raise DSLSecurityError("Function calls must use simple names")
             if node.func.id not in SAFE_FUNCS:
                 raise DSLSecurityError(f"Unauthorized function call: {node.func.id}")
+            if node.func.id == "get":
+                self._validate_get(node)
             for arg in node.args:
                 self._validate_ast(arg)
         elif isinstance(node, ast.List):
@@ -221,18 +257,28 @@ class DSLParser:
         else:
             raise DSLSecurityError(f"Unsafe AST node type: {type(node).__name__}")
 
+    def _validate_get(self, node: ast.Call) -> None:
+        """``get(source, 'field'[, default])`` needs a literal, public field name."""
+        if node.keywords or not 2 <= len(node.args) <= 3:
+            raise DSLSecurityError("get() takes (source, 'field'[, default])")
+        key = node.args[1]
+        if not (isinstance(key, ast.Constant) and isinstance(key.value, str)):
+            raise DSLSecurityError("get() field name must be a string literal")
+        if key.value.startswith("_"):
+            raise DSLSecurityError(f"Unauthorized field access: {key.value}")
+
     def _validate_attribute_access(self, node: ast.Attribute) -> None:
         """Validate attribute access against whitelist."""
+        attr_name = node.attr
+
+        # Underscore attributes (dunders, generated-code internals) are
+        # rejected at every level of a chain, e.g. ``get(obj, 'x').__class__``.
+        if attr_name.startswith("_") or attr_name.endswith("__"):
+            raise DSLSecurityError(f"Unauthorized dunder attribute access: {attr_name}")
+
         # Check if this is a whitelisted attribute access
         if isinstance(node.value, ast.Name):
             obj_name = node.value.id
-            attr_name = node.attr
-
-            # Check for dunder attributes (always reject)
-            if attr_name.startswith("__") or attr_name.endswith("__"):
-                raise DSLSecurityError(
-                    f"Unauthorized dunder attribute access: {obj_name}.{attr_name}"
-                )
 
             # Always allow access to obj and ctx
             if obj_name in ["obj", "ctx"]:
@@ -251,24 +297,71 @@ class DSLParser:
 
     def _is_safe_name(self, name: str) -> bool:
         """Check if a name is safe to use."""
-        # Reject dunder names and suspicious patterns
-        if name.startswith("__") or name.endswith("__"):
+        # Reject dunder and underscore names (the latter could reach locals
+        # of the generated pack function) and suspicious patterns
+        if name.startswith("_") or name.endswith("__"):
             return False
         if name in ["eval", "exec", "import", "open", "file", "input"]:
             return False
         return True
 
-    def _build_lambda(self, expr: str, whitelist):
-        """Build a safe lambda function string."""
-        # Create a safe lambda that only accesses whitelisted attributes
-        lambda_body = self._sanitize_expression(expr, whitelist)
-        return f"lambda obj, ctx: {lambda_body}"
-
-    def _sanitize_expression(self, expr: str, whitelist):
-        """Sanitize expression to only use whitelisted access."""
-        # For now, return the expression as-is since we validate the AST
-        # In a more sophisticated implementation, we could rewrite the expression
-        return expr
+    def compile_pack(self, rules: Any) -> CompiledPack:
+        """Fuse a pack's hard rules into a single :class:`CompiledPack`.
+
+        Args:
+            rules: A rules-engine ``RulePack`` (its ``hard_rules`` are used), or
+                an iterable of ``HardRule`` objects or ``{"id", "check"}`` dicts
+
+        Returns:
+            CompiledPack evaluating every rule in one call
+
+        Raises:
+            DSLParseError: If a rule's expression cannot be parsed
+            DSLSecurityError: If a rule's expression contains unsafe code
+        """
+        ids: list[str] = []
+        bodies: list[ast.expr] = []
+        for rid, expr in iter_checks(getattr(rules, "hard_rules", rules)):
+            try:
+                self._pre_validate_expression(expr)
+                tree = ast.parse(expr, mode="eval")
+                self._validate_ast(tree.body)
+            except SyntaxError as e:
+                self.compile_errors += 1
+                raise DSLParseError(f"Syntax error in rule {rid} '{expr}': {e}") from e
+            except (DSLParseError, DSLSecurityError) as e:
+                raise type(e)(f"rule {rid}: {e}") from e
+            ids.append(rid)
+            bodies.append(tree.body)
+
+        lines = ["def _compiled_pack(obj, ctx):", "    _failed = []"]
+        for i, body in enumerate(bodies):
+            lines += [
+                "    try:",
+                f"        if not ({ast.unparse(body)}):",
+                f"            _failed.append({i})",
+                "    except Exception:",
+                f"        _failed.append({i})",
+            ]
+        lines.append("    return _failed")
+        namespace = {**_function_globals(), "Exception": Exception}
+        exec(compile("\n".join(lines), "<rule-pack>", "exec"), namespace)
+        self.rules_compiled += len(ids)
+        return CompiledPack(tuple(ids), namespace["_compiled_pack"])
+
+    def _build_function(self, body: ast.expr) -> Callable[[Any, Any], Any]:
+        """Lower a validated expression body into ``lambda obj, ctx: <body>``."""
+        args = ast.arguments(
+            posonlyargs=[],
+            args=[ast.arg(arg="obj"), ast.arg(arg="ctx")],
+            kwonlyargs=[],
+            kw_defaults=[],
+            defaults=[],
+        )
+        tree = ast.Expression(body=ast.Lambda(args=args, body=body))
+        ast.fix_missing_locations(tree)
+        code = compile(tree, "<dsl>", "eval")
+        return eval(code, _function_globals())
 
     def get_stats(self) -> dict[str, Any]:
         """Get compilation statistics."""
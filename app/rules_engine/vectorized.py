@@ -0,0 +1,469 @@
+"""
+Vectorized rule evaluation.
+
+Second backend for DSL predicates: instead of calling a compiled expression
+once per pairing, the expression is lowered into NumPy operations over a
+columnar pairing table, so a rule checks every pairing in a handful of array
+ops. Expressions (or inputs) it cannot vectorize fall back to the per-row
+function from :class:`DSLParser`, with the same pass/fail result.
+
+Rule packs written against ``pairing``/``trip`` and ``context`` are accepted
+as aliases of ``obj`` and ``ctx``, and ``x.get('field', default)`` is read as
+the DSL's ``get(x, 'field', default)``. Dict records expose their keys as
+attributes on both paths, so ``pairing.rest_hours`` reads the
+``rest_hours`` key.
+
+:class:`app.legality.validate.CompiledLegality` runs its trip rules through
+this backend. :func:`app.rules.engine.validate_feasibility` does not: its
+only pack-independent rule is the rest check, and building the column from
+dict records costs as much as that one comparison in a Python loop (about
+60 ms against 35 ms for 100k pairings), so it keeps the loop.
+"""
+
+from __future__ import annotations
+
+import ast
+import operator
+from collections.abc import Callable, Sequence
+from typing import Any, Optional, Union
+
+import numpy as np
+
+from .dsl import DSLParseError, DSLParser, DSLSecurityError, iter_checks
+
+ROW_ALIASES = ("pairing", "trip")
+CTX_ALIASES = ("context",)
+
+_MISSING = object()
+
+_COMPARE = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+_BINOP = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_REDUCE = {"min": np.minimum, "max": np.maximum}
+
+Value = Union[np.ndarray, Any]
+VectorFn = Callable[["ColumnTable", Any], Value]
+
+
+class NotVectorizable(Exception):
+    """Raised when an expression or its inputs need per-row evaluation."""
+
+
+class ColumnTable:
+    """Lazily built NumPy columns over a list of pairing records.
+
+    A column is materialized the first time a rule reads it and then cached,
+    so a pack touching ``rest_hours`` from three rules builds it once.
+    """
+
+    __slots__ = ("records", "_columns")
+
+    def __init__(self, records: Sequence[Any]):
+        self.records = records
+        self._columns: dict[tuple[str, Any], np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def column(self, name: str, default: Any = _MISSING) -> np.ndarray:
+        """Values of ``name`` for every record.
+
+        Raises NotVectorizable when a record lacks the field and no default
+        is given, or when the values do not form a plain (non-object) array
+        of their own type: NumPy turns ``[1, "a"]`` into strings, where
+        ``obj.x == 1`` would no longer match Python. The per-row path then
+        reproduces Python's exact behaviour.
+        """
+        key = (name, default if default is _MISSING or _hashable(default) else id(default))
+        col = self._columns.get(key)
+        if col is None:
+            values = [_read(r, name, default) for r in self.records]
+            if any(v is _MISSING for v in values):
+                raise NotVectorizable(f"field {name} missing")
+            col = np.asarray(values)
+            if col.dtype == object or (
+                col.dtype.kind in "US"
+                and not _all_of(values, str if col.dtype.kind == "U" else bytes)
+            ):
+                raise NotVectorizable(f"field {name} has mixed values")
+            self._columns[key] = col
+        return col
+
+
+def _all_of(values: list[Any], kind: type) -> bool:
+    return all(isinstance(v, kind) for v in values)
+
+
+def _hashable(value: Any) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _read(source: Any, name: str, default: Any) -> Any:
+    if isinstance(source, dict):
+        return source.get(name, default)
+    return getattr(source, name, default)
+
+
+class _Record(dict):
+    """Dict record whose keys also read as attributes, like table columns."""
+
+    __slots__ = ()
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+class _Normalize(ast.NodeTransformer):
+    """Map rule-pack aliases onto DSL names and ``x.get(...)`` onto ``get(x, ...)``."""
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        if node.id in ROW_ALIASES:
+            return ast.copy_location(ast.Name(id="obj", ctx=node.ctx), node)
+        if node.id in CTX_ALIASES:
+            return ast.copy_location(ast.Name(id="ctx", ctx=node.ctx), node)
+        return node
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        self.generic_visit(node)
+        func = node.func
+        if (
+            isinstance(func, ast.Attribute)
+            and func.attr == "get"
+            and isinstance(func.value, ast.Name)
+            and func.value.id in ("obj", "ctx")
+        ):
+            return ast.copy_location(
+                ast.Call(
+                    func=ast.Name(id="get", ctx=ast.Load()),
+                    args=[func.value, *node.args],
+                    keywords=node.keywords,
+                ),
+                node,
+            )
+        return node
+
+
+class _Lowering:
+    """Builds a ``(table, ctx) -> array | scalar`` closure tree from an AST."""
+
+    def predicate(self, node: ast.AST) -> VectorFn:
+        """Lower ``node`` where only its truthiness is used.
+
+        ``and``/``or`` are lowered here only: element-wise logical ops give
+        the truth value of ``a or b``, not the operand Python returns.
+        """
+        if isinstance(node, ast.BoolOp):
+            values = [self.predicate(v) for v in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+
+            def _boolop(table, ctx):
+                out = values[0](table, ctx)
+                for v in values[1:]:
+                    out = combine(out, v(table, ctx))
+                return out
+
+            return _boolop
+        fn = self.lower(node)
+        return lambda table, ctx: _as_bool(fn(table, ctx))
+
+    def lower(self, node: ast.AST) -> VectorFn:
+        method = getattr(self, f"_{type(node).__name__}", None)
+        if method is None:
+            raise NotVectorizable(type(node).__name__)
+        return method(node)
+
+    def _Constant(self, node: ast.Constant) -> VectorFn:
+        value = node.value
+        return lambda table, ctx: value
+
+    def _Name(self, node: ast.Name) -> VectorFn:
+        if node.id == "ctx":
+            return lambda table, ctx: ctx
+        raise NotVectorizable(node.id)
+
+    def _Attribute(self, node: ast.Attribute) -> VectorFn:
+        name = node.attr
+        if isinstance(node.value, ast.Name) and node.value.id == "obj":
+            return lambda table, ctx: table.column(name)
+        source = self.lower(node.value)
+        return lambda table, ctx: _scalar_attr(source(table, ctx), name)
+
+    def _Call(self, node: ast.Call) -> VectorFn:
+        func = node.func.id  # validated: simple name
+        if func == "get":
+            key = node.args[1].value
+            default = node.args[2] if len(node.args) > 2 else None
+            default_fn = self.lower(default) if default is not None else (lambda t, c: None)
+            src = node.args[0]
+            if isinstance(src, ast.Name) and src.id == "obj":
+                return lambda table, ctx: table.column(key, _scalar(default_fn(table, ctx)))
+            source = self.lower(src)
+            return lambda table, ctx: _scalar_get(source(table, ctx), key, default_fn(table, ctx))
+        args = [self.lower(a) for a in node.args]
+        if func in _REDUCE and len(args) >= 2:
+            ufunc = _REDUCE[func]
+
+            def _reduce(table, ctx):
+                values = [a(table, ctx) for a in args]
+                out = values[0]
+                for v in values[1:]:
+                    out = ufunc(out, v)
+                return out
+
+            return _reduce
+        if func == "abs" and len(args) == 1:
+            (arg,) = args
+            return lambda table, ctx: np.abs(arg(table, ctx))
+        raise NotVectorizable(f"call {func}")
+
+    def _Compare(self, node: ast.Compare) -> VectorFn:
+        left = self.lower(node.left)
+        steps: list[tuple[Callable[[Any, Any], Any], VectorFn]] = []
+        for op, comparator in zip(node.ops, node.comparators):
+            if isinstance(op, (ast.In, ast.NotIn)):
+                if len(node.ops) > 1:
+                    raise NotVectorizable("chained membership")
+                if not isinstance(comparator, (ast.List, ast.Tuple)) or not all(
+                    isinstance(e, ast.Constant) for e in comparator.elts
+                ):
+                    raise NotVectorizable("membership needs a literal list")
+                values = [e.value for e in comparator.elts]
+                negate = isinstance(op, ast.NotIn)
+                steps.append((_membership(values, negate), lambda table, ctx: None))
+            else:
+                steps.append((_COMPARE[type(op)], self.lower(comparator)))
+
+        def _compare(table, ctx):
+            lhs = left(table, ctx)
+            result: Value = True
+            for fn, right in steps:
+                rhs = right(table, ctx)
+                result = result & _as_bool(fn(lhs, rhs))
+                lhs = rhs
+            return result
+
+        return _compare
+
+    def _BoolOp(self, node: ast.BoolOp) -> VectorFn:
+        # As a value ``a or b`` is one of its operands, not a boolean.
+        raise NotVectorizable("and/or used as a value")
+
+    def _UnaryOp(self, node: ast.UnaryOp) -> VectorFn:
+        if isinstance(node.op, ast.Not):
+            operand = self.predicate(node.operand)
+            return lambda table, ctx: np.logical_not(operand(table, ctx))
+        operand = self.lower(node.operand)
+        if isinstance(node.op, ast.USub):
+            return lambda table, ctx: -operand(table, ctx)
+        return operand
+
+    def _BinOp(self, node: ast.BinOp) -> VectorFn:
+        left, right = self.lower(node.left), self.lower(node.right)
+        fn = _BINOP[type(node.op)]
+        checks_zero = isinstance(node.op, (ast.Div, ast.Mod))
+
+        def _binop(table, ctx):
+            lhs, rhs = left(table, ctx), right(table, ctx)
+            if checks_zero and np.any(np.asarray(rhs) == 0):
+                raise NotVectorizable("division by zero")
+            return fn(lhs, rhs)
+
+        return _binop
+
+
+def _membership(values: list[Any], negate: bool) -> Callable[[Any, Any], Any]:
+    def _in(lhs, _unused):
+        if isinstance(lhs, np.ndarray):
+            if not all(_same_kind(lhs.dtype, v) for v in values):
+                # np.isin would cast both sides to a common (string) type.
+                raise NotVectorizable("membership list does not match the column")
+            mask = np.isin(lhs, values)
+        else:
+            mask = lhs in values
+        return np.logical_not(mask) if negate else mask
+
+    return _in
+
+
+def _same_kind(dtype: np.dtype, value: Any) -> bool:
+    if dtype.kind in "biuf":
+        return isinstance(value, (bool, int, float))
+    if dtype.kind == "U":
+        return isinstance(value, str)
+    if dtype.kind == "S":
+        return isinstance(value, bytes)
+    return False
+
+
+def _as_bool(value: Value) -> Value:
+    if isinstance(value, np.ndarray):
+        if value.dtype == bool:
+            return value
+        if value.dtype.kind in "biuf":
+            return value != 0
+        raise NotVectorizable("truthiness of non-numeric column")
+    return bool(value)
+
+
+def _scalar(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        raise NotVectorizable("per-row default")
+    return value
+
+
+def _scalar_attr(source: Any, name: str) -> Any:
+    if isinstance(source, np.ndarray):
+        raise NotVectorizable(f"attribute {name} of a column")
+    return getattr(source, name)
+
+
+def _scalar_get(source: Any, key: str, default: Any) -> Any:
+    if isinstance(source, np.ndarray) or isinstance(default, np.ndarray):
+        raise NotVectorizable(f"get {key} of a column")
+    return _read(source, key, default)
+
+
+class VectorRule:
+    """One DSL predicate evaluated over a :class:`ColumnTable`.
+
+    ``row_scoped`` is False when the expression never reads the record
+    (only ``ctx`` and literals), so it can be evaluated once per context.
+    """
+
+    __slots__ = ("rule_id", "expr", "vector_fn", "row_fn", "row_scoped")
+
+    def __init__(
+        self,
+        rule_id: str,
+        expr: str,
+        vector_fn: Optional[VectorFn],
+        row_fn: Callable[[Any, Any], Any],
+        row_scoped: bool = True,
+    ):
+        self.rule_id = rule_id
+        self.expr = expr
+        self.vector_fn = vector_fn
+        self.row_fn = row_fn
+        self.row_scoped = row_scoped
+
+    @property
+    def vectorized(self) -> bool:
+        return self.vector_fn is not None
+
+    def evaluate(self, table: ColumnTable, ctx: Any) -> np.ndarray:
+        """Boolean mask of records passing the rule.
+
+        A record whose per-row evaluation raises fails the rule, as in
+        :class:`RulePackValidator`.
+        """
+        if self.vector_fn is not None:
+            try:
+                result = self.vector_fn(table, ctx)
+                if isinstance(result, np.ndarray):
+                    return _as_bool(result)
+                return np.full(len(table), bool(result))
+            except Exception:
+                # NotVectorizable, or an error only some rows would raise:
+                # per-row evaluation decides which records fail.
+                pass
+        return np.fromiter((self._row(r, ctx) for r in table.records), dtype=bool, count=len(table))
+
+    def _row(self, record: Any, ctx: Any) -> bool:
+        if isinstance(record, dict) and not isinstance(record, _Record):
+            record = _Record(record)
+        try:
+            return bool(self.row_fn(record, ctx))
+        except Exception:
+            return False
+
+
+class VectorPack:
+    """Vectorized hard rules of a pack."""
+
+    __slots__ = ("rules",)
+
+    def __init__(self, rules: list[VectorRule]):
+        self.rules = rules
+
+    @property
+    def rule_ids(self) -> tuple[str, ...]:
+        return tuple(r.rule_id for r in self.rules)
+
+    def evaluate(self, records: Union[ColumnTable, Sequence[Any]], ctx: Any) -> np.ndarray:
+        """``(len(records), len(rules))`` mask, True where a record passes a rule."""
+        table = records if isinstance(records, ColumnTable) else ColumnTable(records)
+        out = np.ones((len(table), len(self.rules)), dtype=bool)
+        for j, rule in enumerate(self.rules):
+            out[:, j] = rule.evaluate(table, ctx)
+        return out
+
+    def feasible(self, records: Union[ColumnTable, Sequence[Any]], ctx: Any) -> np.ndarray:
+        """Mask of records passing every rule."""
+        return self.evaluate(records, ctx).all(axis=1)
+
+
+def compile_vector_rule(parser: DSLParser, rule_id: str, expr: str) -> VectorRule:
+    """Validate ``expr`` and build both its vector and per-row forms.
+
+    Raises:
+        DSLParseError: If the expression cannot be parsed
+        DSLSecurityError: If the expression contains unsafe code
+    """
+    try:
+        parser._pre_validate_expression(expr)
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError as e:
+        parser.compile_errors += 1
+        raise DSLParseError(f"Syntax error in expression '{expr}': {e}") from e
+    body = _Normalize().visit(tree.body)
+    ast.fix_missing_locations(body)
+    parser._validate_ast(body)
+    row_fn = parser._build_function(body)
+    try:
+        vector_fn = _Lowering().predicate(body)
+    except NotVectorizable:
+        vector_fn = None
+    row_scoped = any(isinstance(n, ast.Name) and n.id == "obj" for n in ast.walk(body))
+    parser.rules_compiled += 1
+    return VectorRule(rule_id, expr, vector_fn, row_fn, row_scoped)
+
+
+def compile_pack_vectorized(rules: Any, parser: Optional[DSLParser] = None) -> VectorPack:
+    """Vectorize a pack's hard rules.
+
+    Args:
+        rules: A rules-engine ``RulePack`` (its ``hard_rules``), an iterable of
+            ``HardRule`` objects, or dicts with ``id`` and ``check`` (or
+            ``predicate``/``evaluate``)
+
+    Raises:
+        DSLParseError / DSLSecurityError: With the offending rule id
+    """
+    parser = parser or DSLParser()
+    compiled = []
+    for rid, expr in iter_checks(getattr(rules, "hard_rules", rules)):
+        try:
+            compiled.append(compile_vector_rule(parser, rid, expr))
+        except (DSLParseError, DSLSecurityError) as e:
+            raise type(e)(f"rule {rid}: {e}") from e
+    return VectorPack(compiled)
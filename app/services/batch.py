@@ -0,0 +1,221 @@
+"""Multi-pilot optimization over one shared bid packet.
+
+At month open every pilot of a base bids against the same pairings, so the
+packet is parsed and column-encoded (:class:`PairingFrame`) once. The frame's
+NumPy columns, and its ids and records encoded as in a pairing snapshot
+(offsets plus UTF-8/JSON bytes), are copied into shared memory and worker
+processes attach to them by name. Only the small column vocabularies are
+pickled into each worker, and each pilot's context and preference schema
+travel to the workers in chunks.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Optional
+
+import numpy as np
+import pydantic_core
+
+from app.models import BatchPilot, BatchResult, FeatureBundle
+from app.services.optimizer import ScoringPlan, _persist_candidates, _topk_candidates
+from app.services.pairing_frame import PairingFrame
+from app.services.pairing_repo import pairing_frame_for
+from app.services.pairing_snapshot import SnapshotRecords, StringColumn, _blobs, _strings
+
+DEFAULT_CHUNK_SIZE = 64
+
+# Per-process state of a pool worker, set by ``_init_worker``.
+_WORKER: dict[str, Any] = {}
+
+
+class _SharedColumns:
+    """Copies of a frame's columns, ids and records in named shared memory blocks."""
+
+    def __init__(self, frame: PairingFrame) -> None:
+        self.blocks: list[shared_memory.SharedMemory] = []
+        self.spec: dict[str, tuple[str, str, tuple[int, ...]]] = {}
+        columns = {name: getattr(frame, name) for name in PairingFrame.ARRAY_FIELDS}
+        columns["id_offsets"], columns["id_bytes"] = _strings(frame.ids)
+        columns["record_offsets"], columns["record_bytes"] = _blobs(
+            [pydantic_core.to_json(p, fallback=str) for p in frame.records]
+        )
+        try:
+            for name, arr in columns.items():
+                shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+                self.blocks.append(shm)
+                np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+                self.spec[name] = (shm.name, arr.dtype.str, arr.shape)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+
+def _init_worker(
+    spec: dict[str, tuple[str, str, tuple[int, ...]]],
+    vocab: dict[str, list[Any]],
+    analytics: dict[str, Any],
+    K: int,
+) -> None:
+    blocks = []
+    arrays = {}
+    for name, (shm_name, dtype, shape) in spec.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        blocks.append(shm)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    lists = {
+        "ids": StringColumn(arrays.pop("id_offsets"), arrays.pop("id_bytes")),
+        "records": SnapshotRecords(arrays.pop("record_offsets"), arrays.pop("record_bytes")),
+        **vocab,
+    }
+    _WORKER.update(
+        frame=PairingFrame.from_parts(arrays, lists),
+        blocks=blocks,
+        analytics=analytics,
+        K=K,
+    )
+
+
+def _score_chunk(pilots: list[BatchPilot]) -> list[BatchResult]:
+    return _score_pilots(pilots, _WORKER["frame"], _WORKER["analytics"], _WORKER["K"])
+
+
+def _score_pilots(
+    pilots: list[BatchPilot],
+    frame: PairingFrame,
+    analytics: dict[str, Any],
+    K: int,
+) -> list[BatchResult]:
+    results = []
+    for pilot in pilots:
+        bundle = FeatureBundle.model_construct(
+            context=pilot.context,
+            preference_schema=pilot.preference_schema,
+            analytics_features=analytics,
+            compliance_flags={},
+            pairing_features={},
+        )
+        results.append(
+            BatchResult(
+                ctx_id=pilot.context.ctx_id,
+                pilot_id=pilot.context.pilot_id,
+                candidates=_topk_candidates(ScoringPlan.from_bundle(bundle), frame, K),
+            )
+        )
+    return results
+
+
+def _persist(results: list[BatchResult]) -> None:
+    for res in results:
+        _persist_candidates(res.ctx_id, res.candidates)
+
+
+def optimize_batch(
+    pairing_features: dict[str, Any],
+    pilots: Sequence[BatchPilot],
+    K: int = 50,
+    analytics_features: Optional[dict[str, Any]] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    persist: bool = True,
+) -> Iterator[BatchResult]:
+    """Top-``K`` candidates for many pilots sharing one set of pairings.
+
+    Produces, per pilot, exactly what :func:`app.services.optimizer.select_topk`
+    returns for a bundle made of that pilot's context and preferences plus the
+    shared ``pairing_features`` and ``analytics_features``.
+
+    Parameters
+    ----------
+    pairing_features: dict
+        Shared bid packet (``{"pairings": [...]}`` or ``{"pairing_set_id": ...}``).
+    pilots: Sequence[BatchPilot]
+        Per-pilot context and preference schema.
+    K: int
+        Candidates per pilot.
+    analytics_features: dict, optional
+        Shared analytics (``base_stats`` award rates).
+    workers: int, optional
+        Worker processes; defaults to ``os.cpu_count()``. With one worker, or
+        when everything fits in a single chunk, scoring runs in-process.
+    chunk_size: int
+        Pilots sent to a worker per task.
+    persist: bool
+        Queue candidate rows on the persistence writer and log ``optimize``
+        audit events, as :func:`~app.services.optimizer.select_topk` does.
+
+    Returns
+    -------
+    Iterator[BatchResult]
+        One result per pilot, in input order, as soon as its chunk is scored.
+
+    Raises
+    ------
+    UnknownPairingSet
+        If ``pairing_features`` names a set the repository does not hold.
+        The packet is resolved and encoded when this is called, so this and
+        errors in the pairings themselves surface before any result is read.
+    """
+
+    analytics = analytics_features or {}
+    frame = pairing_frame_for(pairing_features)
+    chunk_size = max(int(chunk_size), 1)
+    chunks = [list(pilots[i : i + chunk_size]) for i in range(0, len(pilots), chunk_size)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers <= 1:
+        return _score_inline(frame, chunks, analytics, K, persist)
+    return _score_in_pool(frame, chunks, analytics, K, workers, persist)
+
+
+def _score_inline(
+    frame: PairingFrame,
+    chunks: list[list[BatchPilot]],
+    analytics: dict[str, Any],
+    K: int,
+    persist: bool,
+) -> Iterator[BatchResult]:
+    for chunk in chunks:
+        results = _score_pilots(chunk, frame, analytics, K)
+        if persist:
+            _persist(results)
+        yield from results
+
+
+def _score_in_pool(
+    frame: PairingFrame,
+    chunks: list[list[BatchPilot]],
+    analytics: dict[str, Any],
+    K: int,
+    workers: int,
+    persist: bool,
+) -> Iterator[BatchResult]:
+    shared = _SharedColumns(frame)
+    vocab = {
+        name: getattr(frame, name) for name in ("city_vocab", "equip_vocab", "day_vocab", "month")
+    }
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(shared.spec, vocab, analytics, K),
+        ) as pool:
+            for results in pool.map(_score_chunk, chunks):
+                if persist:
+                    _persist(results)
+                yield from results
+    finally:
+        shared.close()
+
+
+__all__ = ["optimize_batch"]
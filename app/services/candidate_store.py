@@ -0,0 +1,64 @@
+"""In-memory store of optimizer candidates served by ``/api/candidates/{id}``.
+
+Each candidate is remembered together with the pairing set it was built
+from. When a revised packet supersedes that set (see
+:meth:`app.services.pairing_repo.PairingRepository.revise`), only candidates
+that use a removed or changed pairing are dropped; the rest are re-tagged to
+the new set and keep being served.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Optional
+
+from app.models import CandidateSchedule
+from app.services.pairing_repo import PairingDelta, pairing_repository
+
+
+class CandidateStore:
+    """Thread-safe map of candidate id to candidate and pairing set id."""
+
+    def __init__(self) -> None:
+        self._entries: dict[str, tuple[CandidateSchedule, str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, cand: CandidateSchedule, set_id: str) -> None:
+        with self._lock:
+            self._entries[cand.candidate_id] = (cand, set_id)
+
+    def get(self, candidate_id: str) -> Optional[CandidateSchedule]:
+        with self._lock:
+            entry = self._entries.get(candidate_id)
+        return entry[0] if entry is not None else None
+
+    def set_of(self, candidate_id: str) -> Optional[str]:
+        """Id of the pairing set ``candidate_id`` was built from."""
+        with self._lock:
+            entry = self._entries.get(candidate_id)
+        return entry[1] if entry is not None else None
+
+    def apply_delta(self, delta: PairingDelta) -> int:
+        """Move candidates of the old set to the new one; returns how many were dropped."""
+        stale = delta.affected_ids
+        dropped = 0
+        with self._lock:
+            for candidate_id, (cand, set_id) in list(self._entries.items()):
+                if set_id != delta.old_set_id:
+                    continue
+                if not delta.exact or stale.intersection(cand.pairings):
+                    del self._entries[candidate_id]
+                    dropped += 1
+                else:
+                    self._entries[candidate_id] = (cand, delta.new_set_id)
+        return dropped
+
+
+candidate_store = CandidateStore()
+pairing_repository.subscribe(candidate_store.apply_delta)
+
+
+__all__ = ["CandidateStore", "candidate_store"]
@@ -0,0 +1,221 @@
+"""Background ingestion jobs for ``/api/ingest``.
+
+An upload is copied to ``{storage_dir}/incoming`` in fixed-size chunks on a
+worker thread, hashing as it goes, so the event loop never holds the whole
+file or waits on disk. Parsing then runs as a job: the job thread hands the
+CPU-bound parse to a process pool (the event loop and other requests keep
+the GIL), registers and stores the result, and the spooled file is moved into
+the blob store. Jobs are tracked by ID so clients can poll
+``/api/ingest/{job_id}`` instead of holding the request open.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Optional
+
+from app.models import IngestionJob, IngestionRequest, IngestionResponse
+from app.services.ingestion import KnownBlocks, ParsedUpload, ingestion_service, parse_upload
+from app.services.store import bid_package_store
+
+CHUNK_SIZE = 1 << 20
+DEFAULT_MAX_JOBS = 1000
+DEFAULT_CONCURRENT_JOBS = 2
+
+
+def _default_parse_workers() -> int:
+    return int(os.environ.get("INGEST_PARSE_WORKERS", os.cpu_count() or 1))
+
+
+def _init_parse_worker(pdf_workers: int) -> None:
+    # A PDF parse extracts its pages with a pool of its own; split the CPUs
+    # between the jobs that can parse at once instead of giving each job all.
+    configured = os.environ.get("PDF_EXTRACT_WORKERS")
+    if configured is None or int(configured) > pdf_workers:
+        os.environ["PDF_EXTRACT_WORKERS"] = str(pdf_workers)
+
+
+@dataclass(frozen=True)
+class SpooledUpload:
+    """An upload copied to local disk."""
+
+    path: Path
+    sha256: str
+    size: int
+
+    def discard(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+class IngestJobManager:
+    """Spools uploads and runs their ingestion off the event loop.
+
+    ``parse_workers`` is the size of the parse process pool; 0 parses on the
+    job thread instead (useful for tests and single-process deployments).
+    Inside the pool, PDF page extraction (see
+    :func:`~app.parsers.ual_pdf.iter_pdf_pages`) is capped at the CPU count
+    divided by ``concurrent_jobs``, so parallel uploads do not each start a
+    CPU-sized extraction pool.
+    At most ``max_jobs`` jobs are remembered; the oldest finished ones are
+    forgotten first.
+    """
+
+    def __init__(
+        self,
+        spool_dir: Optional[Path] = None,
+        parse_workers: Optional[int] = None,
+        concurrent_jobs: int = DEFAULT_CONCURRENT_JOBS,
+        max_jobs: int = DEFAULT_MAX_JOBS,
+    ) -> None:
+        self.spool_dir = (
+            Path(spool_dir) if spool_dir is not None else bid_package_store.storage_dir / "incoming"
+        )
+        self.parse_workers = _default_parse_workers() if parse_workers is None else parse_workers
+        self.concurrent_jobs = concurrent_jobs
+        self.max_jobs = max_jobs
+        self._jobs: OrderedDict[str, IngestionJob] = OrderedDict()
+        self._futures: dict[str, Future] = {}
+        self._runner: Optional[ThreadPoolExecutor] = None
+        self._parser: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    # -- spooling -----------------------------------------------------------
+    async def spool(self, upload: BinaryIO) -> SpooledUpload:
+        """Copy ``upload`` (e.g. ``UploadFile.file``) to the spool directory."""
+        return await asyncio.to_thread(self.spool_sync, upload)
+
+    def spool_sync(self, upload: BinaryIO) -> SpooledUpload:
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        fd, name = tempfile.mkstemp(dir=self.spool_dir, suffix=".part")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in iter(lambda: upload.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            Path(name).unlink(missing_ok=True)
+            raise
+        return SpooledUpload(Path(name), digest.hexdigest(), size)
+
+    # -- jobs ---------------------------------------------------------------
+    def submit(
+        self, upload: SpooledUpload, filename: str, request: IngestionRequest
+    ) -> IngestionJob:
+        """Queue ingestion of a spooled upload; the job owns the file from now on."""
+        job = IngestionJob(
+            job_id=uuid.uuid4().hex,
+            filename=filename,
+            size=upload.size,
+            sha256=upload.sha256,
+        )
+        with self._lock:
+            if self._runner is None:
+                self._runner = ThreadPoolExecutor(
+                    max_workers=self.concurrent_jobs, thread_name_prefix="ingest"
+                )
+            self._jobs[job.job_id] = job
+            self._forget_finished()
+            self._futures[job.job_id] = self._runner.submit(self._run, job, upload, request)
+        return job.model_copy()
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.model_copy() if job is not None else None
+
+    def result(self, job_id: str, timeout: Optional[float] = None) -> IngestionResponse:
+        """Block until the job finishes and return its response."""
+        return self._futures[job_id].result(timeout)
+
+    async def wait(self, job_id: str) -> IngestionResponse:
+        """Await the job's response without blocking the event loop."""
+        return await asyncio.wrap_future(self._futures[job_id])
+
+    def close(self) -> None:
+        """Finish running jobs and shut the pools down."""
+        with self._lock:
+            runner, self._runner = self._runner, None
+        if runner is not None:
+            runner.shutdown(wait=True)
+        with self._lock:
+            parser, self._parser = self._parser, None
+        if parser is not None:
+            parser.shutdown(wait=True)
+
+    def _run(
+        self, job: IngestionJob, upload: SpooledUpload, request: IngestionRequest
+    ) -> IngestionResponse:
+        self._update(job, status="running")
+        try:
+            response = ingestion_service.ingest_file(
+                upload.path, upload.sha256, job.filename, request, parse=self._parse
+            )
+        except Exception as e:
+            response = IngestionResponse(
+                success=False, summary={}, error=f"Failed to ingest file: {str(e)}"
+            )
+        finally:
+            # Already moved into the blob store unless ingestion failed.
+            upload.discard()
+        response.job_id = job.job_id
+        self._update(
+            job,
+            status="done" if response.success else "failed",
+            result=response,
+            error=response.error,
+            finished_at=datetime.now(),
+        )
+        return response
+
+    def _parse(
+        self,
+        path: Path,
+        file_ext: str,
+        filename: str,
+        request: IngestionRequest,
+        known: Optional[KnownBlocks] = None,
+    ) -> ParsedUpload:
+        if self.parse_workers <= 0:
+            return parse_upload(path, file_ext, filename, request, known)
+        with self._lock:
+            if self._parser is None:
+                self._parser = ProcessPoolExecutor(
+                    max_workers=self.parse_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_parse_worker,
+                    initargs=(max((os.cpu_count() or 1) // self.concurrent_jobs, 1),),
+                )
+            parser = self._parser
+        return parser.submit(parse_upload, path, file_ext, filename, request, known).result()
+
+    def _update(self, job: IngestionJob, **changes: Any) -> None:
+        with self._lock:
+            for name, value in changes.items():
+                setattr(job, name, value)
+
+    def _forget_finished(self) -> None:
+        # Called with the lock held.
+        excess = len(self._jobs) - self.max_jobs
+        for job_id in [j for j, job in self._jobs.items() if job.finished_at][: max(excess, 0)]:
+            del self._jobs[job_id]
+            self._futures.pop(job_id, None)
+
+
+ingest_jobs = IngestJobManager()
+
+
+__all__ = ["IngestJobManager", "SpooledUpload", "ingest_jobs"]
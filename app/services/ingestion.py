@@ -1,14 +1,49 @@
 """Ingestion service for bid packages using existing PBS parser."""
 
-import tempfile
+import hashlib
+import io
+import os
+from dataclasses import dataclass
 from datetime import date
 from pathlib import Path
-from typing import Any
+from typing import Any, BinaryIO, Callable, Optional, Union
 
 from app.models import BidPackage, IngestionRequest, IngestionResponse
+from app.parsers.ual_pdf import TripRecord, iter_pdf_pages, iter_trip_blocks
+from app.services.pairing_repo import PairingSet, UnknownPairingSet, pairing_repository
 from app.services.pbs_parser.contracts import Pairing, Trip
-from app.services.pbs_parser.reader import load_csv, load_jsonl
-from app.services.store import bid_package_store
+from app.services.pbs_parser.reader import read_csv_stream, read_jsonl_stream
+from app.services.store import Content, bid_package_store
+
+# Bump when a parser's output (or the parse_cache form) changes, so
+# parse_cache entries written by the previous parsers are no longer served.
+PARSER_VERSION = "3"
+
+
+class _Placeholder(list):
+    """Mock data standing in for content a parser cannot read yet."""
+
+
+@dataclass(frozen=True)
+class ParsedUpload:
+    """What ingestion keeps of a parse, as plain data.
+
+    Parser output (pydantic models) is slow to pickle; this is what a parse
+    worker process sends back. ``encoded`` is the parse-cache form (the
+    records and the request-independent summary fields), and ``records`` the
+    pairing records for :mod:`app.services.pairing_repo`. ``placeholder``
+    marks mock data, which is neither cached nor registered.
+    """
+
+    encoded: dict[str, Any]
+    records: list[dict[str, Any]]
+    summary: dict[str, Any]
+    placeholder: bool = False
+
+
+# Trip dicts of a previous parse, by trip block fingerprint.
+KnownBlocks = dict[str, dict[str, Any]]
+ParseFn = Callable[[Path, str, str, IngestionRequest, Optional[KnownBlocks]], ParsedUpload]
 
 
 class IngestionService:
@@ -21,30 +56,109 @@ class IngestionService:
             ".pdf": self._parse_pdf,
             ".txt": self._parse_txt,
         }
+        # Formats whose parsers can reuse the trips of a previous packet.
+        self.revisable_formats = {".pdf"}
+
+    def format_error(self, filename: str) -> Optional[str]:
+        """Error message when ``filename`` has an unsupported extension."""
+        file_ext = Path(filename).suffix.lower()
+        if file_ext in self.supported_formats:
+            return None
+        return (
+            f"Unsupported file format: {file_ext}. Supported: {list(self.supported_formats.keys())}"
+        )
 
     def ingest(
         self, file_content: bytes, filename: str, request: IngestionRequest
     ) -> IngestionResponse:
         """Ingest a bid package file and return parsed summary."""
+        file_ext = Path(filename).suffix.lower()
+
+        def parse(known: Optional[KnownBlocks]) -> ParsedUpload:
+            parsed_data = self._parse(io.BytesIO(file_content), file_ext, filename, known)
+            return self._reduce(parsed_data, request)
+
+        digest = hashlib.sha256(file_content).hexdigest()
+        return self._ingest(file_content, digest, filename, request, parse)
+
+    def ingest_file(
+        self,
+        path: Path,
+        digest: str,
+        filename: str,
+        request: IngestionRequest,
+        parse: Optional[ParseFn] = None,
+    ) -> IngestionResponse:
+        """Ingest an upload spooled to ``path``; the file is moved into the store.
+
+        ``parse`` runs the parser (default: :func:`parse_upload` in this
+        thread); the job runner passes one that uses a process pool.
+        """
+        file_ext = Path(filename).suffix.lower()
+        parse = parse or parse_upload
+        return self._ingest(
+            path,
+            digest,
+            filename,
+            request,
+            lambda known: parse(path, file_ext, filename, request, known),
+        )
+
+    def _ingest(
+        self,
+        content: Content,
+        digest: str,
+        filename: str,
+        request: IngestionRequest,
+        parse: Callable[[Optional[KnownBlocks]], ParsedUpload],
+    ) -> IngestionResponse:
         try:
-            # Determine file format
+            error = self.format_error(filename)
+            if error is not None:
+                return IngestionResponse(success=False, summary={}, error=error)
             file_ext = Path(filename).suffix.lower()
-            if file_ext not in self.supported_formats:
-                return IngestionResponse(
-                    success=False,
-                    summary={},
-                    error=(
-                        f"Unsupported file format: {file_ext}. "
-                        f"Supported: {list(self.supported_formats.keys())}"
-                    ),
-                )
+            file_size = content.stat().st_size if isinstance(content, Path) else len(content)
 
-            # Parse the file
-            parse_func = self.supported_formats[file_ext]
-            parsed_data = parse_func(file_content, filename)
+            previous: Optional[PairingSet] = None
+            if request.revises:
+                try:
+                    previous = pairing_repository.get(request.revises)
+                except UnknownPairingSet:
+                    return IngestionResponse(
+                        success=False,
+                        summary={},
+                        error=f"Unknown pairing set to revise: {request.revises}",
+                    )
 
-            # Create summary
-            summary = self._create_summary(parsed_data, request)
+            # Parse the file, or reuse the parse of an identical upload
+            cached = bid_package_store.get_parsed(digest, file_ext, PARSER_VERSION)
+            if cached is not None:
+                parsed = _cached_upload(cached, request)
+            else:
+                known = _known_blocks(previous) if file_ext in self.revisable_formats else None
+                parsed = parse(known)
+                if not parsed.placeholder:
+                    bid_package_store.put_parsed(digest, file_ext, PARSER_VERSION, parsed.encoded)
+
+            summary = dict(parsed.summary)
+
+            if not parsed.placeholder:
+                # Keep the parsed packet in memory so requests can reference it
+                pairing_set = pairing_repository.put(
+                    parsed.records,
+                    airline=request.airline,
+                    month=request.month,
+                    base=request.base,
+                    fleet=request.fleet,
+                    packet_hash=digest,
+                )
+                summary["pairing_set_id"] = pairing_set.set_id
+                # Other workers open the snapshot rather than parsing the packet again
+                pairing_repository.save_snapshot(pairing_set)
+                if previous is not None:
+                    # Lets cached feasibility results and candidates follow the revision
+                    delta = pairing_repository.revise(previous.set_id, pairing_set)
+                    summary["delta"] = delta.summary()
 
             # Store the bid package
             bid_package = BidPackage(
@@ -53,7 +167,7 @@ class IngestionService:
                 month=request.month,
                 meta={
                     "filename": filename,
-                    "file_size": len(file_content),
+                    "file_size": file_size,
                     "file_type": file_ext,
                     "base": request.base,
                     "fleet": request.fleet,
@@ -62,7 +176,7 @@ class IngestionService:
                 },
             )
 
-            package_id = bid_package_store.store(bid_package, file_content)
+            package_id = bid_package_store.store(bid_package, content, digest=digest)
 
             # Add package ID to summary
             summary["package_id"] = package_id
@@ -78,145 +192,71 @@ class IngestionService:
                 success=False, summary={}, error=f"Failed to ingest file: {str(e)}"
             )
 
-    def _parse_csv(self, file_content: bytes, filename: str) -> list[Pairing]:
-        """Parse CSV format using existing PBS parser."""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_path = Path(temp_dir)
-
-            # Try to detect if this is a combined file or separate files
-            csv_text = file_content.decode("utf-8")
-            lines = csv_text.split("\n")
-
-            # Check if this looks like a combined file with both pairings and trips
-            header = lines[0].lower() if lines else ""
-            has_pairings = "pairing_id" in header
-            has_trips = "trip_id" in header
-
-            # Also check if the file contains both types of data (even with separate headers)
-            contains_pairing_data = any("pairing_id" in line.lower() for line in lines[:5])
-            contains_trip_data = any("trip_id" in line.lower() for line in lines[:5])
-
-            if (has_pairings and has_trips) or (contains_pairing_data and contains_trip_data):
-                # This is a combined file - we need to parse it manually
-                return self._parse_combined_csv(file_content, filename)
-            elif has_pairings:
-                # This is just pairings - try to use existing parser
-                pairings_file = temp_path / "pairings.csv"
-                pairings_file.write_bytes(file_content)
-
-                try:
-                    # Try to use existing parser, but it might fail without trips
-                    return load_csv(temp_path)
-                except Exception:
-                    # Fallback to mock data if parsing fails
-                    return self._create_mock_pairings()
-            else:
-                # Unknown format - return mock data
-                return self._create_mock_pairings()
-
-    def _parse_combined_csv(self, file_content: bytes, filename: str) -> list[Pairing]:
-        """Parse a combined CSV file that contains both pairings and trips data."""
-        csv_text = file_content.decode("utf-8")
-        lines = csv_text.split("\n")
-
-        # Parse the CSV manually
-        pairings = {}
-        trips = []
-
-        # Find the transition point between pairings and trips
-        trip_start_line = -1
-        for i, line in enumerate(lines):
-            if "trip_id" in line.lower():
-                trip_start_line = i
-                break
-
-        # Parse pairings (lines before trip_id header)
-        for line in lines[1:trip_start_line]:  # Skip first header, stop at trip header
-            if not line.strip():
-                continue
-
-            parts = line.split(",")
-            if len(parts) >= 4:
-                # Check if this looks like a pairing line (has pairing_id, base, fleet, month)
-                if parts[0] and parts[1] and parts[2] and parts[3]:
-                    pairing_id = parts[0]
-                    base = parts[1]
-                    fleet = parts[2]
-                    month = parts[3]
-
-                    pairings[pairing_id] = Pairing(
-                        pairing_id=pairing_id,
-                        base=base,
-                        fleet=fleet,
-                        month=date.fromisoformat(month),
-                        trips=[],
-                    )
-
-        # Parse trips (lines after trip_id header)
-        if trip_start_line >= 0:
-            for line in lines[trip_start_line + 1 :]:  # Skip trip header
-                if not line.strip():
-                    continue
-
-                parts = line.split(",")
-                if len(parts) >= 5:
-                    # Check if this looks like a trip line (has trip_id, pairing_id,
-                    # day, origin, destination)
-                    if parts[0] and parts[1] and parts[2] and parts[3] and parts[4]:
-                        trip_id = parts[0]
-                        pairing_id = parts[1]
-                        try:
-                            day = int(parts[2])
-                        except ValueError:
-                            day = 1
-                        origin = parts[3]
-                        destination = parts[4]
-
-                        trip = Trip(
-                            trip_id=trip_id,
-                            pairing_id=pairing_id,
-                            day=day,
-                            origin=origin,
-                            destination=destination,
-                        )
-                        trips.append(trip)
-
-        # Associate trips with pairings
-        for trip in trips:
-            if trip.pairing_id in pairings:
-                pairings[trip.pairing_id].trips.append(trip)
-
-        return list(pairings.values())
-
-    def _parse_jsonl(self, file_content: bytes, filename: str) -> list[Pairing]:
-        """Parse JSONL format using existing PBS parser."""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_path = Path(temp_dir)
-
-            # Write the JSONL content to a temporary file
-            jsonl_file = temp_path / "pairings.jsonl"
-            jsonl_file.write_bytes(file_content)
-
-            try:
-                return load_jsonl(temp_path)
-            except Exception:
-                # Fallback to mock data if parsing fails
-                return self._create_mock_pairings()
-
-    def _parse_pdf(self, file_content: bytes, filename: str) -> list[dict[str, Any]]:
-        """Parse PDF format - placeholder for future implementation."""
-        # TODO: Integrate with existing PDF parser from src/lib/schedule_parser/
-        # For now, return mock data
-        return self._create_mock_trips()
+    def _parse(
+        self, stream: BinaryIO, file_ext: str, filename: str, known: Optional[KnownBlocks] = None
+    ) -> Any:
+        if known and file_ext in self.revisable_formats:
+            return self.supported_formats[file_ext](stream, filename, known)
+        return self.supported_formats[file_ext](stream, filename)
+
+    def _reduce(self, parsed_data: Any, request: IngestionRequest) -> ParsedUpload:
+        records = _pairing_records(parsed_data)
+        summary = self._create_summary(parsed_data)
+        return ParsedUpload(
+            encoded={"summary": summary, "records": records},
+            records=records,
+            summary=_request_summary(summary, request),
+            placeholder=isinstance(parsed_data, _Placeholder),
+        )
+
+    def _parse_csv(self, stream: BinaryIO, filename: str) -> list[Pairing]:
+        """Parse CSV in one streaming pass (pairings, optionally followed by trips)."""
+        try:
+            pairings = read_csv_stream(stream)
+        except Exception:
+            pairings = None
+        # Unknown or malformed format - return mock data
+        return pairings if pairings is not None else self._create_mock_pairings()
+
+    def _parse_jsonl(self, stream: BinaryIO, filename: str) -> list[Pairing]:
+        """Parse JSONL format, one pairing per line."""
+        try:
+            return read_jsonl_stream(stream)
+        except Exception:
+            # Fallback to mock data if parsing fails
+            return self._create_mock_pairings()
+
+    def _parse_pdf(
+        self, stream: BinaryIO, filename: str, known: Optional[KnownBlocks] = None
+    ) -> list[dict[str, Any]]:
+        """Parse a UAL PDF bid packet, extracting pages in parallel.
+
+        Trip blocks whose fingerprint is in ``known`` (from the packet this one
+        revises) are taken from there instead of being parsed again. Raises
+        ValueError when the PDF cannot be read or holds no trips.
+        """
+        known = known or {}
+        try:
+            trips = []
+            for block in iter_trip_blocks(iter_pdf_pages(_pdf_source(stream))):
+                trip = known.get(block.fingerprint)
+                trips.append(
+                    dict(trip) if trip is not None else _ual_trip(block.parse(), block.fingerprint)
+                )
+        except Exception as e:
+            raise ValueError(f"Could not read PDF packet {filename}: {e}") from e
+        if not trips:
+            raise ValueError(f"No trips found in PDF packet {filename}")
+        return trips
 
-    def _parse_txt(self, file_content: bytes, filename: str) -> list[dict[str, Any]]:
+    def _parse_txt(self, stream: BinaryIO, filename: str) -> list[dict[str, Any]]:
         """Parse TXT format - placeholder for future implementation."""
         # TODO: Integrate with existing TXT parser from src/lib/schedule_parser/
         # For now, return mock data
         return self._create_mock_trips()
 
-    def _create_summary(self, parsed_data: Any, request: IngestionRequest) -> dict[str, Any]:
-        """Create a summary from parsed data."""
+    def _create_summary(self, parsed_data: Any) -> dict[str, Any]:
+        """Create a summary from parsed data (see :func:`_request_summary`)."""
         if isinstance(parsed_data, list) and parsed_data and isinstance(parsed_data[0], Pairing):
             # PBS parser format
             pairings = parsed_data
@@ -228,12 +268,10 @@ class IngestionService:
                 "trips": len(trips),
                 "legs": len(trips),
                 "pairings": len(pairings),
-                "date_span": f"{request.month}",
                 "credit_total": self._estimate_credit_total(trips),
                 "bases": list(
                     {p.pairing_id.split("-")[0] for p in pairings if "-" in p.pairing_id}
                 ),
-                "fleet": request.fleet,
                 "format": "pbs_parser",
             }
         else:
@@ -243,10 +281,7 @@ class IngestionService:
                 "trips": len(trips),
                 "legs": len(trips),
                 "pairings": len(trips),  # Assuming 1:1 mapping for now
-                "date_span": f"{request.month}",
                 "credit_total": self._estimate_credit_total_generic(trips),
-                "bases": [request.base],
-                "fleet": request.fleet,
                 "format": "generic",
             }
 
@@ -286,35 +321,130 @@ class IngestionService:
             ),
         ]
 
-        return [
-            Pairing(
-                pairing_id="MOCK-PAIR-001",
-                base="SFO",
-                fleet="737",
-                month=date.fromisoformat("2025-09-01"),
-                trips=trips,
-            )
-        ]
+        return _Placeholder(
+            [
+                Pairing(
+                    pairing_id="MOCK-PAIR-001",
+                    base="SFO",
+                    fleet="737",
+                    month=date.fromisoformat("2025-09-01"),
+                    trips=trips,
+                )
+            ]
+        )
 
     def _create_mock_trips(self) -> list[dict[str, Any]]:
         """Create mock trips for testing."""
-        return [
-            {
-                "trip_id": "MOCK-001",
-                "days": 2,
-                "credit_hours": 10.5,
-                "route": "SFO-LAX-SFO",
-                "equipment": "737",
-            },
-            {
-                "trip_id": "MOCK-002",
-                "days": 3,
-                "credit_hours": 15.2,
-                "route": "SFO-ORD-SFO",
-                "equipment": "737",
-            },
-        ]
+        return _Placeholder(
+            [
+                {
+                    "trip_id": "MOCK-001",
+                    "days": 2,
+                    "credit_hours": 10.5,
+                    "route": "SFO-LAX-SFO",
+                    "equipment": "737",
+                },
+                {
+                    "trip_id": "MOCK-002",
+                    "days": 3,
+                    "credit_hours": 15.2,
+                    "route": "SFO-ORD-SFO",
+                    "equipment": "737",
+                },
+            ]
+        )
+
+
+def _pairing_records(parsed_data: Any) -> list[dict[str, Any]]:
+    """Optimizer-shaped pairing dicts (``id``, ``equipment``, ``dates``...)."""
+    records = []
+    for item in parsed_data:
+        if isinstance(item, Pairing):
+            days = sorted({t.day for t in item.trips})
+            records.append(
+                {
+                    "id": item.pairing_id,
+                    "base": item.base,
+                    "equipment": item.fleet,
+                    "month": item.month.isoformat()[:7],
+                    "trip_length": len(days),
+                    "dates": days,
+                }
+            )
+        else:
+            records.append({"id": item.get("trip_id", item.get("id")), **item})
+    return records
+
+
+def _pdf_source(stream: BinaryIO) -> Union[str, bytes]:
+    """Path of a file-backed stream (so page workers open it themselves), else its bytes."""
+    name = getattr(stream, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name
+    return stream.read()
+
+
+def _known_blocks(previous: Optional[PairingSet]) -> Optional[KnownBlocks]:
+    """Trips of a previously parsed PDF packet, by block fingerprint."""
+    if previous is None:
+        return None
+    known = {}
+    for record in previous.pairings:
+        if isinstance(record, dict) and record.get("block"):
+            known[record["block"]] = {k: v for k, v in record.items() if k != "id"}
+    return known
+
+
+def _ual_trip(record: TripRecord, block: Optional[str] = None) -> dict[str, Any]:
+    """Generic trip dict (the shape PDF/TXT parsers return) for a UAL trip.
+
+    ``block`` is the fingerprint of the trip block it was parsed from.
+    """
+    legs = record.legs
+    return {
+        "trip_id": record.trip_id,
+        "days": len({leg.departure.date() for leg in legs}),
+        "credit_hours": record.credit,
+        "route": "-".join([legs[0].departure_airport] + [leg.arrival_airport for leg in legs])
+        if legs
+        else "",
+        "equipment": legs[0].equipment if legs else None,
+        "dates": sorted({leg.departure.date().isoformat() for leg in legs}),
+        "block": block,
+    }
+
+
+def _request_summary(summary: dict[str, Any], request: IngestionRequest) -> dict[str, Any]:
+    """``summary`` of the parsed content plus the fields taken from ``request``."""
+    return {
+        "bases": [request.base],
+        **summary,
+        "date_span": f"{request.month}",
+        "fleet": request.fleet,
+    }
+
+
+def _cached_upload(cached: dict[str, Any], request: IngestionRequest) -> ParsedUpload:
+    """The parse of an identical upload, from its parse-cache form."""
+    return ParsedUpload(
+        encoded=cached,
+        records=cached["records"],
+        summary=_request_summary(cached["summary"], request),
+    )
 
 
 # Global instance
 ingestion_service = IngestionService()
+
+
+def parse_upload(
+    path: Path,
+    file_ext: str,
+    filename: str,
+    request: IngestionRequest,
+    known: Optional[KnownBlocks] = None,
+) -> ParsedUpload:
+    """Parse the upload at ``path``; module-level so process pools can run it."""
+    with open(path, "rb") as f:
+        parsed_data = ingestion_service._parse(f, file_ext, filename, known)
+    return ingestion_service._reduce(parsed_data, request)
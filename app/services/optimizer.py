@@ -1,12 +1,17 @@
 from __future__ import annotations
 
-import heapq
-from operator import itemgetter
-from typing import Any
+import math
+from collections.abc import Hashable, Iterable
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import numpy as np
 
 from app.audit import log_event
-from app.db import Candidate, SessionLocal
+from app.db import Candidate, persistence
 from app.models import CandidateRationale, CandidateSchedule, FeatureBundle
+from app.services.pairing_frame import PairingFrame
+from app.services.pairing_repo import pairing_frame_for
 
 
 def _generate_rationale(pairing: Any, breakdown: dict[str, float]) -> list[str]:
@@ -39,30 +44,6 @@ def _generate_rationale(pairing: Any, breakdown: dict[str, float]) -> list[str]:
     return messages
 
 
-def _rule_hits_misses(bundle: FeatureBundle, pairing: Any) -> tuple[list[str], list[str]]:
-    """Determine which hard rules are satisfied or violated."""
-
-    hits: list[str] = []
-    misses: list[str] = []
-
-    hard = _to_dict(_get(bundle.preference_schema, "hard_constraints", {}))
-    no_red = bool(hard.get("no_red_eyes"))
-
-    rest_hours = float(_get(pairing, "rest_hours", 999) or 999)
-    if rest_hours < 10:
-        misses.append("FAR117_MIN_REST")
-    else:
-        hits.append("FAR117_MIN_REST")
-
-    is_redeye = bool(_get(pairing, "redeye", False))
-    if no_red and is_redeye:
-        misses.append("NO_REDEYE_IF_SET")
-    else:
-        hits.append("NO_REDEYE_IF_SET")
-
-    return hits, misses
-
-
 def _to_dict(x: Any) -> dict[str, Any]:
     if x is None:
         return {}
@@ -99,14 +80,14 @@ PERSONA_WEIGHTS: dict[str, dict[str, float]] = {
 def _get_scoring_weights(bundle: FeatureBundle) -> dict[str, float]:
     """Return normalized scoring weights for available factors."""
 
-    source_d = _to_dict(_get(bundle.preference_schema, "source", {}))
+    source_d = _to_dict(_get(_get(bundle, "preference_schema"), "source", {}))
     persona = source_d.get("persona")
 
     weights = DEFAULT_WEIGHTS.copy()
     if persona in PERSONA_WEIGHTS:
         weights.update(PERSONA_WEIGHTS[persona])
 
-    ctx_weights = _to_dict(_get(bundle.context, "default_weights", {}))
+    ctx_weights = _to_dict(_get(_get(bundle, "context"), "default_weights", {}))
     weights.update(ctx_weights)
 
     total = sum(weights.values()) or 1.0
@@ -118,34 +99,198 @@ def _get_scoring_weights(bundle: FeatureBundle) -> dict[str, float]:
 def _get_seniority_adjustment(bundle: FeatureBundle) -> float:
     """Return multiplier based on pilot seniority."""
 
-    seniority = float(_get(bundle.context, "seniority_percentile", 0.0) or 0.0)
+    seniority = float(_get(_get(bundle, "context"), "seniority_percentile", 0.0) or 0.0)
     seniority = max(0.0, min(seniority, 1.0))
     return 0.9 + 0.2 * seniority
 
 
-def _score_days_off(bundle: FeatureBundle, pairing: Any, weights: dict[str, float]) -> float:
+def _plan_float(value: Any, default: float, strict: bool) -> float:
+    """``float(value)``, or ``default`` for non-numbers when not ``strict``."""
+
+    if strict:
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _plan_set(values: Any, strict: bool) -> frozenset[Any]:
+    """``frozenset(values)``; when not ``strict`` a bare string is one value and
+    unhashable members are dropped."""
+
+    if strict:
+        return frozenset(values or [])
+    if isinstance(values, (str, bytes)):
+        return frozenset([values])
+    if not isinstance(values, Iterable):
+        return frozenset()
+    return frozenset(v for v in values if isinstance(v, Hashable))
+
+
+@dataclass(frozen=True)
+class ScoringPlan:
+    """Per-request scoring inputs compiled once from a :class:`FeatureBundle`.
+
+    Everything the scorers need from the preference schema, context and
+    analytics is resolved up front into plain floats and frozensets, so the
+    per-pairing work is attribute reads and arithmetic only.
+    """
+
+    weights: dict[str, float]
+    seniority_factor: float
+    seniority_percentile: Optional[float]
+    layover_prefer: frozenset[Any]
+    layover_avoid: frozenset[Any]
+    layover_weight: float
+    length_prefer: frozenset[int]
+    length_avoid: frozenset[int]
+    length_weight: float
+    days_off: frozenset[Any]
+    # What the ``days_off`` score term matches against. Kept as the legacy
+    # scorer read it (``_to_dict`` of the constraint: empty for a list), so
+    # select_topk results do not change; ``days_off`` is the real list.
+    scored_days_off: frozenset[Any]
+    equip: frozenset[Any]
+    no_red_eyes: bool
+    award_rates: dict[Any, Any] = field(default_factory=dict)
+    credit_window: tuple[float, float] = (0.0, math.inf)
+
+    @classmethod
+    def from_bundle(
+        cls,
+        bundle: FeatureBundle,
+        weights: Optional[dict[str, float]] = None,
+        *,
+        strict: bool = True,
+    ) -> ScoringPlan:
+        """Compile ``bundle``; ``weights`` overrides :func:`_get_scoring_weights`.
+
+        With ``strict=False`` malformed preference values (non-numeric weights
+        or bounds, unhashable list members) fall back to neutral defaults
+        instead of raising, as :mod:`app.services.optimizer_v2` always has.
+        """
+
+        prefs = _get(bundle, "preference_schema")
+        ctx = _get(bundle, "context")
+        soft_d = _to_dict(_get(prefs, "soft_prefs", {}))
+        hard = _get(prefs, "hard_constraints", {})
+        layovers_d = _to_dict(soft_d.get("layovers"))
+        length_d = _to_dict(soft_d.get("pairing_length"))
+        base_stats_d = _to_dict(_get(_get(bundle, "analytics_features"), "base_stats", {}))
+        award_rates: dict[Any, Any] = {}
+        for city, stats in base_stats_d.items():
+            stats_d = _to_dict(stats)
+            if "award_rate" in stats_d:
+                award_rates[city] = stats_d["award_rate"]
+        seniority = _get(ctx, "seniority_percentile", None)
+        try:
+            seniority_factor = _get_seniority_adjustment(bundle)
+        except (TypeError, ValueError):
+            if strict:
+                raise
+            seniority_factor = _get_seniority_adjustment(None)
+        credit_d = _to_dict(soft_d.get("credit"))
+
+        return cls(
+            weights=dict(_get_scoring_weights(bundle) if weights is None else weights),
+            seniority_factor=seniority_factor,
+            seniority_percentile=(
+                float(seniority)
+                if isinstance(seniority, (int, float)) and not isinstance(seniority, bool)
+                else None
+            ),
+            layover_prefer=_plan_set(layovers_d.get("prefer"), strict),
+            layover_avoid=_plan_set(layovers_d.get("avoid"), strict),
+            layover_weight=(
+                layovers_d.get("weight", 1.0)
+                if strict
+                else _plan_float(layovers_d.get("weight", 1.0), 1.0, strict)
+            ),
+            length_prefer=_plan_set(length_d.get("prefer"), strict),
+            length_avoid=_plan_set(length_d.get("avoid"), strict),
+            length_weight=_plan_float(length_d.get("weight", 1.0) or 1.0, 1.0, strict),
+            days_off=_plan_set(_get(hard, "days_off", []), strict),
+            scored_days_off=_plan_set(_to_dict(_get(hard, "days_off", [])), strict),
+            equip=_plan_set(_get(prefs, "equip", []), strict),
+            no_red_eyes=bool(_get(hard, "no_red_eyes", False)),
+            award_rates=award_rates,
+            credit_window=(
+                _plan_float(credit_d.get("min") or 0.0, 0.0, strict),
+                _plan_float(credit_d.get("max") or math.inf, math.inf, strict),
+            ),
+        )
+
+    def award_rate(self, city: Any, default: float = 0.5) -> Any:
+        """Historical award rate for a layover city."""
+
+        return self.award_rates.get(city, default)
+
+    def layover_pref(self, city: Any) -> float:
+        """1.0 for preferred, 0.0 for avoided, 0.5 for neutral layover cities."""
+
+        if city in self.layover_prefer:
+            return 1.0
+        if city in self.layover_avoid:
+            return 0.0
+        return 0.5
+
+
+def _rule_hits_misses(plan: ScoringPlan, pairing: Any) -> tuple[list[str], list[str]]:
+    """Determine which hard rules are satisfied or violated."""
+
+    hits: list[str] = []
+    misses: list[str] = []
+
+    rest_hours = float(_get(pairing, "rest_hours", 999) or 999)
+    if rest_hours < 10:
+        misses.append("FAR117_MIN_REST")
+    else:
+        hits.append("FAR117_MIN_REST")
+
+    is_redeye = bool(_get(pairing, "redeye", False))
+    if plan.no_red_eyes and is_redeye:
+        misses.append("NO_REDEYE_IF_SET")
+    else:
+        hits.append("NO_REDEYE_IF_SET")
+
+    return hits, misses
+
+
+def _score_award_rate(plan: ScoringPlan, pairing: Any) -> float:
+    """Historical award rate of the layover city."""
+
+    award = plan.award_rate(_get(pairing, "layover_city", None))
+    return plan.weights.get("award_rate", 0.0) * award
+
+
+def _score_layovers(plan: ScoringPlan, pairing: Any) -> float:
+    """Score against preferred / avoided layover cities."""
+
+    pref_score = plan.layover_pref(_get(pairing, "layover_city", None))
+    return plan.weights.get("layovers", 0.0) * plan.layover_weight * pref_score
+
+
+def _score_days_off(plan: ScoringPlan, pairing: Any) -> float:
     """Score whether pairing avoids requested days off."""
 
-    req = set(
-        _to_dict(_get(_get(bundle.preference_schema, "hard_constraints", {}), "days_off", [])) or []
-    )
-    pairing_days = set(_get(pairing, "dates", []) or _get(pairing, "duty_days", []) or [])
-    if not req or not pairing_days:
+    pairing_days = _get(pairing, "dates", []) or _get(pairing, "duty_days", []) or []
+    if not plan.scored_days_off or not pairing_days:
         base = 0.0
     else:
-        base = 1.0 if not req.intersection(pairing_days) else 0.0
-    return weights.get("days_off", 0.0) * base
+        base = 0.0 if plan.scored_days_off.intersection(pairing_days) else 1.0
+    return plan.weights.get("days_off", 0.0) * base
 
 
-def _score_block_hours(pairing: Any, weights: dict[str, float]) -> float:
+def _score_block_hours(plan: ScoringPlan, pairing: Any) -> float:
     """Favor higher block or credit hours."""
 
     block = float(_get(pairing, "block_hours", _get(pairing, "credit_hours", 0.0)) or 0.0)
     base = min(block, 100.0) / 100.0
-    return weights.get("block_hours", 0.0) * base
+    return plan.weights.get("block_hours", 0.0) * base
 
 
-def _score_duty_hours(pairing: Any, weights: dict[str, float]) -> float:
+def _score_duty_hours(plan: ScoringPlan, pairing: Any) -> float:
     """Higher score for lower duty hours."""
 
     duty = float(_get(pairing, "duty_hours", _get(pairing, "duty_time", 0.0)) or 0.0)
@@ -153,18 +298,18 @@ def _score_duty_hours(pairing: Any, weights: dict[str, float]) -> float:
         base = 0.0
     else:
         base = max(0.0, 1.0 - min(duty, 16.0) / 16.0)
-    return weights.get("duty_hours", 0.0) * base
+    return plan.weights.get("duty_hours", 0.0) * base
 
 
-def _score_layover_quality(pairing: Any, weights: dict[str, float]) -> float:
+def _score_layover_quality(plan: ScoringPlan, pairing: Any) -> float:
     """Use rest hours as a proxy for layover quality."""
 
     rest = float(_get(pairing, "rest_hours", _get(pairing, "layover_rest_hours", 0.0)) or 0.0)
     base = min(rest, 24.0) / 24.0
-    return weights.get("layover_quality", 0.0) * base
+    return plan.weights.get("layover_quality", 0.0) * base
 
 
-def _score_report_time(bundle: FeatureBundle, pairing: Any, weights: dict[str, float]) -> float:
+def _score_report_time(plan: ScoringPlan, pairing: Any) -> float:
     """Score later report times higher."""
 
     time_str = _get(pairing, "report_time", "") or ""
@@ -174,10 +319,10 @@ def _score_report_time(bundle: FeatureBundle, pairing: Any, weights: dict[str, f
         base = minutes / (24 * 60)
     else:
         base = 0.0
-    return weights.get("report_time", 0.0) * base
+    return plan.weights.get("report_time", 0.0) * base
 
 
-def _score_commutability(pairing: Any, weights: dict[str, float]) -> float:
+def _score_commutability(plan: ScoringPlan, pairing: Any) -> float:
     """Binary score if pairing is marked commutable."""
 
     is_commutable = _get(pairing, "is_commutable", None)
@@ -185,17 +330,12 @@ def _score_commutability(pairing: Any, weights: dict[str, float]) -> float:
         base = 0.0
     else:
         base = 1.0 if is_commutable else 0.0
-    return weights.get("commutability", 0.0) * base
+    return plan.weights.get("commutability", 0.0) * base
 
 
-def _score_trip_length(bundle: FeatureBundle, pairing: Any, weights: dict[str, float]) -> float:
+def _score_trip_length(plan: ScoringPlan, pairing: Any) -> float:
     """Score against preferred trip lengths."""
 
-    prefs_d = _to_dict(_get(bundle.preference_schema, "soft_prefs", {}))
-    length_d = _to_dict(prefs_d.get("pairing_length"))
-    prefer = set(length_d.get("prefer") or [])
-    avoid = set(length_d.get("avoid") or [])
-    pref_w = float(length_d.get("weight", 1.0) or 1.0)
     length = int(
         _get(
             pairing,
@@ -206,87 +346,148 @@ def _score_trip_length(bundle: FeatureBundle, pairing: Any, weights: dict[str, f
     )
     if length == 0:
         base = 0.0
-    elif length in prefer:
+    elif length in plan.length_prefer:
         base = 1.0
-    elif length in avoid:
+    elif length in plan.length_avoid:
         base = 0.0
     else:
         base = 0.5
-    return weights.get("trip_length", 0.0) * pref_w * base
+    return plan.weights.get("trip_length", 0.0) * plan.length_weight * base
 
 
-def _score_equipment(bundle: FeatureBundle, pairing: Any, weights: dict[str, float]) -> float:
+def _score_equipment(plan: ScoringPlan, pairing: Any) -> float:
     """Score if the pairing's equipment matches pilot preferences."""
 
-    desired = set(_get(bundle.preference_schema, "equip", []) or [])
     equip = _get(pairing, "equipment", _get(pairing, "equip", None))
-    if not equip or not desired:
+    if not equip or not plan.equip:
         base = 0.0
     else:
-        base = 1.0 if equip in desired else 0.0
-    return weights.get("equipment", 0.0) * base
+        base = 1.0 if equip in plan.equip else 0.0
+    return plan.weights.get("equipment", 0.0) * base
 
 
-def select_topk(bundle: FeatureBundle, K: int = 50) -> list[CandidateSchedule]:
-    """
-    Legacy-compatible Top-K selection:
-    - DO NOT hard-filter here (legacy scored all pairings; later stages enforce rules)
-    - Score = award_rate(city) + weight * pref(city) where pref∈{1.0, 0.5, 0.0}
-    - Stable ties by earlier input order
-    - O(N log K)
+_SCORERS = (
+    ("award_rate", _score_award_rate),
+    ("layovers", _score_layovers),
+    ("days_off", _score_days_off),
+    ("block_hours", _score_block_hours),
+    ("duty_hours", _score_duty_hours),
+    ("layover_quality", _score_layover_quality),
+    ("report_time", _score_report_time),
+    ("commutability", _score_commutability),
+    ("trip_length", _score_trip_length),
+    ("equipment", _score_equipment),
+)
+BREAKDOWN_KEYS: tuple[str, ...] = tuple(key for key, _fn in _SCORERS)
+
+
+def _score_pairing(plan: ScoringPlan, pairing: Any) -> dict[str, float]:
+    """Soft-score breakdown for a single pairing (scalar path)."""
+
+    return {key: fn(plan, pairing) for key, fn in _SCORERS}
+
+
+def _score_frame(plan: ScoringPlan, frame: PairingFrame) -> np.ndarray:
+    """Vectorized equivalent of :func:`_score_pairing`.
+
+    Returns an ``(N, len(BREAKDOWN_KEYS))`` matrix whose columns follow
+    :data:`BREAKDOWN_KEYS`; each cell equals what the matching scalar helper
+    returns for that pairing.
     """
-    weights = _get_scoring_weights(bundle)
-    seniority_factor = _get_seniority_adjustment(bundle)
-
-    # soft prefs / weights for layovers
-    prefs_d = _to_dict(_get(bundle.preference_schema, "soft_prefs", {}))
-    layovers_d = _to_dict(prefs_d.get("layovers"))
-    prefer = set(layovers_d.get("prefer") or [])
-    avoid = set(layovers_d.get("avoid") or [])
-    pref_w = layovers_d.get("weight", 1.0)
-
-    # award rates
-    base_stats_d = _to_dict(_get(bundle.analytics_features, "base_stats", {}))
-
-    items: list[tuple[float, int, str, dict[str, float], Any]] = []
-    pairings = _get(bundle.pairing_features, "pairings", []) or []
-    for i, p in enumerate(pairings):
-        pid = _get(p, "id", "")
-        city = _get(p, "layover_city", None)
-
-        award = _to_dict(base_stats_d.get(city, {})).get("award_rate", 0.5)
-
-        if city in prefer:
-            pref_score = 1.0
-        elif city in avoid:
-            pref_score = 0.0
-        else:
-            pref_score = 0.5
-
-        breakdown: dict[str, float] = {
-            "award_rate": weights.get("award_rate", 0.0) * award,
-            "layovers": weights.get("layovers", 0.0) * pref_w * pref_score,
-            "days_off": _score_days_off(bundle, p, weights),
-            "block_hours": _score_block_hours(p, weights),
-            "duty_hours": _score_duty_hours(p, weights),
-            "layover_quality": _score_layover_quality(p, weights),
-            "report_time": _score_report_time(bundle, p, weights),
-            "commutability": _score_commutability(p, weights),
-            "trip_length": _score_trip_length(bundle, p, weights),
-            "equipment": _score_equipment(bundle, p, weights),
-        }
-        score = sum(breakdown.values()) * seniority_factor
-        items.append((score, -i, pid, breakdown, p))  # stable: earlier wins ties
-
-    winners = heapq.nlargest(K, items, key=itemgetter(0, 1))
+
+    n = len(frame)
+
+    # award rate + layover preference, resolved once per distinct city
+    award = frame.city_lookup({c: plan.award_rate(c) for c in frame.city_vocab}, 0.5)
+    lay_pref = frame.city_lookup({c: plan.layover_pref(c) for c in frame.city_vocab}, 0.5)
+
+    if plan.scored_days_off:
+        days_base = (frame.has_days() & ~frame.touches_days(plan.scored_days_off)).astype(
+            np.float64
+        )
+    else:
+        days_base = np.zeros(n, dtype=np.float64)
+
+    duty = frame.duty_hours
+    duty_base = np.where(duty <= 0, 0.0, np.maximum(0.0, 1.0 - np.minimum(duty, 16.0) / 16.0))
+    report = frame.report_minutes
+    report_base = np.where(np.isnan(report), 0.0, report / (24 * 60))
+
+    length = frame.trip_length
+    length_base = np.select(
+        [
+            length == 0,
+            np.isin(length, list(plan.length_prefer)),
+            np.isin(length, list(plan.length_avoid)),
+        ],
+        [0.0, 1.0, 0.0],
+        default=0.5,
+    )
+
+    equip_base = frame.equip_in(plan.equip).astype(np.float64)
+
+    w = plan.weights.get
+    columns = (
+        w("award_rate", 0.0) * award,
+        w("layovers", 0.0) * plan.layover_weight * lay_pref,
+        w("days_off", 0.0) * days_base,
+        w("block_hours", 0.0) * (np.minimum(frame.block_hours, 100.0) / 100.0),
+        w("duty_hours", 0.0) * duty_base,
+        w("layover_quality", 0.0) * (np.minimum(frame.rest_hours, 24.0) / 24.0),
+        w("report_time", 0.0) * report_base,
+        w("commutability", 0.0) * frame.commutable.astype(np.float64),
+        w("trip_length", 0.0) * plan.length_weight * length_base,
+        w("equipment", 0.0) * equip_base,
+    )
+    out = np.empty((n, len(BREAKDOWN_KEYS)), dtype=np.float64)
+    for j, col in enumerate(columns):
+        out[:, j] = col
+    return out
+
+
+def _sum_breakdown(breakdown: np.ndarray) -> np.ndarray:
+    """Row totals accumulated left-to-right, matching ``sum(dict.values())``."""
+
+    total = np.zeros(breakdown.shape[0], dtype=np.float64)
+    for j in range(breakdown.shape[1]):
+        total += breakdown[:, j]
+    return total
+
+
+def _topk_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` best scores, descending, earlier index wins ties."""
+
+    n = len(scores)
+    k = max(0, min(k, n))
+    if k == 0:
+        return np.zeros(0, dtype=np.intp)
+    if k < n:
+        kth = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[: k - len(above)]
+        chosen = np.concatenate((above, ties))
+    else:
+        chosen = np.arange(n)
+    order = np.lexsort((chosen, -scores[chosen]))
+    return chosen[order]
+
+
+def _topk_candidates(plan: ScoringPlan, frame: PairingFrame, K: int) -> list[CandidateSchedule]:
+    """Score ``frame`` under ``plan`` and build the top-``K`` single-pairing candidates."""
+
+    breakdowns = _score_frame(plan, frame)
+    scores = _sum_breakdown(breakdowns) * plan.seniority_factor
 
     result: list[CandidateSchedule] = []
-    for winner_score, _neg_i, pid, breakdown, pairing in winners:
-        hits, misses = _rule_hits_misses(bundle, pairing)
+    for i in _topk_indices(scores, K).tolist():
+        pid = frame.ids[i]
+        pairing = frame.records[i]
+        breakdown = dict(zip(BREAKDOWN_KEYS, breakdowns[i].tolist()))
+        hits, misses = _rule_hits_misses(plan, pairing)
         result.append(
             CandidateSchedule(
                 candidate_id=pid,
-                score=winner_score,
+                score=float(scores[i]),
                 hard_ok=len(misses) == 0,
                 soft_breakdown=breakdown,
                 pairings=[pid],
@@ -297,15 +498,29 @@ def select_topk(bundle: FeatureBundle, K: int = 50) -> list[CandidateSchedule]:
                 ),
             )
         )
+    return result
+
 
-    ctx_id = bundle.context.ctx_id
-    with SessionLocal() as db:
-        for cand in result:
-            db.add(Candidate(ctx_id=ctx_id, data=cand.model_dump()))
-        db.commit()
+def _persist_candidates(ctx_id: str, result: list[CandidateSchedule]) -> None:
+    for cand in result:
+        persistence.add(Candidate, ctx_id=ctx_id, data=cand.model_dump())
 
     log_event(ctx_id, "optimize", {"candidates": [c.candidate_id for c in result]})
 
+
+def select_topk(bundle: FeatureBundle, K: int = 50) -> list[CandidateSchedule]:
+    """
+    Legacy-compatible Top-K selection:
+    - DO NOT hard-filter here (legacy scored all pairings; later stages enforce rules)
+    - Score = award_rate(city) + weight * pref(city) where pref∈{1.0, 0.5, 0.0}
+    - Stable ties by earlier input order
+    - Pairings are column-encoded once (:class:`PairingFrame`) and scored as a
+      breakdown matrix; top-K uses a partial partition, O(N + K log K)
+    """
+    plan = ScoringPlan.from_bundle(bundle)
+
+    result = _topk_candidates(plan, pairing_frame_for(bundle.pairing_features), K)
+    _persist_candidates(bundle.context.ctx_id, result)
     return result
 
 
@@ -4,8 +4,11 @@ import math
 import os
 import re
 from collections.abc import Mapping, Sequence
+from dataclasses import replace
 from typing import Any
 
+from app.services.optimizer import ScoringPlan, _plan_set
+
 try:
     from pydantic import BaseModel, Field
 except Exception:
@@ -303,30 +306,22 @@ def _extract_bundle(bundle: Any) -> dict[str, Any]:
 
 def _score_pairing(
     p: Mapping[str, Any],
-    ctx: Mapping[str, Any],
-    prefs: Mapping[str, Any],
-    analytics: Mapping[str, Any],
-    W: Mapping[str, float],
+    plan: ScoringPlan,
 ) -> tuple[float, list[str], dict[str, float]]:
     notes = []
     bd = dict.fromkeys(SCORING_CATEGORIES, 0.0)  # exact key set
+    W = plan.weights
 
     # Layovers: 1.0 if explicit match; if data missing (no city or prefer list), neutral 0.5
     city = p.get("layover_city") or p.get("city")
-    prefer = _get_in(prefs, "soft_prefs", "layovers", "prefer", default=[]) or _get_in(
-        prefs, "layovers", "prefer", default=[]
-    )
-    lay_base = (
-        0.5
-        if (not prefer or not city)
-        else (1.0 if (isinstance(prefer, Sequence) and city in prefer) else 0.0)
-    )
+    prefer = plan.layover_prefer
+    lay_base = 0.5 if (not prefer or not city) else (1.0 if city in prefer else 0.0)
     bd["layovers"] = W.get("layovers", 0.0) * lay_base
     if lay_base == 1.0:
         notes.append(f"+layovers({city})")
 
     # Award rate: neutral 0.5 if missing
-    rate = _get_in(analytics, "base_stats", str(city), "award_rate", default=None)
+    rate = plan.award_rates.get(str(city))
     rate_missing = not isinstance(rate, int | float)
     if rate_missing:
         rate = 0.5
@@ -349,8 +344,8 @@ def _score_pairing(
     base = sum(v for k, v in bd.items() if k != "seniority_bonus")
 
     # Seniority as additive bonus equal to 10% * base * percentile (keeps sum(breakdown)==score)
-    sp = ctx.get("seniority_percentile")
-    if isinstance(sp, int | float):
+    sp = plan.seniority_percentile
+    if sp is not None:
         sp_eff = (
             min(float(sp), 0.2) if rate_missing else float(sp)
         )  # slight dampening when analytics missing
@@ -364,17 +359,16 @@ def select_topk(
     bundle: Any, top_k: int = 10, *, strategy: str = "bm25", **kwargs: Any
 ) -> list[RankedCandidate]:
     parts = _extract_bundle(bundle)
-    ctx, prefs, analytics, pairings = (
-        parts["context"],
-        parts["prefs"],
-        parts["analytics"],
-        parts["pairings"],
-    )
     W = _get_scoring_weights(bundle, normalize=True)
+    plan = ScoringPlan.from_bundle(bundle, weights=W, strict=False)
+    if not plan.layover_prefer:
+        # flat preference dicts may carry ``layovers`` at the top level
+        flat = _get_in(parts["prefs"], "layovers", "prefer", default=[])
+        plan = replace(plan, layover_prefer=_plan_set(flat, strict=False))
     ranked = []
-    for p in pairings:
+    for p in parts["pairings"]:
         pid = _coerce_id(p)
-        s, notes, bd = _score_pairing(p, ctx, prefs, analytics, W)
+        s, notes, bd = _score_pairing(p, plan)
         ranked.append(
             RankedCandidate(
                 candidate_id=pid,
@@ -0,0 +1,345 @@
+"""Columnar (NumPy) view over a list of pairing records.
+
+``PairingFrame`` extracts every field the optimizer scores on in a single pass
+over ``pairing_features["pairings"]`` so that scoring can run as a handful of
+array operations instead of per-pairing dict lookups.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from collections.abc import Iterable, Sequence
+from datetime import date, datetime
+from typing import Any, Optional
+
+import numpy as np
+
+_MISSING = object()
+
+
+def pairing_field(p: Any, name: str, default: Any = None) -> Any:
+    """Read ``name`` from a dict-like or attribute-style pairing."""
+
+    if isinstance(p, dict):
+        return p.get(name, default)
+    value = getattr(p, name, _MISSING)
+    if value is not _MISSING:
+        return value
+    if hasattr(p, "model_dump"):
+        return p.model_dump().get(name, default)
+    return default
+
+
+def report_minutes(value: Any) -> float:
+    """Minutes after midnight of an ``HHMM`` / ``HH:MM`` report time, NaN otherwise."""
+
+    digits = str(value or "").replace(":", "")
+    if len(digits) == 4 and digits.isdigit():
+        return float(int(digits[:2]) * 60 + int(digits[2:]))
+    return np.nan
+
+
+def day_number(value: Any) -> Optional[int]:
+    """Day of month (1-31) for an int, date, ``YYYY-MM-DD`` or ``MM-DD`` value."""
+
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, date):
+        return value.day
+    if isinstance(value, int):
+        day = value
+    else:
+        tail = str(value).strip().rsplit("-", 1)[-1].rsplit("/", 1)[-1]
+        if not tail.isdigit():
+            return None
+        day = int(tail)
+    return day if 1 <= day <= 31 else None
+
+
+#: Highest day bit in a calendar bitmask: the bid month plus the days a trip
+#: starting late in the month may run into the next one.
+LAST_DAY = 62
+
+
+def month_start(value: Any) -> Optional[date]:
+    """First day of the month named by a ``YYYY-MM`` / ``YYYY-MM-DD`` value or a date."""
+
+    if isinstance(value, date):
+        return date(value.year, value.month, 1)
+    text = str(value or "").strip()
+    try:
+        return date(int(text[:4]), int(text[5:7]), 1) if text[4:5] == "-" else None
+    except ValueError:
+        return None
+
+
+def _full_date(value: Any) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and len(value) >= 10 and value[4] == "-":
+        try:
+            return date.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    return None
+
+
+def day_offset(value: Any, month: Optional[date] = None) -> Optional[int]:
+    """Calendar day (1-:data:`LAST_DAY`) of ``value`` within the bid ``month``.
+
+    Full dates count from the first of ``month``, so a date early in the next
+    month lands after day 31 rather than on the same day of this one; dates
+    before ``month`` or past :data:`LAST_DAY` give None. Without ``month``,
+    and for values without a year and month, this is :func:`day_number`.
+    """
+
+    full = _full_date(value) if month is not None else None
+    if full is None:
+        return day_number(value)
+    day = (full - month).days + 1
+    return day if 1 <= day <= LAST_DAY else None
+
+
+def day_mask(values: Iterable[Any], month: Optional[date] = None) -> int:
+    """Calendar bitmask with bit ``d`` set for the :func:`day_offset` ``d`` of each value.
+
+    Values outside the month's calendar are ignored.
+    """
+
+    mask = 0
+    for v in values:
+        d = day_offset(v, month)
+        if d is not None:
+            mask |= 1 << d
+    return mask
+
+
+def _pairing_day_mask(p: Any, dates: Sequence[Any], length: int, month: Optional[date]) -> int:
+    """Calendar bitmask of a pairing; ``0`` when it cannot be placed on the calendar.
+
+    A pairing without dates or a start day, or with any date outside the bid
+    month's calendar, has no place in a monthly schedule.
+    """
+
+    if dates:
+        days = [day_offset(d, month) for d in dates]
+    else:
+        start = day_offset(pairing_field(p, "start_day", None) or 0, month)
+        if start is None:
+            return 0
+        days = list(range(start, start + max(length, 1)))
+    if any(d is None or d > LAST_DAY for d in days):
+        return 0
+    mask = 0
+    for d in days:
+        mask |= 1 << d
+    return mask
+
+
+def _packet_month(pairings: Sequence[Any], dates: Sequence[Sequence[Any]]) -> Optional[date]:
+    """The bid month: the pairings' ``month`` field, else the month most pairings start in."""
+
+    for p in pairings:
+        start = month_start(pairing_field(p, "month", None))
+        if start is not None:
+            return start
+    starts = Counter(
+        month_start(first) for first in (_full_date(row[0]) for row in dates if row) if first
+    )
+    if not starts:
+        return None
+    return min(starts, key=lambda m: (-starts[m], m))
+
+
+class _Vocab:
+    """Dictionary encoder assigning dense integer codes to hashable values."""
+
+    __slots__ = ("codes", "values")
+
+    def __init__(self) -> None:
+        self.codes: dict[Any, int] = {}
+        self.values: list[Any] = []
+
+    def encode(self, value: Any) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+
+class PairingFrame:
+    """Column-encoded pairing table.
+
+    Numeric columns are ``float64``/``int64`` arrays aligned with ``ids``.
+    Layover cities, equipment and duty dates are dictionary-encoded: the
+    ``*_codes`` arrays index into the matching ``*_vocab`` list, and
+    ``day_matrix[i, j]`` is True when pairing ``i`` touches ``day_vocab[j]``.
+    ``day_masks`` holds the same dates as calendar bitmasks within the bid
+    ``month`` (see :func:`day_offset`); pairings that cannot be placed on
+    that calendar (no dates, or dates outside it) get ``0``.
+    The original records are kept in ``records`` for rationale generation.
+    """
+
+    __slots__ = (
+        "records",
+        "ids",
+        "rest_hours",
+        "duty_hours",
+        "block_hours",
+        "report_minutes",
+        "trip_length",
+        "commutable",
+        "redeye",
+        "city_codes",
+        "city_vocab",
+        "equip_codes",
+        "equip_vocab",
+        "day_matrix",
+        "day_vocab",
+        "day_masks",
+        "month",
+    )
+
+    #: Attributes holding NumPy columns; the rest are plain Python values.
+    ARRAY_FIELDS = (
+        "rest_hours",
+        "duty_hours",
+        "block_hours",
+        "report_minutes",
+        "trip_length",
+        "commutable",
+        "redeye",
+        "city_codes",
+        "equip_codes",
+        "day_matrix",
+        "day_masks",
+    )
+    LIST_FIELDS = ("records", "ids", "city_vocab", "equip_vocab", "day_vocab", "month")
+
+    def __init__(self, pairings: Sequence[Any]) -> None:
+        n = len(pairings)
+        self.records = pairings
+        self.ids: list[str] = []
+        rest = np.empty(n, dtype=np.float64)
+        duty = np.empty(n, dtype=np.float64)
+        block = np.empty(n, dtype=np.float64)
+        report = np.empty(n, dtype=np.float64)
+        length = np.empty(n, dtype=np.int64)
+        commutable = np.empty(n, dtype=bool)
+        redeye = np.empty(n, dtype=bool)
+        city_codes = np.empty(n, dtype=np.int32)
+        equip_codes = np.empty(n, dtype=np.int32)
+        masks = np.empty(n, dtype=np.uint64)
+        cities, equips, days = _Vocab(), _Vocab(), _Vocab()
+        day_rows: list[list[int]] = []
+        all_dates: list[Sequence[Any]] = []
+
+        for i, p in enumerate(pairings):
+            self.ids.append(pairing_field(p, "id", ""))
+            rest[i] = float(
+                pairing_field(p, "rest_hours", pairing_field(p, "layover_rest_hours", 0.0)) or 0.0
+            )
+            duty[i] = float(
+                pairing_field(p, "duty_hours", pairing_field(p, "duty_time", 0.0)) or 0.0
+            )
+            block[i] = float(
+                pairing_field(p, "block_hours", pairing_field(p, "credit_hours", 0.0)) or 0.0
+            )
+            report[i] = report_minutes(pairing_field(p, "report_time", ""))
+            length[i] = int(
+                pairing_field(
+                    p, "trip_length", pairing_field(p, "days", pairing_field(p, "duration_days", 0))
+                )
+                or 0
+            )
+            commutable[i] = bool(pairing_field(p, "is_commutable", None))
+            redeye[i] = bool(pairing_field(p, "redeye", False))
+            city_codes[i] = cities.encode(pairing_field(p, "layover_city", None))
+            equip_codes[i] = equips.encode(
+                pairing_field(p, "equipment", pairing_field(p, "equip", None))
+            )
+            dates = pairing_field(p, "dates", []) or pairing_field(p, "duty_days", []) or []
+            day_rows.append([days.encode(d) for d in dates])
+            all_dates.append(dates)
+
+        self.month = _packet_month(pairings, all_dates)
+        for i, p in enumerate(pairings):
+            masks[i] = _pairing_day_mask(p, all_dates[i], int(length[i]), self.month)
+
+        day_matrix = np.zeros((n, len(days.values)), dtype=bool)
+        for i, row in enumerate(day_rows):
+            day_matrix[i, row] = True
+
+        self.rest_hours = rest
+        self.duty_hours = duty
+        self.block_hours = block
+        self.report_minutes = report
+        self.trip_length = length
+        self.commutable = commutable
+        self.redeye = redeye
+        self.city_codes = city_codes
+        self.city_vocab = cities.values
+        self.equip_codes = equip_codes
+        self.equip_vocab = equips.values
+        self.day_matrix = day_matrix
+        self.day_vocab = days.values
+        self.day_masks = masks
+
+    @classmethod
+    def from_parts(cls, arrays: dict[str, np.ndarray], lists: dict[str, Any]) -> PairingFrame:
+        """Rebuild a frame from :attr:`ARRAY_FIELDS` arrays and :attr:`LIST_FIELDS` lists.
+
+        The arrays are used as-is (no copy), so they may be views onto shared
+        memory owned by another process.
+        """
+
+        frame = cls.__new__(cls)
+        for name in cls.ARRAY_FIELDS:
+            setattr(frame, name, arrays[name])
+        for name in cls.LIST_FIELDS:
+            setattr(frame, name, lists[name])
+        return frame
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def city_lookup(self, table: dict[Any, float], default: float) -> np.ndarray:
+        """Map each pairing's layover city through ``table``."""
+
+        per_code = np.array([table.get(c, default) for c in self.city_vocab], dtype=np.float64)
+        return per_code[self.city_codes] if len(per_code) else np.zeros(0, dtype=np.float64)
+
+    def equip_in(self, desired: set[Any]) -> np.ndarray:
+        """Boolean mask of pairings whose (truthy) equipment is in ``desired``."""
+
+        per_code = np.array([bool(e) and e in desired for e in self.equip_vocab], dtype=bool)
+        return per_code[self.equip_codes] if len(per_code) else np.zeros(0, dtype=bool)
+
+    def touches_days(self, days: set[Any]) -> np.ndarray:
+        """Boolean mask of pairings whose duty dates intersect ``days``."""
+
+        cols = [j for j, d in enumerate(self.day_vocab) if d in days]
+        if not cols:
+            return np.zeros(len(self), dtype=bool)
+        return self.day_matrix[:, cols].any(axis=1)
+
+    def has_days(self) -> np.ndarray:
+        """Boolean mask of pairings that list any duty dates."""
+
+        return self.day_matrix.any(axis=1)
+
+
+__all__ = [
+    "LAST_DAY",
+    "PairingFrame",
+    "day_mask",
+    "day_number",
+    "day_offset",
+    "month_start",
+    "pairing_field",
+    "report_minutes",
+]
@@ -0,0 +1,330 @@
+"""Process-wide repository of parsed pairing sets.
+
+A bid packet is parsed once (at ingest, or when a client registers it) and
+kept here as a :class:`PairingSet`: the pairing records plus their
+:class:`PairingFrame`, built lazily on first use. Sets are keyed by the
+packet hash and indexed by ``(airline, month, base, fleet)``.
+
+Requests can then send ``{"pairing_set_id": "..."}`` as ``pairing_features``
+instead of inlining every pairing; :func:`pairings_of` and
+:func:`pairing_frame_for` resolve either form, so the optimizer, the
+feasibility check and the batch paths share one decoded, column-encoded copy.
+
+With a ``snapshot_dir`` the repository also writes each set it is asked to
+persist as a memory-mapped snapshot (:mod:`app.services.pairing_snapshot`).
+Other worker processes that do not hold the set open that file instead of
+re-parsing the packet, and all of them share its pages. After each write,
+snapshots unused for ``snapshot_max_age`` seconds are deleted, and then the
+least recently used ones until the directory fits in ``snapshot_max_bytes``.
+
+When a revised packet replaces an earlier one, :meth:`PairingRepository.revise`
+publishes a :class:`PairingDelta` to subscribers so caches derived from the
+old set can be patched instead of rebuilt.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+import pydantic_core
+
+from app.services.pairing_frame import PairingFrame
+from app.services.pairing_snapshot import (
+    SnapshotFormatError,
+    find_snapshot,
+    open_snapshot,
+    prune_snapshots,
+    snapshot_path,
+    write_snapshot,
+)
+
+PAIRING_SET_KEY = "pairing_set_id"
+DEFAULT_MAX_SETS = 32
+DEFAULT_SNAPSHOT_MAX_BYTES = 2 * 1024**3
+DEFAULT_SNAPSHOT_MAX_AGE = 7 * 24 * 3600.0
+
+PacketKey = tuple[str, str, str, str]
+
+
+class UnknownPairingSet(KeyError):
+    """Raised when a request references a pairing set this process does not hold."""
+
+
+class PairingSet:
+    """Parsed pairings of one packet and their lazily built frame."""
+
+    __slots__ = ("set_id", "key", "pairings", "_frame", "_lock")
+
+    def __init__(
+        self,
+        set_id: str,
+        key: PacketKey,
+        pairings: Sequence[Any],
+        frame: Optional[PairingFrame] = None,
+    ) -> None:
+        self.set_id = set_id
+        self.key = key
+        # Snapshot records are decoded on access; keep them lazy.
+        self.pairings = pairings if frame is not None else list(pairings)
+        self._frame = frame
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.pairings)
+
+    @property
+    def frame(self) -> PairingFrame:
+        if self._frame is None:
+            with self._lock:
+                if self._frame is None:
+                    self._frame = PairingFrame(self.pairings)
+        return self._frame
+
+
+@dataclass(frozen=True)
+class PairingDelta:
+    """Pairing-level difference between two sets, matched on the record ``"id"``.
+
+    ``changed`` holds the new versions of records whose content differs.
+    Records without an id, or ids repeated within a set, cannot be matched;
+    such sets are reported through ``exact = False`` with empty
+    ``added``/``removed``/``changed``, and consumers should rebuild rather
+    than patch.
+    """
+
+    old_set_id: str
+    new_set_id: str
+    added: tuple[dict[str, Any], ...]
+    removed: tuple[str, ...]
+    changed: tuple[dict[str, Any], ...]
+    exact: bool = True
+
+    @classmethod
+    def between(cls, old: PairingSet, new: PairingSet) -> PairingDelta:
+        before, old_exact = _by_id(old.pairings)
+        after, new_exact = _by_id(new.pairings) if old_exact else ({}, False)
+        if not (old_exact and new_exact):
+            return cls(old.set_id, new.set_id, (), (), (), exact=False)
+        return cls(
+            old_set_id=old.set_id,
+            new_set_id=new.set_id,
+            added=tuple(p for pid, p in after.items() if pid not in before),
+            removed=tuple(pid for pid in before if pid not in after),
+            changed=tuple(p for pid, p in after.items() if pid in before and before[pid] != p),
+        )
+
+    @property
+    def affected_ids(self) -> frozenset[str]:
+        """Ids whose old records no longer hold: removed or changed."""
+        return frozenset(self.removed) | {p["id"] for p in self.changed}
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed) or not self.exact
+
+    def summary(self) -> dict[str, Any]:
+        """Counts for clients; ``None`` when the sets could not be matched (not ``exact``)."""
+        return {
+            "revises": self.old_set_id,
+            "exact": self.exact,
+            "added": len(self.added) if self.exact else None,
+            "removed": len(self.removed) if self.exact else None,
+            "changed": len(self.changed) if self.exact else None,
+        }
+
+
+def pairing_fingerprint(pairings: Sequence[Any]) -> str:
+    """SHA-256 of the pairings' JSON encoding, in list and key order."""
+
+    return hashlib.sha256(pydantic_core.to_json(pairings, fallback=str)).hexdigest()
+
+
+def _by_id(pairings: Sequence[Any]) -> tuple[dict[str, Any], bool]:
+    by_id: dict[str, Any] = {}
+    for p in pairings:
+        pid = p.get("id") if isinstance(p, dict) else None
+        if pid is None or pid in by_id:
+            return by_id, False
+        by_id[pid] = p
+    return by_id, True
+
+
+DeltaListener = Callable[[PairingDelta], None]
+
+
+class PairingRepository:
+    """LRU of :class:`PairingSet` objects, at most ``max_sets`` at a time."""
+
+    def __init__(
+        self,
+        max_sets: int = DEFAULT_MAX_SETS,
+        snapshot_dir: Optional[Union[str, Path]] = None,
+        snapshot_max_bytes: Optional[int] = DEFAULT_SNAPSHOT_MAX_BYTES,
+        snapshot_max_age: Optional[float] = DEFAULT_SNAPSHOT_MAX_AGE,
+    ) -> None:
+        self.max_sets = max_sets
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir is not None else None
+        self.snapshot_max_bytes = snapshot_max_bytes
+        self.snapshot_max_age = snapshot_max_age
+        self._sets: OrderedDict[str, PairingSet] = OrderedDict()
+        self._latest: dict[PacketKey, str] = {}
+        self._listeners: list[DeltaListener] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sets)
+
+    def put(
+        self,
+        pairings: Sequence[Any],
+        airline: str = "",
+        month: str = "",
+        base: str = "",
+        fleet: str = "",
+        packet_hash: Optional[str] = None,
+    ) -> PairingSet:
+        """Register a parsed packet; an existing set with the same id is reused.
+
+        ``packet_hash`` is the uploaded file's SHA-256. Without it the id is
+        the content fingerprint of ``pairings``.
+        """
+        if packet_hash is None:
+            packet_hash = pairing_fingerprint(pairings)
+        return self._add(PairingSet(packet_hash, (airline, month, base, fleet), pairings))
+
+    def _add(self, candidate: PairingSet) -> PairingSet:
+        with self._lock:
+            pset = self._sets.get(candidate.set_id)
+            if pset is None:
+                pset = self._sets[candidate.set_id] = candidate
+                while len(self._sets) > self.max_sets:
+                    _, evicted = self._sets.popitem(last=False)
+                    if self._latest.get(evicted.key) == evicted.set_id:
+                        del self._latest[evicted.key]
+            else:
+                self._sets.move_to_end(candidate.set_id)
+            self._latest[pset.key] = pset.set_id
+        return pset
+
+    def get(self, set_id: str) -> PairingSet:
+        """The set with id ``set_id``, opened from its snapshot if not held."""
+        with self._lock:
+            pset = self._sets.get(set_id)
+            if pset is not None:
+                self._sets.move_to_end(set_id)
+                return pset
+        path = find_snapshot(self.snapshot_dir, set_id)
+        if path is None:
+            raise UnknownPairingSet(set_id)
+        try:
+            snapshot = open_snapshot(path)
+        except (OSError, SnapshotFormatError) as e:
+            # Pruned by another worker since the lookup, or unreadable.
+            raise UnknownPairingSet(set_id) from e
+        _touch(path)
+        return self._add(PairingSet(set_id, snapshot.key, snapshot.records, snapshot.frame))
+
+    def save_snapshot(self, pset: PairingSet) -> Optional[Path]:
+        """Write ``pset`` to the snapshot directory unless it is already there,
+        then prune the directory (see the module docstring)."""
+        if self.snapshot_dir is None:
+            return None
+        path = find_snapshot(self.snapshot_dir, pset.set_id)
+        if path is None:
+            path = write_snapshot(
+                pset.frame, snapshot_path(self.snapshot_dir, pset.set_id), pset.key
+            )
+        else:
+            _touch(path)
+        prune_snapshots(
+            self.snapshot_dir, self.snapshot_max_bytes, self.snapshot_max_age, keep=path
+        )
+        return path
+
+    def latest(self, airline: str, month: str, base: str, fleet: str) -> Optional[PairingSet]:
+        """Most recently registered set for a packet key, if still held."""
+        with self._lock:
+            set_id = self._latest.get((airline, month, base, fleet))
+            return self._sets.get(set_id) if set_id else None
+
+    def subscribe(self, listener: DeltaListener) -> None:
+        """Call ``listener`` with every delta published by :meth:`revise`."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def revise(self, old_set_id: str, new_set: PairingSet) -> PairingDelta:
+        """Record ``new_set`` as a revision of ``old_set_id`` and notify subscribers.
+
+        Raises :class:`UnknownPairingSet` if the old set is no longer held.
+        """
+        delta = PairingDelta.between(self.get(old_set_id), new_set)
+        if old_set_id == new_set.set_id:
+            return delta
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(delta)
+            except Exception:
+                logging.exception("pairing delta listener %r failed", listener)
+        return delta
+
+
+def _touch(path: Path) -> None:
+    """Mark a snapshot as used, for :func:`prune_snapshots`."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+pairing_repository = PairingRepository(
+    snapshot_dir=os.environ.get("PAIRING_SNAPSHOT_DIR", "uploads/snapshots"),
+    snapshot_max_bytes=int(
+        os.environ.get("PAIRING_SNAPSHOT_MAX_BYTES", DEFAULT_SNAPSHOT_MAX_BYTES)
+    ),
+    snapshot_max_age=float(os.environ.get("PAIRING_SNAPSHOT_MAX_AGE", DEFAULT_SNAPSHOT_MAX_AGE)),
+)
+
+
+def pairing_set_of(pairing_features: Optional[dict[str, Any]]) -> Optional[PairingSet]:
+    """The referenced set when ``pairing_features`` carries a ``pairing_set_id``."""
+    set_id = (pairing_features or {}).get(PAIRING_SET_KEY)
+    return pairing_repository.get(set_id) if set_id else None
+
+
+def pairings_of(pairing_features: Optional[dict[str, Any]]) -> list[Any]:
+    """Pairing records, from the repository or inline ``"pairings"``."""
+    pset = pairing_set_of(pairing_features)
+    if pset is not None:
+        return pset.pairings
+    return (pairing_features or {}).get("pairings", []) or []
+
+
+def pairing_frame_for(pairing_features: Optional[dict[str, Any]]) -> PairingFrame:
+    """Column-encoded pairings; shared (not rebuilt) for repository sets."""
+    pset = pairing_set_of(pairing_features)
+    if pset is not None:
+        return pset.frame
+    return PairingFrame(pairings_of(pairing_features))
+
+
+__all__ = [
+    "PAIRING_SET_KEY",
+    "PairingDelta",
+    "PairingRepository",
+    "PairingSet",
+    "UnknownPairingSet",
+    "pairing_fingerprint",
+    "pairing_frame_for",
+    "pairing_repository",
+    "pairing_set_of",
+    "pairings_of",
+]
@@ -0,0 +1,317 @@
+"""Memory-mapped, columnar on-disk form of a :class:`PairingFrame`.
+
+A snapshot is written once per parsed packet and opened read-only with
+:mod:`mmap` by every worker process, so the column data lives once in the OS
+page cache instead of once per process as Python dicts. Layout::
+
+    b"VBPSNAP1"  uint64 header length  JSON header  padding  column data
+
+The header names each column's dtype, shape and offset (64-byte aligned)
+within the data section and carries the small dictionaries for the encoded
+string columns. Columns are:
+
+* every :attr:`PairingFrame.ARRAY_FIELDS` array, fixed width, as the frame
+  holds them (layover city and equipment as codes into ``city_vocab`` and
+  ``equip_vocab``);
+* ``id_offsets``/``id_bytes``: the pairing ids as UTF-8, decoded on access;
+* ``record_offsets``/``record_bytes``: each source record as JSON, so a
+  worker that opens the snapshot sees the same fields (``block``, ``route``,
+  ``month``...) as the worker that parsed the packet.
+
+:func:`open_snapshot` returns the frame (zero-copy views onto the map) and a
+lazy record sequence decoding one record per access. Nothing deletes
+snapshots on its own; :func:`prune_snapshots` keeps a directory within an
+age and size budget.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+from typing import Any, NamedTuple, Optional, Union, overload
+
+import numpy as np
+import pydantic_core
+
+from app.services.pairing_frame import PairingFrame, month_start
+
+MAGIC = b"VBPSNAP1"
+VERSION = 3
+ALIGN = 64
+# Snapshots of other format versions are never looked up, only pruned.
+SUFFIX = f".v{VERSION}.vbps"
+_PATTERN = "*.vbps"
+_PARTIAL = "*.part"
+
+_PREFIX = struct.Struct("<8sQ")
+
+
+class SnapshotFormatError(ValueError):
+    """Raised when a file is not a pairing snapshot this version can read."""
+
+
+class PairingSnapshot(NamedTuple):
+    """An opened snapshot: its packet key, frame and records."""
+
+    key: tuple[str, str, str, str]
+    frame: PairingFrame
+    records: SnapshotRecords
+
+
+def _strings(values: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+    return _blobs([str(v).encode("utf-8") for v in values])
+
+
+def _blobs(encoded: Sequence[bytes]) -> tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _columns(frame: PairingFrame) -> tuple[dict[str, np.ndarray], dict[str, list[Any]]]:
+    columns = {name: np.ascontiguousarray(getattr(frame, name)) for name in frame.ARRAY_FIELDS}
+    columns["id_offsets"], columns["id_bytes"] = _strings(frame.ids)
+    columns["record_offsets"], columns["record_bytes"] = _blobs(
+        [pydantic_core.to_json(p, fallback=str) for p in frame.records]
+    )
+    vocab = {
+        "city_vocab": list(frame.city_vocab),
+        "equip_vocab": list(frame.equip_vocab),
+        "day_vocab": list(frame.day_vocab),
+        "month": frame.month,
+    }
+    return columns, vocab
+
+
+def _aligned(n: int) -> int:
+    return -(-n // ALIGN) * ALIGN
+
+
+def write_snapshot(
+    frame: PairingFrame, path: Union[str, Path], key: Sequence[str] = ("", "", "", "")
+) -> Path:
+    """Write ``frame`` to ``path`` atomically and return the path.
+
+    Vocabulary values and records are stored as JSON (non-JSON values such
+    as :class:`datetime.date` become strings).
+    """
+    path = Path(path)
+    columns, vocab = _columns(frame)
+    layout = {}
+    offset = 0
+    for name, arr in columns.items():
+        layout[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset = _aligned(offset + arr.nbytes)
+    header = json.dumps(
+        {
+            "version": VERSION,
+            "count": len(frame),
+            "key": list(key),
+            "vocab": vocab,
+            "columns": layout,
+        },
+        separators=(",", ":"),
+        default=str,
+    ).encode("utf-8")
+    data_start = _aligned(_PREFIX.size + len(header))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(_PREFIX.pack(MAGIC, len(header)))
+            out.write(header)
+            for name, arr in columns.items():
+                out.seek(data_start + layout[name]["offset"])
+                out.write(arr.tobytes())
+            out.truncate(data_start + offset)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return path
+
+
+def open_snapshot(path: Union[str, Path]) -> PairingSnapshot:
+    """Map ``path`` read-only; its arrays are views onto the shared pages."""
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        magic, header_len = _PREFIX.unpack_from(mm)
+        if magic != MAGIC:
+            raise SnapshotFormatError(f"{path} is not a pairing snapshot")
+        header = json.loads(mm[_PREFIX.size : _PREFIX.size + header_len])
+        if header.get("version") != VERSION:
+            raise SnapshotFormatError(f"{path}: unsupported version {header.get('version')}")
+    except BaseException:
+        mm.close()
+        raise
+    data_start = _aligned(_PREFIX.size + header_len)
+
+    # The arrays keep the map alive; it is unmapped once the last one is gone.
+    columns = {}
+    for name, spec in header["columns"].items():
+        dtype = np.dtype(spec["dtype"])
+        shape = tuple(spec["shape"])
+        count = int(np.prod(shape, dtype=np.int64))
+        arr = np.frombuffer(mm, dtype=dtype, count=count, offset=data_start + spec["offset"])
+        columns[name] = arr.reshape(shape)
+
+    vocab = header["vocab"]
+    ids = StringColumn(columns["id_offsets"], columns["id_bytes"])
+    frame = PairingFrame.from_parts(
+        {name: columns[name] for name in PairingFrame.ARRAY_FIELDS},
+        {
+            "records": (),
+            "ids": ids,
+            "city_vocab": vocab["city_vocab"],
+            "equip_vocab": vocab["equip_vocab"],
+            "day_vocab": vocab["day_vocab"],
+            "month": month_start(vocab["month"]),
+        },
+    )
+    records = SnapshotRecords(columns["record_offsets"], columns["record_bytes"])
+    frame.records = records
+    return PairingSnapshot(tuple(header["key"]), frame, records)
+
+
+class StringColumn(Sequence):
+    """Read-only sequence of strings stored as UTF-8 bytes plus an offsets table."""
+
+    __slots__ = ("_offsets", "_data")
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray) -> None:
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    @overload
+    def __getitem__(self, i: int) -> str: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list[str]: ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[str, list[str]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, stop = self._offsets[i], self._offsets[i + 1]
+        return self._data[start:stop].tobytes().decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        data = self._data.tobytes()
+        offsets = self._offsets.tolist()
+        for start, stop in zip(offsets, offsets[1:]):
+            yield data[start:stop].decode("utf-8")
+
+
+class SnapshotRecords(Sequence):
+    """The source pairing records, decoded from their stored JSON on access."""
+
+    __slots__ = ("_offsets", "_data")
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray) -> None:
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    @overload
+    def __getitem__(self, i: int) -> dict[str, Any]: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list[dict[str, Any]]: ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[dict[str, Any], list[dict[str, Any]]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, stop = self._offsets[i], self._offsets[i + 1]
+        return json.loads(self._data[start:stop].tobytes())
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        data = self._data.tobytes()
+        offsets = self._offsets.tolist()
+        for start, stop in zip(offsets, offsets[1:]):
+            yield json.loads(data[start:stop])
+
+
+def snapshot_path(directory: Union[str, Path], set_id: str) -> Path:
+    return Path(directory) / f"{set_id}{SUFFIX}"
+
+
+def find_snapshot(directory: Optional[Union[str, Path]], set_id: str) -> Optional[Path]:
+    """Path of the snapshot for ``set_id`` in ``directory``, if one was written."""
+    if directory is None or not set_id.isalnum():
+        return None
+    path = snapshot_path(directory, set_id)
+    return path if path.is_file() else None
+
+
+def prune_snapshots(
+    directory: Union[str, Path],
+    max_bytes: Optional[int] = None,
+    max_age: Optional[float] = None,
+    keep: Optional[Path] = None,
+) -> list[Path]:
+    """Delete snapshots unused for ``max_age`` seconds, then the least
+    recently used ones until the rest fit in ``max_bytes``.
+
+    Use is the file's modification time (the repository touches a snapshot
+    when it opens it). ``keep`` is never deleted. Workers that already
+    mapped a deleted file keep reading it; its space is freed when they
+    unmap it. Returns the deleted paths.
+    """
+    directory = Path(directory)
+    now = time.time()
+    entries = []
+    for path in [*directory.glob(_PATTERN), *directory.glob(_PARTIAL)]:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    # Newest first, with ``keep`` counted against the budget before anything else.
+    entries.sort(key=lambda e: (e[2] != keep, -e[0]))
+
+    removed = []
+    total = 0
+    for mtime, size, path in entries:
+        # Partial files are writes in progress, or left by a crashed writer.
+        partial = path.suffix == ".part"
+        expired = max_age is not None and now - mtime > max_age
+        over = max_bytes is not None and total + size > max_bytes
+        if path != keep and (expired or (over and not partial)):
+            path.unlink(missing_ok=True)
+            removed.append(path)
+        elif not partial:
+            total += size
+    return removed
+
+
+__all__ = [
+    "PairingSnapshot",
+    "SnapshotFormatError",
+    "SnapshotRecords",
+    "StringColumn",
+    "find_snapshot",
+    "open_snapshot",
+    "prune_snapshots",
+    "snapshot_path",
+    "write_snapshot",
+]
@@ -1,8 +1,16 @@
-"""Contracts for normalized PBS parser structures."""
+"""Contracts for normalized PBS parser structures.
+
+:class:`Trip` and :class:`Pairing` are the validated models used at API
+boundaries. :class:`TripRecord` and :class:`PairingRecord` carry the same
+fields as plain tuples for bulk loads of trusted data (see
+:func:`app.services.pbs_parser.reader.load_records`); they are a fraction
+of the size and convert with ``to_model()`` when a model is needed.
+"""
 
 from __future__ import annotations
 
 from datetime import date
+from typing import NamedTuple
 
 from pydantic import BaseModel, Field
 
@@ -31,4 +39,42 @@ class Pairing(BaseModel):
     trips: list[Trip] = Field(default_factory=list)
 
 
-__all__ = ["Base", "Fleet", "Trip", "Pairing"]
+class TripRecord(NamedTuple):
+    """Unvalidated :class:`Trip`."""
+
+    trip_id: str
+    pairing_id: str
+    day: int
+    origin: str
+    destination: str
+
+    def to_model(self) -> Trip:
+        return Trip(
+            trip_id=self.trip_id,
+            pairing_id=self.pairing_id,
+            day=self.day,
+            origin=self.origin,
+            destination=self.destination,
+        )
+
+
+class PairingRecord(NamedTuple):
+    """Unvalidated :class:`Pairing`; ``trips`` is filled in while loading."""
+
+    pairing_id: str
+    base: str
+    fleet: str
+    month: date
+    trips: list[TripRecord]
+
+    def to_model(self) -> Pairing:
+        return Pairing(
+            pairing_id=self.pairing_id,
+            base=self.base,
+            fleet=self.fleet,
+            month=self.month,
+            trips=[t.to_model() for t in self.trips],
+        )
+
+
+__all__ = ["Base", "Fleet", "Trip", "Pairing", "PairingRecord", "TripRecord"]
@@ -15,3 +15,11 @@ class FileMissingError(ParserError):
     def __init__(self, path: Path) -> None:
         super().__init__(f"Expected file not found: {path}")
         self.path = path
+
+
+class ChecksumMismatchError(ParserError):
+    """Raised when a dataset file does not match its recorded checksum."""
+
+    def __init__(self, path: Path) -> None:
+        super().__init__(f"Checksum mismatch or not recorded: {path}")
+        self.path = path
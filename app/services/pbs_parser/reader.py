@@ -1,12 +1,30 @@
-"""Load synthetic datasets into parser contracts."""
+"""Load synthetic datasets into parser contracts.
+
+:func:`load` and friends validate every row into pydantic models.
+:func:`load_records` is the fast path for trusted datasets: the files are
+first checked against their SHA-256 checksums (a ``SHA256SUMS`` manifest
+next to them, or a mapping passed in), then read straight into
+:class:`PairingRecord`/:class:`TripRecord` tuples without per-row
+validation, with repeated codes (bases, fleets, airports) shared.
+"""
 
 from __future__ import annotations
 
 import csv
+import hashlib
+import io
+import json
+import operator
+from collections.abc import Iterator, Mapping, Sequence
+from datetime import date
 from pathlib import Path
+from typing import IO, Any, Callable, Optional
+
+from .contracts import Pairing, PairingRecord, Trip, TripRecord
+from .errors import ChecksumMismatchError, FileMissingError, ParserError
 
-from .contracts import Pairing, Trip
-from .errors import FileMissingError
+CHECKSUM_FILE = "SHA256SUMS"
+DATASET_FILES = ("pairings.csv", "trips.csv", "pairings.jsonl", "trips.jsonl")
 
 
 def load(path: Path) -> list[Pairing]:
@@ -52,6 +70,98 @@ def load_csv(path: Path) -> list[Pairing]:
     return list(pairings.values())
 
 
+PAIRING_COLUMNS = ("pairing_id", "base", "fleet", "month")
+TRIP_COLUMNS = ("trip_id", "pairing_id", "day", "origin", "destination")
+
+
+def _text_lines(stream: IO, encoding: str = "utf-8") -> Iterator[str]:
+    """Yield lines of a binary or text stream without reading it all at once.
+
+    Binary streams are decoded through a :class:`io.TextIOWrapper` that is
+    detached afterwards, so the caller's stream is left open.
+    """
+
+    if isinstance(stream, io.TextIOBase):
+        yield from stream
+        return
+    text = io.TextIOWrapper(stream, encoding=encoding, newline="")
+    try:
+        yield from text
+    finally:
+        text.detach()
+
+
+def read_csv_stream(stream: IO) -> list[Pairing] | None:
+    """Parse a pairings CSV, optionally followed by a trips section, in one pass.
+
+    A row naming ``trip_id`` starts the trips section; a row naming
+    ``pairing_id`` (but not ``trip_id``) starts the pairings section. Columns
+    are looked up by header name. Rows with an empty required cell are
+    skipped, a non-numeric trip ``day`` reads as 1, and trips are attached to
+    pairings defined anywhere in the file. Returns None when the file has no
+    recognizable header.
+    """
+
+    pairings: dict[str, Pairing] = {}
+    orphans: list[Trip] = []  # trips seen before their pairing
+    section: tuple[str, ...] | None = None
+    pick = None
+    width = 0
+
+    for row in csv.reader(_text_lines(stream)):
+        # One lower() per row; exact header names are checked only on a hit.
+        line = ",".join(row).lower()
+        if "pairing_id" in line:
+            names = [c.strip().lower() for c in row]
+            if "pairing_id" in names:
+                section = TRIP_COLUMNS if "trip_id" in names else PAIRING_COLUMNS
+                if not all(col in names for col in section):
+                    section = None
+                    continue
+                positions = [names.index(col) for col in section]
+                pick = operator.itemgetter(*positions)
+                width = max(positions) + 1
+                continue
+        if section is None or len(row) < width:
+            continue
+        values = [v.strip() for v in pick(row)]
+        if not all(values):
+            continue
+        if section is PAIRING_COLUMNS:
+            pairing_id, base, fleet, month = values
+            pairings[pairing_id] = Pairing(
+                pairing_id=pairing_id, base=base, fleet=fleet, month=month, trips=[]
+            )
+            continue
+        trip_id, pairing_id, day, origin, destination = values
+        trip = Trip(
+            trip_id=trip_id,
+            pairing_id=pairing_id,
+            day=int(day) if day.isdigit() else 1,
+            origin=origin,
+            destination=destination,
+        )
+        pairing = pairings.get(pairing_id)
+        if pairing is not None:
+            pairing.trips.append(trip)
+        else:
+            orphans.append(trip)
+
+    if section is None and not pairings:
+        return None
+    for trip in orphans:
+        pairing = pairings.get(trip.pairing_id)
+        if pairing is not None:
+            pairing.trips.append(trip)
+    return list(pairings.values())
+
+
+def read_jsonl_stream(stream: IO) -> list[Pairing]:
+    """Parse one :class:`Pairing` per non-blank JSON line."""
+
+    return [Pairing.model_validate_json(line) for line in _text_lines(stream) if line.strip()]
+
+
 def load_jsonl(path: Path) -> list[Pairing]:
     pairings_file = path / "pairings.jsonl"
     if not pairings_file.exists():
@@ -64,4 +174,178 @@ def load_jsonl(path: Path) -> list[Pairing]:
     return pairings
 
 
-__all__ = ["load", "load_csv", "load_jsonl"]
+def dataset_checksums(path: Path) -> dict[str, str]:
+    """SHA-256 of each dataset file present in *path*, by file name."""
+
+    return {name: _sha256(path / name) for name in DATASET_FILES if (path / name).exists()}
+
+
+def write_checksums(path: Path) -> Path:
+    """Write a ``SHA256SUMS`` manifest for the dataset files in *path*."""
+
+    manifest = path / CHECKSUM_FILE
+    lines = [f"{digest}  {name}\n" for name, digest in dataset_checksums(path).items()]
+    manifest.write_text("".join(lines))
+    return manifest
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_checksums(path: Path) -> dict[str, str]:
+    manifest = path / CHECKSUM_FILE
+    if not manifest.exists():
+        raise FileMissingError(manifest)
+    checksums = {}
+    for line in manifest.read_text().splitlines():
+        digest, _, name = line.strip().partition(" ")
+        if digest and name:
+            checksums[name.strip().lstrip("*")] = digest.lower()
+    return checksums
+
+
+def _verify(files: Sequence[Path], checksums: Optional[Mapping[str, str]], path: Path) -> None:
+    if checksums is None:
+        checksums = _read_checksums(path)
+    for file in files:
+        if not file.exists():
+            raise FileMissingError(file)
+        if checksums.get(file.name) != _sha256(file):
+            raise ChecksumMismatchError(file)
+
+
+def _picker(header: list[str], columns: Sequence[str], file: Path) -> Callable[[list[str]], Any]:
+    names = [c.strip().lower() for c in header]
+    missing = [col for col in columns if col not in names]
+    if missing:
+        raise ParserError(f"{file}: missing columns {missing}")
+    return operator.itemgetter(*(names.index(col) for col in columns))
+
+
+def load_records(path: Path, checksums: Optional[Mapping[str, str]] = None) -> list[PairingRecord]:
+    """Trusted-dataset counterpart of :func:`load`, returning records.
+
+    *checksums* maps file names to SHA-256 hex digests; by default they are
+    read from ``SHA256SUMS`` in *path*. A missing or mismatched checksum
+    raises :class:`ChecksumMismatchError` before anything is parsed.
+    """
+
+    if (path / "pairings.csv").exists():
+        return load_csv_records(path, checksums)
+    if (path / "pairings.jsonl").exists():
+        return load_jsonl_records(path, checksums)
+    raise FileMissingError(path)
+
+
+def load_csv_records(
+    path: Path, checksums: Optional[Mapping[str, str]] = None
+) -> list[PairingRecord]:
+    """Read ``pairings.csv`` and ``trips.csv`` without validating rows.
+
+    Malformed values raise plain ``ValueError``/``KeyError``; only use this
+    for data whose checksums you trust.
+    """
+
+    pairings_file = path / "pairings.csv"
+    trips_file = path / "trips.csv"
+    _verify((pairings_file, trips_file), checksums, path)
+
+    codes: dict[str, str] = {}
+    months: dict[str, date] = {}
+    pairings: dict[str, PairingRecord] = {}
+    with pairings_file.open(newline="") as pf:
+        rows = csv.reader(pf)
+        pick = _picker(next(rows, []), PAIRING_COLUMNS, pairings_file)
+        for row in rows:
+            if not row:
+                continue
+            pairing_id, base, fleet, month = pick(row)
+            if month not in months:
+                months[month] = date.fromisoformat(month)
+            pairings[pairing_id] = PairingRecord(
+                pairing_id,
+                codes.setdefault(base, base),
+                codes.setdefault(fleet, fleet),
+                months[month],
+                [],
+            )
+    with trips_file.open(newline="") as tf:
+        rows = csv.reader(tf)
+        pick = _picker(next(rows, []), TRIP_COLUMNS, trips_file)
+        for row in rows:
+            if not row:
+                continue
+            trip_id, pairing_id, day, origin, destination = pick(row)
+            pairing = pairings[pairing_id]
+            pairing.trips.append(
+                TripRecord(
+                    trip_id,
+                    pairing.pairing_id,
+                    int(day),
+                    codes.setdefault(origin, origin),
+                    codes.setdefault(destination, destination),
+                )
+            )
+    return list(pairings.values())
+
+
+def load_jsonl_records(
+    path: Path, checksums: Optional[Mapping[str, str]] = None
+) -> list[PairingRecord]:
+    """Read ``pairings.jsonl`` without validating rows (see :func:`load_csv_records`)."""
+
+    pairings_file = path / "pairings.jsonl"
+    _verify((pairings_file,), checksums, path)
+
+    codes: dict[str, str] = {}
+    months: dict[str, date] = {}
+    pairings: list[PairingRecord] = []
+    with pairings_file.open() as pf:
+        for line in pf:
+            if not line.strip():
+                continue
+            p = json.loads(line)
+            pairing_id = p["pairing_id"]
+            month = p["month"]
+            if month not in months:
+                months[month] = date.fromisoformat(month)
+            trips = [
+                TripRecord(
+                    t["trip_id"],
+                    pairing_id,
+                    t["day"],
+                    codes.setdefault(t["origin"], t["origin"]),
+                    codes.setdefault(t["destination"], t["destination"]),
+                )
+                for t in p.get("trips", ())
+            ]
+            pairings.append(
+                PairingRecord(
+                    pairing_id,
+                    codes.setdefault(p["base"], p["base"]),
+                    codes.setdefault(p["fleet"], p["fleet"]),
+                    months[month],
+                    trips,
+                )
+            )
+    return pairings
+
+
+__all__ = [
+    "CHECKSUM_FILE",
+    "dataset_checksums",
+    "load",
+    "load_csv",
+    "load_csv_records",
+    "load_jsonl",
+    "load_jsonl_records",
+    "load_records",
+    "read_csv_stream",
+    "read_jsonl_stream",
+    "write_checksums",
+]
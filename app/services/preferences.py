@@ -0,0 +1,26 @@
+"""Keyword parsing of free-text bid preferences.
+
+Shared by the ``/parse_preview`` endpoint and the orchestrator's ``parse``
+stage, so both read the same text the same way.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+from app.models import HardConstraints, SoftPrefs
+
+
+def parse_preference_text(text: Any) -> tuple[HardConstraints, SoftPrefs]:
+    """Hard constraints and soft preferences named in ``text``.
+
+    Raises:
+        ValueError: If ``text`` is not a string
+    """
+
+    if not isinstance(text, str):
+        raise ValueError(f"preference text must be a string, not {type(text).__name__}")
+    lowered = text.lower()
+    hard = HardConstraints(no_red_eyes="red-eye" in lowered or "redeye" in lowered)
+    soft = SoftPrefs(weekend_priority={"weight": 0.9} if "weekend" in lowered else {})
+    return hard, soft
@@ -1,163 +1,369 @@
-"""Lightweight storage service for bid packages."""
+"""Lightweight storage service for bid packages.
+
+Uploaded files are stored content-addressed: one blob per distinct SHA-256
+under ``{storage_dir}/blobs/ab/cdef...``, shared by every bid package row
+whose ``hash`` points at it and reference counted in the ``blobs`` table.
+When a whole base uploads the same packet, the file is written once. Parsed
+results are cached per blob (``parse_cache``), so later uploads skip the
+parse too.
+"""
 
 import hashlib
 import json
+import os
+import queue
+import shutil
 import sqlite3
+import threading
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional, Union
 
 from app.models import BidPackage
 
+DEFAULT_POOL_SIZE = 4
+BUSY_TIMEOUT_MS = 5_000
+# SQLite's default limit on bound parameters is 999.
+_IN_CHUNK = 500
+
+# File content to store: bytes, or the path of a spooled upload.
+Content = Union[bytes, Path]
+
+_COLUMNS = "id, pilot_id, airline, month, meta, created_at, hash"
+_INSERT_SQL = f"""
+    INSERT OR REPLACE INTO bid_packages
+    ({_COLUMNS})
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+_GET_SQL = f"SELECT {_COLUMNS} FROM bid_packages WHERE id = ?"
+_LIST_SQL = f"SELECT {_COLUMNS} FROM bid_packages WHERE pilot_id = ? ORDER BY created_at DESC"
+_DELETE_SQL = "DELETE FROM bid_packages WHERE id = ?"
+_HASH_OF_SQL = "SELECT hash FROM bid_packages WHERE id = ?"
+_INCREF_SQL = """
+    INSERT INTO blobs (hash, size, refcount, created_at) VALUES (?, ?, 1, ?)
+    ON CONFLICT(hash) DO UPDATE SET refcount = refcount + 1
+"""
+_DECREF_SQL = "UPDATE blobs SET refcount = refcount - 1 WHERE hash = ?"
+_REFCOUNT_SQL = "SELECT refcount FROM blobs WHERE hash = ?"
+
+
+class _ConnectionPool:
+    """Fixed-size pool of SQLite connections shared across threads.
+
+    Connections are opened lazily up to ``size`` and then reused, so the
+    per-connection statement cache keeps prepared statements warm. Each
+    connection runs with ``synchronous=NORMAL`` and a busy timeout; the
+    database itself is switched to WAL so readers never block the writer.
+    """
+
+    def __init__(self, db_path: str, size: int = DEFAULT_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=64,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection; commits on success, rolls back on error."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                conn = self._idle.get()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+def _size_of(content: Content) -> int:
+    return content.stat().st_size if isinstance(content, Path) else len(content)
+
+
+def _row_to_package(row: Sequence) -> BidPackage:
+    return BidPackage(
+        id=row[0],
+        pilot_id=row[1],
+        airline=row[2],
+        month=row[3],
+        meta=json.loads(row[4]),
+        created_at=datetime.fromisoformat(row[5]),
+        hash=row[6],
+    )
+
 
 class BidPackageStore:
     """File-backed storage for bid packages with SQLite metadata."""
 
-    def __init__(self, storage_dir: str = "uploads", db_path: str = "bid_packages.db"):
+    def __init__(
+        self,
+        storage_dir: str = "uploads",
+        db_path: str = "bid_packages.db",
+        pool_size: int = DEFAULT_POOL_SIZE,
+    ):
         self.storage_dir = Path(storage_dir)
         self.storage_dir.mkdir(exist_ok=True)
+        self.blob_dir = self.storage_dir / "blobs"
         self.db_path = db_path
+        self._pool = _ConnectionPool(db_path, pool_size)
         self._init_db()
 
     def _init_db(self) -> None:
         """Initialize SQLite database with bid_packages table."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS bid_packages (
-                id TEXT PRIMARY KEY,
-                pilot_id TEXT NOT NULL,
-                airline TEXT NOT NULL,
-                month TEXT NOT NULL,
-                meta TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                hash TEXT NOT NULL
-            )
-        """)
+        with self._pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bid_packages (
+                    id TEXT PRIMARY KEY,
+                    pilot_id TEXT NOT NULL,
+                    airline TEXT NOT NULL,
+                    month TEXT NOT NULL,
+                    meta TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    hash TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS ix_bid_packages_pilot_created
+                ON bid_packages (pilot_id, created_at)
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    refcount INTEGER NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(parse_cache)")}
+            if columns and "version" not in columns:
+                # Unversioned entries may hold output of older parsers; it is only a cache.
+                conn.execute("DROP TABLE parse_cache")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS parse_cache (
+                    hash TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (hash, kind, version)
+                )
+            """)
 
-        conn.commit()
-        conn.close()
+    def blob_path(self, digest: str) -> Path:
+        """Location of the blob with SHA-256 ``digest``."""
+        return self.blob_dir / digest[:2] / digest[2:]
 
-    def store(self, bid_package: BidPackage, file_content: bytes) -> str:
-        """Store a bid package and return the ID."""
-        # Generate hash and ID
-        file_hash = hashlib.sha256(file_content).hexdigest()
-        package_id = (
-            f"{bid_package.pilot_id}_{bid_package.airline}_{bid_package.month}_{file_hash[:8]}"
-        )
+    def _put_blob(self, digest: str, content: Content) -> None:
+        """Write a blob; a ``Path`` (a spooled upload) is moved, not copied."""
+        path = self.blob_path(digest)
+        if path.exists():
+            if isinstance(content, Path):
+                content.unlink(missing_ok=True)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        if isinstance(content, Path):
+            # A rename when the spool is on the same filesystem.
+            shutil.move(content, tmp)
+        else:
+            tmp.write_bytes(content)
+        os.replace(tmp, path)
 
-        # Store file
-        file_path = self.storage_dir / f"{package_id}.bin"
-        file_path.write_bytes(file_content)
-
-        # Store metadata in SQLite
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT OR REPLACE INTO bid_packages
-            (id, pilot_id, airline, month, meta, created_at, hash)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """,
-            (
-                package_id,
-                bid_package.pilot_id,
-                bid_package.airline,
-                bid_package.month,
-                json.dumps(bid_package.meta),
-                bid_package.created_at.isoformat(),
-                file_hash,
-            ),
-        )
+    def _release_blob(self, conn: sqlite3.Connection, digest: str) -> bool:
+        """Drop one reference to a blob; True if that was the last one.
 
-        conn.commit()
-        conn.close()
+        The blob's rows are deleted in the caller's transaction; its file is
+        removed by :meth:`_unlink_blobs` once that transaction has committed,
+        so a rollback never leaves a row pointing at a missing file.
+        """
+        conn.execute(_DECREF_SQL, (digest,))
+        row = conn.execute(_REFCOUNT_SQL, (digest,)).fetchone()
+        if row is None or row[0] > 0:
+            return False
+        conn.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+        conn.execute("DELETE FROM parse_cache WHERE hash = ?", (digest,))
+        return True
 
-        return package_id
+    def _unlink_blobs(self, digests: Sequence[str]) -> None:
+        """Remove the files of released blobs that are still unreferenced.
 
-    def get(self, package_id: str) -> Optional[BidPackage]:
-        """Retrieve a bid package by ID."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT id, pilot_id, airline, month, meta, created_at, hash
-            FROM bid_packages WHERE id = ?
-        """,
-            (package_id,),
-        )
+        Runs under the write lock, so no other writer can store the same
+        content again between the check and the unlink.
+        """
+        if not digests:
+            return
+        with self._pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for digest in digests:
+                if conn.execute(_REFCOUNT_SQL, (digest,)).fetchone() is None:
+                    self.blob_path(digest).unlink(missing_ok=True)
 
-        row = cursor.fetchone()
-        conn.close()
+    def store(
+        self, bid_package: BidPackage, file_content: Content, digest: Optional[str] = None
+    ) -> str:
+        """Store a bid package and return the ID.
 
-        if not row:
-            return None
+        ``file_content`` is the file's bytes, or the path of a spooled upload
+        that is moved into the blob store. ``digest`` is the content's SHA-256
+        when the caller already has it (required for paths).
+        """
+        return self.store_many([(bid_package, file_content)], [digest])[0]
 
-        return BidPackage(
-            id=row[0],
-            pilot_id=row[1],
-            airline=row[2],
-            month=row[3],
-            meta=json.loads(row[4]),
-            created_at=datetime.fromisoformat(row[5]),
-            hash=row[6],
-        )
+    def store_many(
+        self,
+        items: Sequence[tuple[BidPackage, Content]],
+        digests: Optional[Sequence[Optional[str]]] = None,
+    ) -> list[str]:
+        """Store several bid packages in one transaction; returns their IDs in order.
 
-    def list_by_pilot(self, pilot_id: str) -> list[BidPackage]:
-        """List all bid packages for a pilot."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT id, pilot_id, airline, month, meta, created_at, hash
-            FROM bid_packages WHERE pilot_id = ? ORDER BY created_at DESC
-        """,
-            (pilot_id,),
-        )
+        Blobs already on disk are not written again. The transaction takes
+        the database write lock up front so reference counts and blob files
+        stay consistent with concurrent deletes, across processes too.
+        """
+        digests = list(digests or [None] * len(items))
+        rows = []
+        for (pkg, content), digest in zip(items, digests):
+            if digest is None and isinstance(content, Path):
+                raise ValueError(f"digest required to store {content}")
+            file_hash = digest or hashlib.sha256(content).hexdigest()
+            package_id = f"{pkg.pilot_id}_{pkg.airline}_{pkg.month}_{file_hash[:8]}"
+            rows.append(
+                (
+                    package_id,
+                    pkg.pilot_id,
+                    pkg.airline,
+                    pkg.month,
+                    json.dumps(pkg.meta),
+                    pkg.created_at.isoformat(),
+                    file_hash,
+                )
+            )
+        if not rows:
+            return []
+
+        now = datetime.now().isoformat()
+        released = []
+        with self._pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for row, (_, content) in zip(rows, items):
+                package_id, file_hash = row[0], row[6]
+                previous = conn.execute(_HASH_OF_SQL, (package_id,)).fetchone()
+                if previous is None or previous[0] != file_hash:
+                    if previous is not None and self._release_blob(conn, previous[0]):
+                        released.append(previous[0])
+                    conn.execute(_INCREF_SQL, (file_hash, _size_of(content), now))
+                    self._put_blob(file_hash, content)
+                elif isinstance(content, Path):
+                    content.unlink(missing_ok=True)
+                conn.execute(_INSERT_SQL, row)
+        self._unlink_blobs(released)
+        return [row[0] for row in rows]
 
-        rows = cursor.fetchall()
-        conn.close()
-
-        return [
-            BidPackage(
-                id=row[0],
-                pilot_id=row[1],
-                airline=row[2],
-                month=row[3],
-                meta=json.loads(row[4]),
-                created_at=datetime.fromisoformat(row[5]),
-                hash=row[6],
+    def get_parsed(self, digest: str, kind: str, version: str) -> Optional[Any]:
+        """Cached parse result for blob ``digest``.
+
+        ``kind`` names the parser and ``version`` its output version; results
+        cached by another version are not returned.
+        """
+        with self._pool.connection() as conn:
+            row = conn.execute(
+                "SELECT data FROM parse_cache WHERE hash = ? AND kind = ? AND version = ?",
+                (digest, kind, version),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_parsed(self, digest: str, kind: str, version: str, data: Any) -> None:
+        """Cache a JSON-serializable parse result for blob ``digest``."""
+        with self._pool.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO parse_cache (hash, kind, version, data) VALUES (?, ?, ?, ?)",
+                (digest, kind, version, json.dumps(data)),
             )
-            for row in rows
-        ]
 
-    def delete(self, package_id: str) -> bool:
-        """Delete a bid package."""
-        # Get package info first
-        package = self.get(package_id)
-        if not package:
-            return False
+    def get(self, package_id: str) -> Optional[BidPackage]:
+        """Retrieve a bid package by ID."""
+        with self._pool.connection() as conn:
+            row = conn.execute(_GET_SQL, (package_id,)).fetchone()
+        return _row_to_package(row) if row else None
 
-        # Delete file
-        file_path = self.storage_dir / f"{package_id}.bin"
-        if file_path.exists():
-            file_path.unlink()
+    def get_many(self, package_ids: Sequence[str]) -> list[Optional[BidPackage]]:
+        """Retrieve several bid packages; ``None`` for unknown IDs, in input order."""
+        found: dict[str, BidPackage] = {}
+        unique = list(dict.fromkeys(package_ids))
+        with self._pool.connection() as conn:
+            for start in range(0, len(unique), _IN_CHUNK):
+                chunk = unique[start : start + _IN_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                for row in conn.execute(
+                    f"SELECT {_COLUMNS} FROM bid_packages WHERE id IN ({marks})", chunk
+                ):
+                    found[row[0]] = _row_to_package(row)
+        return [found.get(pid) for pid in package_ids]
 
-        # Delete from database
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def list_by_pilot(self, pilot_id: str) -> list[BidPackage]:
+        """List all bid packages for a pilot."""
+        with self._pool.connection() as conn:
+            rows = conn.execute(_LIST_SQL, (pilot_id,)).fetchall()
+        return [_row_to_package(row) for row in rows]
 
-        cursor.execute("DELETE FROM bid_packages WHERE id = ?", (package_id,))
-        deleted = cursor.rowcount > 0
+    def delete(self, package_id: str) -> bool:
+        """Delete a bid package, and its blob once no package references it."""
+        with self._pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(_HASH_OF_SQL, (package_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute(_DELETE_SQL, (package_id,))
+            last = self._release_blob(conn, row[0])
+        if last:
+            self._unlink_blobs([row[0]])
 
-        conn.commit()
-        conn.close()
+        # Packages stored before blobs existed kept a per-package file.
+        (self.storage_dir / f"{package_id}.bin").unlink(missing_ok=True)
+        return True
 
-        return deleted
+    def close(self) -> None:
+        """Close pooled connections."""
+        self._pool.close()
 
 
 # Global instance
@@ -1,6 +1,21 @@
+import io
+import shutil
 from pathlib import Path
 
-from app.services.pbs_parser.reader import load_csv, load_jsonl
+import pytest
+
+from app.services.pbs_parser.errors import ChecksumMismatchError, FileMissingError
+from app.services.pbs_parser.reader import (
+    dataset_checksums,
+    load_csv,
+    load_csv_records,
+    load_jsonl,
+    load_jsonl_records,
+    load_records,
+    read_csv_stream,
+    read_jsonl_stream,
+    write_checksums,
+)
 
 GOLDENS = Path("data/goldens")
 
@@ -18,3 +33,58 @@ def test_load_jsonl_golden() -> None:
     pairings = load_jsonl(GOLDENS)
     assert len(pairings) == 1
     assert pairings[0].trips[0].pairing_id == "EWR-73N-001"
+
+
+def test_read_csv_stream_matches_load_csv() -> None:
+    combined = (GOLDENS / "pairings.csv").read_bytes() + (GOLDENS / "trips.csv").read_bytes()
+    assert read_csv_stream(io.BytesIO(combined)) == load_csv(GOLDENS)
+
+
+def test_read_csv_stream_maps_columns_by_header() -> None:
+    data = (
+        b"trip_id,destination,origin,day,pairing_id\r\n"
+        b"T1,EWR,DEN,x,P1\r\n"
+        b"T2,EWR,ORD,2,UNKNOWN\r\n"
+        b"\r\n"
+        b"month,pairing_id,fleet,base\r\n"
+        b"2025-09-01,P1,73N,EWR\r\n"
+        b"2025-09-01,,73N,EWR\r\n"
+    )
+    pairings = read_csv_stream(io.BytesIO(data))
+    assert [p.pairing_id for p in pairings] == ["P1"]
+    assert [(t.trip_id, t.day, t.origin) for t in pairings[0].trips] == [("T1", 1, "DEN")]
+
+
+def test_read_csv_stream_pairings_only_and_unknown() -> None:
+    pairings = read_csv_stream(io.BytesIO(b"pairing_id,base,fleet,month\nP1,EWR,73N,2025-09-01\n"))
+    assert [(p.pairing_id, p.trips) for p in pairings] == [("P1", [])]
+    assert read_csv_stream(io.BytesIO(b"TripID,Days\n1,2\n")) is None
+
+
+def test_read_jsonl_stream_golden() -> None:
+    with (GOLDENS / "pairings.jsonl").open("rb") as f:
+        assert read_jsonl_stream(f) == load_jsonl(GOLDENS)
+
+
+def test_records_match_validated_models() -> None:
+    checksums = dataset_checksums(GOLDENS)
+    csv_records = load_csv_records(GOLDENS, checksums)
+    assert [p.to_model() for p in csv_records] == load_csv(GOLDENS)
+    assert csv_records[0].trips[0].pairing_id is csv_records[0].pairing_id
+    jsonl_records = load_jsonl_records(GOLDENS, checksums)
+    assert [p.to_model() for p in jsonl_records] == load_jsonl(GOLDENS)
+
+
+def test_records_require_matching_checksums(tmp_path: Path) -> None:
+    data = tmp_path / "data"
+    shutil.copytree(GOLDENS, data)
+    with pytest.raises(FileMissingError):
+        load_records(data)
+
+    write_checksums(data)
+    assert [p.pairing_id for p in load_records(data)] == ["EWR-73N-001"]
+
+    with (data / "trips.csv").open("a") as f:
+        f.write("EWR-73N-001-T3,EWR-73N-001,7,ORD,EWR\n")
+    with pytest.raises(ChecksumMismatchError):
+        load_records(data)
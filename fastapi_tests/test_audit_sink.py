@@ -0,0 +1,188 @@
+import json
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.audit import AuditSink, log_event, recover_spool
+from app.db import Audit, AuditSegment, Base
+from app.main import app
+
+
+def _factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'audit.db'}", future=True)
+    Base.metadata.create_all(engine)
+    return engine, sessionmaker(bind=engine, expire_on_commit=False)
+
+
+def _stages(factory, ctx_id):
+    with factory() as db:
+        return [r.stage for r in db.query(Audit).filter_by(ctx_id=ctx_id).order_by(Audit.id)]
+
+
+def _segments(factory):
+    with factory() as db:
+        return db.query(AuditSegment).count()
+
+
+def test_events_are_buffered_and_flushed_in_one_commit(tmp_path):
+    engine, factory = _factory(tmp_path)
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    sink = AuditSink(factory, spool_dir=tmp_path / "spool", flush_interval=60)
+
+    for stage in ("ingest", "validate", "optimize"):
+        sink.emit("c1", stage, {"n": 1})
+    assert _stages(factory, "c1") == []
+    assert len(list((tmp_path / "spool").iterdir())) == 1
+
+    sink.flush()
+    assert _stages(factory, "c1") == ["ingest", "validate", "optimize"]
+    assert len(commits) == 1
+    assert list((tmp_path / "spool").iterdir()) == []
+    sink.close()
+
+
+def test_size_threshold_wakes_the_flusher(tmp_path):
+    _, factory = _factory(tmp_path)
+    sink = AuditSink(factory, spool_dir=None, max_batch=2, flush_interval=60)
+    sink.emit("c1", "a")
+    sink.emit("c1", "b")
+    sink.close()
+    assert _stages(factory, "c1") == ["a", "b"]
+
+
+def test_spool_of_a_dead_process_is_replayed(tmp_path):
+    _, factory = _factory(tmp_path)
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    lines = [
+        json.dumps(
+            {"ctx_id": "c9", "stage": "validate", "payload": {}, "timestamp": "2025-09-01T00:00:00"}
+        ),
+        '{"ctx_id": "c9", "stage": "optim',  # torn by the crash
+    ]
+    # pid 0x7fffffff is never a live process
+    (spool / "audit-2147483647-1-1.jsonl").write_text("\n".join(lines))
+
+    assert recover_spool(spool, factory) == 1
+    assert _stages(factory, "c9") == ["validate"]
+    assert list(spool.iterdir()) == []
+
+
+def test_audit_endpoint_sees_buffered_events():
+    ctx_id = f"audit-sink-{uuid.uuid4().hex}"
+    log_event(ctx_id, "ingest", {"pairings": 3})
+    r = TestClient(app).get(f"/api/audit/{ctx_id}")
+    assert [e["stage"] for e in r.json()["events"]] == ["ingest"]
+
+
+def _recover_in_worker(tmp_path):
+    _, factory = _factory(tmp_path)
+    return recover_spool(tmp_path / "spool", factory)
+
+
+def test_concurrent_recovery_replays_each_file_once(tmp_path):
+    _, factory = _factory(tmp_path)
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    row = {"ctx_id": "c8", "stage": "validate", "payload": {}, "timestamp": "2025-09-01T00:00:00"}
+    for n in range(20):
+        (spool / f"audit-2147483647-1-{n}.jsonl").write_text(json.dumps(row) + "\n")
+    # Claimed by a worker that is still replaying it.
+    live = spool / f"audit-2147483647-2-1.claimed-{os.getppid()}"
+    live.write_text(json.dumps(dict(row, stage="optimize")) + "\n")
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(4, mp_context=ctx) as pool:
+        results = list(pool.map(_recover_in_worker, [tmp_path] * 4))
+
+    assert sum(results) == 20
+    assert _stages(factory, "c8") == ["validate"] * 20
+    assert list(spool.iterdir()) == [live]
+
+
+def test_claims_of_dead_workers_are_taken_over(tmp_path):
+    _, factory = _factory(tmp_path)
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    row = {"ctx_id": "c7", "stage": "export", "payload": {}, "timestamp": "2025-09-01T00:00:00"}
+    (spool / "audit-1-1-1.claimed-2147483647").write_text(json.dumps(row) + "\n")
+
+    assert recover_spool(spool, factory) == 1
+    assert _stages(factory, "c7") == ["export"]
+    assert list(spool.iterdir()) == []
+
+
+def test_a_bad_event_is_dead_lettered_without_blocking_the_rest(tmp_path):
+    _, factory = _factory(tmp_path)
+    spool = tmp_path / "spool"
+    sink = AuditSink(factory, spool_dir=spool, flush_interval=60)
+    sink.emit("c6", "ingest", {"blob": object()})
+    sink.emit("c6", "validate", {"n": 1})
+
+    sink.flush()
+    sink.flush()
+    assert _stages(factory, "c6") == ["validate"]
+    assert sink.pending() == 0
+    assert sink.dropped == 1
+    (dead,) = (spool / "dead").iterdir()
+    assert json.loads(dead.read_text())["stage"] == "ingest"
+    assert [p.name for p in spool.iterdir()] == ["dead"]
+    assert recover_spool(spool, factory) == 0
+    sink.close()
+
+
+def test_a_committed_segment_is_not_replayed(tmp_path):
+    _, factory = _factory(tmp_path)
+    spool = tmp_path / "spool"
+    sink = AuditSink(factory, spool_dir=spool, flush_interval=60)
+    sink.emit("c5", "optimize")
+    (segment,) = spool.iterdir()
+    kept = segment.read_text()
+    sink.flush()
+    # Crash between the commit and the unlink: the file is still there.
+    (spool / segment.name).write_text(kept)
+
+    assert recover_spool(spool, factory) == 0
+    assert _stages(factory, "c5") == ["optimize"]
+    assert [p.name for p in spool.iterdir()] == []
+    assert _segments(factory) == 0
+    sink.close()
+
+
+def test_segment_rows_are_dropped_by_the_next_commit(tmp_path):
+    engine, factory = _factory(tmp_path)
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    sink = AuditSink(factory, spool_dir=tmp_path / "spool", flush_interval=60)
+    for n in range(3):
+        sink.emit("c4", f"stage-{n}")
+        sink.flush()
+        assert _segments(factory) == 1
+    assert _stages(factory, "c4") == ["stage-0", "stage-1", "stage-2"]
+    assert len(commits) == 3
+
+    sink.close()
+    assert _segments(factory) == 0
+
+
+def test_recovery_prunes_segment_rows_of_deleted_files(tmp_path):
+    _, factory = _factory(tmp_path)
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    live = spool / f"audit-{os.getppid()}-1-1.jsonl"
+    live.write_text("")
+    with factory() as db:
+        db.add(AuditSegment(segment="audit-2147483647-1-1", committed_at=datetime(2025, 1, 1)))
+        db.add(AuditSegment(segment=live.stem))
+        db.commit()
+
+    assert recover_spool(spool, factory) == 0
+    with factory() as db:
+        assert [s.segment for s in db.query(AuditSegment)] == [live.stem]
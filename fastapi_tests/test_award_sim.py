@@ -0,0 +1,70 @@
+from app.analytics import simulate_awards
+from app.analytics.award_sim import award_probability
+from app.models import BatchPilot, ContextSnapshot, PreferenceSchema, SoftPrefs
+
+PAIRINGS = {
+    "pairings": [
+        {"id": "HNL1", "layover_city": "HNL", "block_hours": 20, "dates": ["2025-09-01"]},
+        {"id": "HNL2", "layover_city": "HNL", "block_hours": 20, "dates": ["2025-09-01"]},
+        {"id": "OGG", "layover_city": "OGG", "block_hours": 20, "dates": ["2025-09-03"]},
+        {"id": "ORD", "layover_city": "ORD", "block_hours": 20, "dates": ["2025-09-05"]},
+        {
+            "id": "EWR",
+            "layover_city": "EWR",
+            "block_hours": 20,
+            "dates": ["2025-09-07"],
+            "capacity": 3,
+        },
+    ]
+}
+
+
+def _pilot(pid: str, seniority: float, credit_max: float = 40) -> BatchPilot:
+    return BatchPilot(
+        context=ContextSnapshot(
+            ctx_id=f"ctx-{pid}",
+            pilot_id=pid,
+            airline="UAL",
+            base="SFO",
+            seat="FO",
+            equip=["73G"],
+            seniority_percentile=seniority,
+        ),
+        preference_schema=PreferenceSchema(
+            pilot_id=pid,
+            airline="UAL",
+            base="SFO",
+            seat="FO",
+            equip=["73G"],
+            soft_prefs=SoftPrefs(
+                layovers={"prefer": ["HNL", "OGG"], "avoid": ["ORD"], "weight": 1.0},
+                credit={"max": credit_max},
+            ),
+        ),
+    )
+
+
+def test_awards_replay_in_seniority_order():
+    pilots = [_pilot("junior", 0.2), _pilot("senior", 0.9), _pilot("middle", 0.5)]
+    sim = simulate_awards(PAIRINGS, pilots, K=5, workers=1)
+
+    assert sim.order == ["senior", "middle", "junior"]
+    # Both HNL trips fly on the 1st, so a line can only hold one of them.
+    assert sim.awards["senior"] == ["HNL1", "OGG"]
+    assert sim.awards["middle"] == ["HNL2", "EWR"]
+    assert sim.awards["junior"] == ["EWR", "ORD"]
+    assert sim.cutoffs == {"HNL1": 0.9, "OGG": 0.9, "HNL2": 0.5, "ORD": 0.2}
+
+
+def test_award_probabilities_follow_cutoffs():
+    pilots = [_pilot("junior", 0.2), _pilot("senior", 0.9), _pilot("middle", 0.5)]
+    sim = simulate_awards(PAIRINGS, pilots, K=5, workers=1)
+
+    # The senior pilot's own awards are scored against the middle pilot,
+    # the first one turned away from them.
+    assert sim.next_cutoffs["HNL1"] == 0.5
+    assert sim.probabilities["senior"]["HNL1"] == award_probability(0.9, 0.5)
+    assert sim.probabilities["junior"]["OGG"] < 0.01
+    assert sim.probabilities["junior"]["EWR"] == 1.0
+    assert sim.probabilities["middle"]["HNL2"] > sim.probabilities["junior"]["HNL2"]
+    assert award_probability(0.6, 0.5) > award_probability(0.5, 0.5) > award_probability(0.4, 0.5)
@@ -0,0 +1,145 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import (
+    BatchPilot,
+    ContextSnapshot,
+    FeatureBundle,
+    PreferenceSchema,
+    SoftPrefs,
+)
+from app.services.batch import _WORKER, _init_worker, _SharedColumns, optimize_batch
+from app.services.optimizer import select_topk
+from app.services.pairing_frame import PairingFrame
+
+client = TestClient(app)
+
+PAIRINGS = {
+    "pairings": [
+        {"id": f"P{i}", "layover_city": city, "block_hours": 3.0 + i % 4, "rest_hours": 12}
+        for i, city in enumerate(["SFO", "LAX", "ORD", "SEA", "DEN", "LAX", "SFO", "BOS"])
+    ]
+}
+ANALYTICS = {"base_stats": {"SFO": {"award_rate": 0.8}, "LAX": {"award_rate": 0.3}}}
+
+
+def _pilot(n: int, prefer: list[str]) -> BatchPilot:
+    pid = f"p{n}"
+    return BatchPilot(
+        context=ContextSnapshot(
+            ctx_id=f"batch-{n}",
+            pilot_id=pid,
+            airline="UAL",
+            base="SFO",
+            seat="FO",
+            equip=["73G"],
+            seniority_percentile=n / 10,
+        ),
+        preference_schema=PreferenceSchema(
+            pilot_id=pid,
+            airline="UAL",
+            base="SFO",
+            seat="FO",
+            equip=["73G"],
+            soft_prefs=SoftPrefs(layovers={"prefer": prefer, "weight": 1.0}),
+        ),
+    )
+
+
+PILOTS = [_pilot(1, ["LAX"]), _pilot(2, ["BOS", "SEA"]), _pilot(3, []), _pilot(4, ["ORD"])]
+
+
+def _expected(pilot: BatchPilot, k: int):
+    bundle = FeatureBundle(
+        context=pilot.context,
+        preference_schema=pilot.preference_schema,
+        analytics_features=ANALYTICS,
+        compliance_flags={},
+        pairing_features=PAIRINGS,
+    )
+    return [c.model_dump() for c in select_topk(bundle, k)]
+
+
+def test_batch_matches_per_pilot_select_topk_in_process_pool():
+    results = list(
+        optimize_batch(PAIRINGS, PILOTS, K=3, analytics_features=ANALYTICS, workers=2, chunk_size=1)
+    )
+    assert [r.pilot_id for r in results] == ["p1", "p2", "p3", "p4"]
+    for pilot, res in zip(PILOTS, results):
+        assert [c.model_dump() for c in res.candidates] == _expected(pilot, 3)
+
+
+def test_batch_endpoint_streams_one_line_per_pilot():
+    resp = client.post(
+        "/api/optimize/batch",
+        json={
+            "pairing_features": PAIRINGS,
+            "analytics_features": ANALYTICS,
+            "pilots": [p.model_dump() for p in PILOTS[:2]],
+            "K": 2,
+        },
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [line["ctx_id"] for line in lines] == ["batch-1", "batch-2"]
+    assert lines[0]["candidates"] == _expected(PILOTS[0], 2)
+
+
+def test_batch_endpoint_rejects_bad_pilot():
+    resp = client.post(
+        "/api/optimize/batch", json={"pairing_features": PAIRINGS, "pilots": [{"context": {}}]}
+    )
+    assert resp.status_code == 400
+
+
+def test_workers_attach_to_ids_and_records_in_shared_memory():
+    frame = PairingFrame(PAIRINGS["pairings"])
+    shared = _SharedColumns(frame)
+    vocab = {
+        name: getattr(frame, name) for name in ("city_vocab", "equip_vocab", "day_vocab", "month")
+    }
+    try:
+        _init_worker(shared.spec, vocab, ANALYTICS, 3)
+        attached = _WORKER["frame"]
+        assert list(attached.ids) == frame.ids
+        assert list(attached.records) == PAIRINGS["pairings"]
+        assert attached.rest_hours.tolist() == frame.rest_hours.tolist()
+    finally:
+        for shm in _WORKER.get("blocks", []):
+            shm.close()
+        _WORKER.clear()
+        shared.close()
+
+
+def test_batch_endpoint_rejects_bad_input_before_streaming():
+    pilots = [p.model_dump() for p in PILOTS[:1]]
+    resp = client.post(
+        "/api/optimize/batch",
+        json={"pairing_features": {"pairing_set_id": "nope"}, "pilots": pilots},
+    )
+    assert resp.status_code == 404
+    resp = client.post(
+        "/api/optimize/batch",
+        json={"pairing_features": PAIRINGS, "analytics_features": [1], "pilots": pilots},
+    )
+    assert resp.status_code == 400
+    resp = client.post(
+        "/api/optimize/batch",
+        json={
+            "pairing_features": {"pairings": [{"id": "X", "rest_hours": "n/a"}]},
+            "pilots": pilots,
+        },
+    )
+    assert resp.status_code == 400
+
+
+def test_interleaved_inline_batches_keep_their_own_packet():
+    other = {"pairings": [{"id": "B1", "layover_city": "BOS", "block_hours": 4, "rest_hours": 12}]}
+    first = optimize_batch(PAIRINGS, PILOTS[:2], K=3, analytics_features=ANALYTICS, persist=False)
+    second = optimize_batch(other, PILOTS[:1], K=3, persist=False)
+    assert next(first).pilot_id == "p1"
+    assert [c.pairings for c in next(second).candidates] == [["B1"]]
+    assert [c.model_dump() for c in next(first).candidates] == _expected(PILOTS[1], 3)
@@ -0,0 +1,110 @@
+from datetime import date
+
+from app.models import ContextSnapshot, FeatureBundle, PreferenceSchema, SoftPrefs
+from app.opt.beam import search
+from app.services.pairing_frame import PairingFrame, day_mask
+
+
+def _bundle(pairings, *, days_off=(), credit=None) -> FeatureBundle:
+    ctx = ContextSnapshot(
+        ctx_id="beam",
+        pilot_id="p1",
+        airline="UAL",
+        base="EWR",
+        seat="FO",
+        equip=["73N"],
+        seniority_percentile=0.5,
+        default_weights={"layovers": 1.0, "block_hours": 1.0},
+    )
+    prefs = PreferenceSchema(
+        pilot_id="p1",
+        airline="UAL",
+        base="EWR",
+        seat="FO",
+        equip=["73N"],
+        soft_prefs=SoftPrefs(layovers={"prefer": ["SAN"], "weight": 1.0}, credit=credit),
+    )
+    prefs.hard_constraints.days_off = list(days_off)
+    return FeatureBundle(
+        context=ctx,
+        preference_schema=prefs,
+        analytics_features={},
+        compliance_flags={},
+        pairing_features={"pairings": pairings},
+    )
+
+
+def _pairing(pid, start, length, city="DEN", block=15.0):
+    return {
+        "id": pid,
+        "layover_city": city,
+        "rest_hours": 12,
+        "block_hours": block,
+        "dates": [f"2025-09-{d:02d}" for d in range(start, start + length)],
+    }
+
+
+PAIRINGS = [
+    _pairing("A", 1, 3, city="SAN"),
+    _pairing("B", 2, 3),  # overlaps A
+    _pairing("C", 5, 4, city="SAN"),
+    _pairing("D", 10, 2),
+    _pairing("E", 11, 3),  # overlaps D
+    _pairing("F", 20, 4, city="SAN"),
+]
+
+
+def test_search_builds_non_overlapping_multi_pairing_schedules():
+    topk = search(_bundle(PAIRINGS), k=3, time_budget_ms=1000)
+
+    assert topk
+    best = topk[0]
+    assert set(best.pairings) == {"A", "C", "D", "F"}
+    assert len({tuple(sorted(c.pairings)) for c in topk}) == len(topk)
+    by_id = {p["id"]: p for p in PAIRINGS}
+    for cand in topk:
+        assert len(cand.pairings) > 1
+        days = [d for pid in cand.pairings for d in by_id[pid]["dates"]]
+        assert len(days) == len(set(days))
+    assert [c.score for c in topk] == sorted((c.score for c in topk), reverse=True)
+
+
+def test_search_respects_days_off_and_credit_window():
+    bundle = _bundle(PAIRINGS, days_off=["2025-09-05"], credit={"min": 20, "max": 40})
+    topk = search(bundle, k=5, time_budget_ms=1000)
+
+    for cand in topk:
+        assert "C" not in cand.pairings
+        assert len(cand.pairings) * 15.0 <= 40
+
+
+def test_search_is_anytime_under_zero_budget():
+    topk = search(_bundle(PAIRINGS), k=2, time_budget_ms=0)
+
+    assert topk
+    assert all(c.pairings for c in topk)
+
+
+def test_pairings_off_the_months_calendar_are_never_scheduled():
+    undated = {"id": "U1", "layover_city": "SAN", "rest_hours": 12, "block_hours": 15.0}
+    early = _pairing("X", 25, 2, city="SAN")
+    early["dates"] = ["2025-08-25", "2025-08-26"]
+    topk = search(
+        _bundle([*PAIRINGS, undated, dict(undated, id="U2"), early]), k=5, time_budget_ms=1000
+    )
+
+    assert topk
+    for cand in topk:
+        assert not {"U1", "U2", "X"} & set(cand.pairings)
+
+
+def test_next_month_dates_do_not_share_this_months_days():
+    late = _pairing("L", 30, 1)
+    late["dates"] = ["2025-09-30", "2025-10-01", "2025-10-02"]
+    frame = PairingFrame([_pairing("A", 1, 3), late])
+    assert frame.month == date(2025, 9, 1)
+    assert frame.day_masks[0] & frame.day_masks[1] == 0
+    assert day_mask(["2025-10-01"], frame.month) == 1 << 31
+
+    best = search(_bundle([_pairing("A", 1, 3), late]), k=1, time_budget_ms=1000)[0]
+    assert set(best.pairings) == {"A", "L"}
@@ -0,0 +1,128 @@
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+
+import pytest
+
+from app.models import BidPackage
+from app.services.store import BidPackageStore
+
+
+def _store(tmp_path) -> BidPackageStore:
+    return BidPackageStore(str(tmp_path / "uploads"), str(tmp_path / "packages.db"))
+
+
+def _pkg(pilot: str, month: str) -> BidPackage:
+    return BidPackage(
+        pilot_id=pilot, airline="UAL", month=month, created_at=datetime(2025, int(month[-2:]), 1)
+    )
+
+
+def test_database_uses_wal_and_pilot_index(tmp_path):
+    store = _store(tmp_path)
+    conn = sqlite3.connect(store.db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    indexes = {r[1] for r in conn.execute("PRAGMA index_list(bid_packages)")}
+    assert "ix_bid_packages_pilot_created" in indexes
+    conn.close()
+    store.close()
+
+
+def test_store_many_get_many_and_delete(tmp_path):
+    store = _store(tmp_path)
+    ids = store.store_many(
+        [
+            (_pkg("p1", "2025-08"), b"aug"),
+            (_pkg("p1", "2025-09"), b"sep"),
+            (_pkg("p2", "2025-09"), b"x"),
+        ]
+    )
+
+    got = store.get_many([ids[2], "missing", ids[0]])
+    assert [p.id if p else None for p in got] == [ids[2], None, ids[0]]
+    assert [p.month for p in store.list_by_pilot("p1")] == ["2025-09", "2025-08"]
+    assert store.blob_path(got[2].hash).read_bytes() == b"aug"
+
+    assert store.delete(ids[0]) is True
+    assert store.delete(ids[0]) is False
+    assert store.get(ids[0]) is None
+    assert not store.blob_path(got[2].hash).exists()
+    store.close()
+
+
+def test_concurrent_stores_share_the_pool(tmp_path):
+    store = _store(tmp_path)
+    errors = []
+
+    def upload(n: int) -> None:
+        try:
+            for i in range(20):
+                store.store(_pkg(f"p{n}", "2025-09"), f"{n}-{i}".encode())
+        except Exception as e:  # pragma: no cover - surfaced below
+            errors.append(e)
+
+    threads = [threading.Thread(target=upload, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert sum(len(store.list_by_pilot(f"p{n}")) for n in range(8)) == 160
+    assert store._pool._opened <= store._pool.size
+    store.close()
+
+
+def test_identical_uploads_share_one_refcounted_blob(tmp_path):
+    store = _store(tmp_path)
+    ids = [store.store(_pkg(f"p{n}", "2025-09"), b"same packet") for n in range(3)]
+    digest = store.get(ids[0]).hash
+    blob = store.blob_path(digest)
+
+    assert blob.read_bytes() == b"same packet"
+    assert len(list(store.blob_dir.rglob("*"))) == 2  # one shard dir, one blob
+    assert not list(store.storage_dir.glob("*.bin"))
+
+    store.put_parsed(digest, ".csv", "1", {"format": "generic", "items": []})
+    store.delete(ids[0])
+    store.delete(ids[1])
+    assert blob.exists()
+    assert store.get_parsed(digest, ".csv", "1") is not None
+    assert store.get_parsed(digest, ".csv", "2") is None
+
+    store.delete(ids[2])
+    assert not blob.exists()
+    assert store.get_parsed(digest, ".csv", "1") is None
+    store.close()
+
+
+def test_reupload_of_the_same_package_keeps_one_reference(tmp_path):
+    store = _store(tmp_path)
+    pid = store.store(_pkg("p1", "2025-09"), b"packet")
+    assert store.store(_pkg("p1", "2025-09"), b"packet") == pid
+    assert store.delete(pid) is True
+    assert not store.blob_path(hashlib.sha256(b"packet").hexdigest()).exists()
+    store.close()
+
+
+def test_rolled_back_delete_keeps_the_blob(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    pid = store.store(_pkg("p1", "2025-09"), b"packet")
+    blob = store.blob_path(store.get(pid).hash)
+    release = store._release_blob
+
+    def release_then_fail(conn, digest):
+        release(conn, digest)
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(store, "_release_blob", release_then_fail)
+    with pytest.raises(sqlite3.OperationalError):
+        store.delete(pid)
+    assert store.get(pid) is not None
+    assert blob.read_bytes() == b"packet"
+
+    monkeypatch.undo()
+    assert store.delete(pid) is True
+    assert not blob.exists()
+    store.close()
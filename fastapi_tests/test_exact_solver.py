@@ -0,0 +1,88 @@
+import itertools
+import random
+
+import pytest
+
+from app.opt.beam import _prepare, search
+from app.opt.exact import solve
+from fastapi_tests.test_beam_search import PAIRINGS, _bundle, _pairing
+
+
+def _random_pairings(seed: int, n: int):
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        out.append(
+            _pairing(
+                f"R{i}",
+                rng.randint(1, 27),
+                rng.randint(1, 4),
+                city=rng.choice(["SAN", "DEN", "ORD"]),
+                block=rng.choice([8.0, 12.0, 18.0]),
+            )
+        )
+    return out
+
+
+def _brute_force(bundle) -> float:
+    plan, _frame, _bd, pool = _prepare(bundle)
+    credit_min, credit_max = plan.credit_window
+    best = -float("inf")
+    for r in range(1, len(pool) + 1):
+        for combo in itertools.combinations(range(len(pool)), r):
+            mask, credit, score = 0, 0.0, 0.0
+            ok = True
+            for pos in combo:
+                if pool.masks[pos] & mask:
+                    ok = False
+                    break
+                mask |= pool.masks[pos]
+                credit += pool.credits[pos]
+                score += pool.scores[pos]
+            if ok and credit_min <= credit <= credit_max:
+                best = max(best, score)
+    return best
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_solve_matches_brute_force(seed):
+    bundle = _bundle(_random_pairings(seed, 12), credit={"min": 20, "max": 60})
+    result = solve(bundle)
+
+    assert result.optimal
+    assert result.gap == 0.0
+    assert result.schedule.score == pytest.approx(_brute_force(bundle))
+
+
+def test_solve_dominates_beam_search():
+    bundle = _bundle(_random_pairings(9, 40))
+    exact = solve(bundle)
+    beam = search(bundle, k=1, time_budget_ms=1000, beam_width=2, branch_factor=2)
+
+    assert exact.optimal
+    assert exact.schedule.score >= beam[0].score - 1e-9
+    assert len(exact.schedule.pairings) > 1
+
+
+def test_solve_reports_gap_when_node_limit_hit():
+    result = solve(_bundle(_random_pairings(4, 60)), max_nodes=5)
+
+    assert not result.optimal
+    assert result.nodes >= 5
+    assert result.schedule is not None
+    assert result.upper_bound >= result.schedule.score
+    assert result.gap >= 0.0
+
+
+def test_solve_small_packet():
+    result = solve(_bundle(PAIRINGS))
+
+    assert result.optimal
+    assert set(result.schedule.pairings) == {"A", "C", "D", "F"}
+
+
+def test_solve_reports_gap_when_time_budget_spent():
+    result = solve(_bundle(_random_pairings(5, 60)), time_budget_ms=0)
+
+    assert not result.optimal
+    assert result.upper_bound >= result.schedule.score
@@ -0,0 +1,146 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import ContextSnapshot, FeatureBundle, HardConstraints, PreferenceSchema
+from app.rules import cache
+from app.rules.cache import BaseFeasibility, FeasibilityCache
+from app.rules.engine import _PAIRING_CACHE, DEFAULT_RULES, validate_feasibility
+from app.services import pairing_repo
+from app.services.pairing_repo import UnknownPairingSet, pairing_repository
+
+PAIRINGS = [
+    {"id": "P1", "rest_hours": 9, "redeye": False},
+    {"id": "P2", "rest_hours": 12, "redeye": True},
+    {"id": "P3", "rest_hours": 12, "redeye": False},
+]
+
+
+def _bundle(pilot_id: str, no_red: bool, pairings: list[dict]) -> FeatureBundle:
+    return FeatureBundle(
+        context=ContextSnapshot(
+            ctx_id=f"ctx-{pilot_id}",
+            pilot_id=pilot_id,
+            airline="UAL",
+            base="EWR",
+            seat="FO",
+            equip=["73G"],
+            seniority_percentile=0.5,
+        ),
+        preference_schema=PreferenceSchema(
+            pilot_id=pilot_id,
+            airline="UAL",
+            base="EWR",
+            seat="FO",
+            equip=["73G"],
+            hard_constraints=HardConstraints(no_red_eyes=no_red),
+        ),
+        analytics_features={},
+        compliance_flags={},
+        pairing_features={"pairings": [dict(p) for p in pairings]},
+    )
+
+
+def _entry(n: int) -> BaseFeasibility:
+    return BaseFeasibility((), tuple({"id": str(i)} for i in range(n)), np.zeros(n, dtype=bool))
+
+
+def _set_bundle(pilot_id: str, no_red: bool, pairings: list[dict]) -> FeatureBundle:
+    bundle = _bundle(pilot_id, no_red, [])
+    bundle.pairing_features = {"pairing_set_id": pairing_repository.put(pairings).set_id}
+    return bundle
+
+
+def test_pilots_share_the_packet_entry_and_apply_their_own_filters():
+    _PAIRING_CACHE.clear()
+    before = _PAIRING_CACHE.stats()
+
+    strict = validate_feasibility(_set_bundle("p1", True, PAIRINGS), DEFAULT_RULES)
+    relaxed = validate_feasibility(_set_bundle("p2", False, PAIRINGS), DEFAULT_RULES)
+
+    stats = _PAIRING_CACHE.stats()
+    assert stats["entries"] == 1
+    assert stats["misses"] - before["misses"] == 1
+    assert stats["hits"] - before["hits"] == 1
+    assert [p["id"] for p in strict["feasible_pairings"]] == ["P3"]
+    assert strict["violations"] == [
+        {"pairing_id": "P1", "rule": "FAR117_MIN_REST"},
+        {"pairing_id": "P2", "rule": "NO_REDEYE_IF_SET"},
+    ]
+    assert [p["id"] for p in relaxed["feasible_pairings"]] == ["P2", "P3"]
+
+
+def test_pilots_with_other_contexts_share_the_entry():
+    _PAIRING_CACHE.clear()
+    first = _set_bundle("p1", False, PAIRINGS)
+    other = _set_bundle("p2", False, PAIRINGS)
+    other.context = other.context.model_copy(
+        update={"airline": "XX", "base": "SFO", "equip": ["789"]}
+    )
+
+    validate_feasibility(first, DEFAULT_RULES)
+    validate_feasibility(other, DEFAULT_RULES)
+
+    assert _PAIRING_CACHE.stats()["entries"] == 1
+    assert _PAIRING_CACHE.get(cache.cached_set_id(first)) is not None
+
+
+def test_changed_content_misses():
+    _PAIRING_CACHE.clear()
+    validate_feasibility(_set_bundle("p1", False, PAIRINGS), DEFAULT_RULES)
+    changed = [dict(PAIRINGS[0], rest_hours=11), *PAIRINGS[1:]]
+    result = validate_feasibility(_set_bundle("p1", False, changed), DEFAULT_RULES)
+    assert result["violations"] == []
+    assert _PAIRING_CACHE.stats()["entries"] == 2
+
+
+def test_inline_pairings_are_checked_without_hashing_or_caching(monkeypatch):
+    _PAIRING_CACHE.clear()
+    monkeypatch.setattr(pairing_repo, "pairing_fingerprint", lambda ps: pytest.fail("hashed"))
+    strict = validate_feasibility(_bundle("p1", True, PAIRINGS), DEFAULT_RULES)
+    assert [p["id"] for p in strict["feasible_pairings"]] == ["P3"]
+    assert cache.cached_set_id(_bundle("p1", False, PAIRINGS)) is None
+    assert _PAIRING_CACHE.stats()["entries"] == 0
+
+
+def test_client_supplied_keys_are_ignored():
+    _PAIRING_CACHE.clear()
+    first = _set_bundle("p1", False, PAIRINGS)
+    validate_feasibility(first, DEFAULT_RULES)
+
+    other = _bundle("p2", False, [dict(p, rest_hours=8) for p in PAIRINGS])
+    other.pairing_features["fingerprint"] = cache.cached_set_id(first)
+    result = validate_feasibility(other, DEFAULT_RULES)
+    assert result["feasible_pairings"] == []
+
+    missing = _bundle("p3", False, PAIRINGS)
+    missing.pairing_features["pairing_set_id"] = "notissued"
+    with pytest.raises(UnknownPairingSet):
+        validate_feasibility(missing, DEFAULT_RULES)
+
+
+def test_repository_sets_are_keyed_by_set_id():
+    pset = pairing_repository.put(PAIRINGS)
+    bundle = _bundle("p1", False, [])
+    bundle.pairing_features = {"pairing_set_id": pset.set_id}
+    assert cache.cached_set_id(bundle) == pset.set_id
+
+
+def test_lru_evicts_by_entries_and_size():
+    cache = FeasibilityCache(max_entries=2, max_pairings=10)
+    cache.put("a", _entry(3))
+    cache.put("b", _entry(3))
+    cache.get_or_compute("a", lambda: _entry(0))  # refresh "a"
+    cache.put("c", _entry(3))
+    assert cache.get("b") is None and cache.get("a") is not None
+
+    cache.put("d", _entry(9))
+    assert len(cache) == 1 and cache.get("d") is not None
+    assert cache.stats()["evictions"] == 3
+
+
+def test_metrics_expose_cache_counters():
+    r = TestClient(app).get("/metrics")
+    assert "vectorbid_feasibility_cache_hits_total" in r.text
+    assert "vectorbid_feasibility_cache_evictions_total" in r.text
@@ -0,0 +1,123 @@
+import hashlib
+import io
+import os
+import time
+import uuid
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import IngestionRequest
+from app.services.ingest_jobs import IngestJobManager, _init_parse_worker
+from app.services.store import bid_package_store
+
+client = TestClient(app)
+
+COMBINED_CSV = (
+    b"pairing_id,base,fleet,month\n"
+    b"EWR-73N-901,EWR,73N,2025-09-01\n"
+    b"trip_id,pairing_id,day,origin,destination\n"
+    b"EWR-73N-901-T1,EWR-73N-901,5,DEN,EWR\n"
+    b"EWR-73N-901-T2,EWR-73N-901,3,LAX,EWR\n"
+)
+FORM = {
+    "airline": "UAL",
+    "month": "2025-09",
+    "base": "EWR",
+    "fleet": "73N",
+    "seat": "FO",
+    "pilot_id": "pilot_jobs",
+}
+
+
+def _request() -> IngestionRequest:
+    return IngestionRequest(**FORM)
+
+
+def test_ingest_without_wait_returns_a_job_to_poll():
+    resp = client.post(
+        "/api/ingest?wait=false",
+        files={"file": ("jobs.csv", io.BytesIO(COMBINED_CSV), "text/csv")},
+        data=FORM,
+    )
+    assert resp.status_code == 202
+    job = resp.json()
+    assert job["size"] == len(COMBINED_CSV)
+    assert job["sha256"] == hashlib.sha256(COMBINED_CSV).hexdigest()
+
+    deadline = time.monotonic() + 30
+    while job["status"] in ("queued", "running") and time.monotonic() < deadline:
+        time.sleep(0.05)
+        job = client.get(f"/api/ingest/{job['job_id']}").json()
+    assert job["status"] == "done"
+    assert job["result"]["job_id"] == job["job_id"]
+    assert job["result"]["summary"]["trips"] == 2
+    assert bid_package_store.get(job["result"]["summary"]["package_id"]) is not None
+
+
+def test_waiting_ingest_reports_its_job():
+    resp = client.post(
+        "/api/ingest",
+        files={"file": ("jobs.csv", io.BytesIO(COMBINED_CSV), "text/csv")},
+        data=FORM,
+    )
+    assert resp.status_code == 200
+    job = client.get(f"/api/ingest/{resp.json()['job_id']}").json()
+    assert job["status"] == "done"
+
+
+def test_unknown_job_is_404():
+    assert client.get("/api/ingest/nope").status_code == 404
+
+
+def test_spooled_upload_is_moved_into_the_blob_store(tmp_path):
+    jobs = IngestJobManager(spool_dir=tmp_path, parse_workers=0)
+    content = COMBINED_CSV + b"# moved\n"
+    upload = jobs.spool_sync(io.BytesIO(content))
+    assert upload.path.read_bytes() == content
+
+    job = jobs.submit(upload, "moved.csv", _request())
+    response = jobs.result(job.job_id, timeout=10)
+    jobs.close()
+
+    assert response.success
+    assert os.listdir(tmp_path) == []
+    assert bid_package_store.blob_path(upload.sha256).read_bytes() == content
+    assert jobs.get(job.job_id).status == "done"
+
+
+def test_parse_runs_in_a_process_pool(tmp_path):
+    jobs = IngestJobManager(spool_dir=tmp_path, parse_workers=1)
+    # Unique per run, so the parse is never served from the store's parse cache.
+    content = COMBINED_CSV.replace(b"901", b"902") + f"# {uuid.uuid4().hex}\n".encode()
+    upload = jobs.spool_sync(io.BytesIO(content))
+    job = jobs.submit(upload, "pool.csv", _request())
+    try:
+        response = jobs.result(job.job_id, timeout=60)
+        assert jobs._parser is not None
+    finally:
+        jobs.close()
+    assert response.success
+    assert response.summary["pairings"] == 1
+    assert response.summary["trips"] == 2
+
+
+def test_old_finished_jobs_are_forgotten(tmp_path):
+    jobs = IngestJobManager(spool_dir=tmp_path, parse_workers=0, max_jobs=2)
+    ids = []
+    for i in range(4):
+        upload = jobs.spool_sync(io.BytesIO(COMBINED_CSV + f"# {i}\n".encode()))
+        ids.append(jobs.submit(upload, "f.csv", _request()).job_id)
+        jobs.result(ids[-1], timeout=10)
+    jobs.close()
+    assert jobs.get(ids[0]) is None
+    assert jobs.get(ids[-1]) is not None
+
+
+def test_parse_workers_cap_pdf_extraction(monkeypatch):
+    monkeypatch.delenv("PDF_EXTRACT_WORKERS", raising=False)
+    _init_parse_worker(3)
+    assert os.environ["PDF_EXTRACT_WORKERS"] == "3"
+    monkeypatch.setenv("PDF_EXTRACT_WORKERS", "2")
+    _init_parse_worker(3)
+    assert os.environ["PDF_EXTRACT_WORKERS"] == "2"
@@ -1,10 +1,14 @@
 """Tests for the ingestion route."""
 
+import hashlib
 import io
 
 from fastapi.testclient import TestClient
 
 from app.main import app
+from app.services.ingestion import PARSER_VERSION
+from app.services.pairing_repo import pairing_repository
+from app.services.store import bid_package_store
 
 client = TestClient(app)
 
@@ -85,8 +89,8 @@ EWR-73N-001,EWR,73N,2025-09-01"""
         assert result["success"] is True
         assert "summary" in result
 
-    def test_ingest_pdf_success(self):
-        """Test successful PDF ingestion."""
+    def test_ingest_unreadable_pdf_fails(self):
+        """An unreadable PDF is reported, not replaced by mock trips."""
         pdf_content = b"%PDF-1.4\n%Mock PDF content"
 
         files = {"file": ("test.pdf", io.BytesIO(pdf_content), "application/pdf")}
@@ -101,10 +105,10 @@ EWR-73N-001,EWR,73N,2025-09-01"""
 
         response = client.post("/api/ingest", files=files, data=data)
 
-        assert response.status_code == 200
-        result = response.json()
-        assert result["success"] is True
-        assert "summary" in result
+        assert response.status_code == 400
+        assert "test.pdf" in response.json()["detail"]
+        digest = hashlib.sha256(pdf_content).hexdigest()
+        assert bid_package_store.get_parsed(digest, ".pdf", PARSER_VERSION) is None
 
     def test_ingest_missing_file(self):
         """Test ingestion with missing file."""
@@ -228,3 +232,99 @@ EWR-73N-001,EWR,73N,2025-09-01"""
         assert result["summary"]["pairings"] == 1
         assert "EWR" in result["summary"]["bases"]
         assert result["summary"]["fleet"] == "73N"
+
+
+def test_identical_uploads_reuse_the_cached_parse(monkeypatch):
+    from app.services.ingest_jobs import ingest_jobs
+    from app.services.ingestion import ingestion_service
+
+    csv_content = b"pairing_id,base,fleet,month\nEWR-73N-777,EWR,73N,2025-09-01\n"
+    data = {
+        "airline": "UAL",
+        "month": "2025-09",
+        "base": "EWR",
+        "fleet": "73N",
+        "seat": "FO",
+    }
+    first = client.post(
+        "/api/ingest",
+        files={"file": ("a.csv", io.BytesIO(csv_content), "text/csv")},
+        data={**data, "pilot_id": "pilot_a"},
+    )
+    assert first.status_code == 200
+
+    def _no_parse(*args, **kwargs):
+        raise AssertionError("identical upload should not be parsed again")
+
+    # Parse on the job thread so the patched parser is the one that would run.
+    monkeypatch.setattr(ingest_jobs, "parse_workers", 0)
+    monkeypatch.setitem(ingestion_service.supported_formats, ".csv", _no_parse)
+    second = client.post(
+        "/api/ingest",
+        files={"file": ("b.csv", io.BytesIO(csv_content), "text/csv")},
+        data={**data, "pilot_id": "pilot_b"},
+    )
+    assert second.status_code == 200
+    summaries = [{**r.json()["summary"], "package_id": None} for r in (first, second)]
+    assert summaries[0] == summaries[1]
+
+
+def test_cached_parse_is_served_without_rebuilding_the_models(monkeypatch):
+    from app.models import IngestionRequest
+    from app.services.ingestion import ingestion_service
+    from app.services.pbs_parser.contracts import Pairing
+
+    content = b"pairing_id,base,fleet,month\nEWR-73N-778,EWR,73N,2025-09-01\n"
+    request = IngestionRequest(
+        airline="UAL", month="2025-09", base="EWR", fleet="73N", seat="FO", pilot_id="p"
+    )
+    first = ingestion_service.ingest(content, "a.csv", request)
+
+    def _no_validate(*args, **kwargs):
+        raise AssertionError("a cache hit should not rebuild Pairing models")
+
+    monkeypatch.setattr(Pairing, "model_validate", _no_validate)
+    monkeypatch.setitem(ingestion_service.supported_formats, ".csv", _no_validate)
+    second = ingestion_service.ingest(content, "b.csv", request.model_copy(update={"fleet": "73G"}))
+    assert second.success
+    assert second.summary["fleet"] == "73G"
+    assert second.summary["bases"] == first.summary["bases"] == ["EWR"]
+    assert second.summary["pairing_set_id"] == first.summary["pairing_set_id"]
+
+
+def test_placeholder_parses_are_not_cached_or_registered():
+    from app.models import IngestionRequest
+    from app.services.ingestion import ingestion_service
+
+    content = b"placeholder packet"
+    response = ingestion_service.ingest(
+        content,
+        "packet.txt",
+        IngestionRequest(
+            airline="UAL", month="2025-09", base="EWR", fleet="737", seat="FO", pilot_id="p"
+        ),
+    )
+    assert response.success
+    assert "pairing_set_id" not in response.summary
+    digest = hashlib.sha256(content).hexdigest()
+    assert bid_package_store.get_parsed(digest, ".txt", PARSER_VERSION) is None
+
+
+def test_pdf_packets_are_parsed_into_trips():
+    from app.models import IngestionRequest
+    from app.services.ingestion import ingestion_service
+
+    with open("bids/202508.pdf", "rb") as f:
+        response = ingestion_service.ingest(
+            f.read(),
+            "202508.pdf",
+            IngestionRequest(
+                airline="UAL", month="2024-12", base="IAH", fleet="737", seat="FO", pilot_id="p"
+            ),
+        )
+    assert response.success
+    assert response.summary["trips"] == 999
+    assert response.summary["format"] == "generic"
+    pset = pairing_repository.get(response.summary["pairing_set_id"])
+    assert pset.pairings[0]["id"] == "H5001"
+    assert pset.pairings[0]["route"] == "IAH-ORD-IAH"
@@ -80,3 +80,132 @@ def test_weight_and_seniority_adjustment():
 
     expected = (0.7 * (2 / 3) + 1.0 * (1 / 3)) * 1.1
     assert topk[0].score == pytest.approx(expected)
+
+
+def _reference_topk(bundle, k):
+    """Per-pairing scalar scorer used as the reference for the vectorized path."""
+    from app.services.optimizer import ScoringPlan, _score_pairing
+
+    plan = ScoringPlan.from_bundle(bundle)
+    items = []
+    for i, p in enumerate(bundle.pairing_features["pairings"]):
+        breakdown = _score_pairing(plan, p)
+        items.append((sum(breakdown.values()) * plan.seniority_factor, -i, p["id"], breakdown))
+    items.sort(key=lambda t: (t[0], t[1]), reverse=True)
+    return items[:k]
+
+
+def test_vectorized_scores_match_scalar_helpers():
+    import random
+
+    rng = random.Random(7)
+    cities = ["A", "B", "C", None]
+    pairings = []
+    for i in range(300):
+        pairings.append(
+            {
+                "id": f"P{i}",
+                "layover_city": rng.choice(cities),
+                "rest_hours": rng.choice([8, 10.5, 14, 30, None]),
+                "duty_hours": rng.choice([0, 6.5, 12, 18]),
+                "block_hours": rng.choice([0, 4.2, 25, 120]),
+                "report_time": rng.choice(["0615", "13:45", "", "bad"]),
+                "is_commutable": rng.choice([True, False, None]),
+                "trip_length": rng.choice([0, 1, 2, 3, 4]),
+                "equipment": rng.choice(["7M8", "73G", None]),
+                "dates": rng.sample(["09-01", "09-02", "09-03", "09-04"], rng.randint(0, 2)),
+            }
+        )
+    # duplicate scores to exercise tie-breaking at the K boundary
+    pairings.extend(dict(p, id=f"{p['id']}-dup") for p in pairings[:50])
+
+    bundle = _build_bundle()
+    bundle.pairing_features = {"pairings": pairings}
+    bundle.preference_schema.hard_constraints.days_off = ["09-02"]
+    bundle.preference_schema.soft_prefs.pairing_length = {"prefer": [3], "avoid": [1]}
+    bundle.context.default_weights = {
+        "award_rate": 1.0,
+        "layovers": 1.0,
+        "days_off": 0.5,
+        "block_hours": 0.3,
+        "duty_hours": 0.3,
+        "layover_quality": 0.2,
+        "report_time": 0.2,
+        "commutability": 0.4,
+        "trip_length": 0.6,
+        "equipment": 0.5,
+    }
+
+    for k in (1, 17, 60, 400):
+        expected = _reference_topk(bundle, k)
+        got = select_topk(bundle, k)
+        assert [c.candidate_id for c in got] == [e[2] for e in expected]
+        assert [c.score for c in got] == [e[0] for e in expected]
+        assert [c.soft_breakdown for c in got] == [e[3] for e in expected]
+
+
+def test_scoring_plan_freezes_preferences():
+    from app.services.optimizer import ScoringPlan
+
+    bundle = _build_bundle()
+    bundle.preference_schema.hard_constraints.days_off = ["09-02"]
+    bundle.preference_schema.hard_constraints.no_red_eyes = True
+    plan = ScoringPlan.from_bundle(bundle)
+
+    assert plan.layover_prefer == frozenset({"B"})
+    assert plan.days_off == frozenset({"09-02"})
+    assert plan.scored_days_off == frozenset()
+    assert plan.equip == frozenset({"7M8"})
+    assert plan.no_red_eyes is True
+    assert plan.award_rate("A") == 0.8
+    assert plan.award_rate("ZZZ") == 0.5
+    assert plan.seniority_factor == pytest.approx(1.0)
+    assert sum(plan.weights.values()) == pytest.approx(1.0)
+
+
+def test_days_off_score_matches_the_legacy_scorer():
+    # The pre-vectorization scorer read the days_off list through _to_dict,
+    # so a list never contributed; select_topk must keep producing that.
+    bundle = _build_bundle()
+    bundle.pairing_features = {
+        "pairings": [
+            {"id": "A_id", "layover_city": "A", "dates": ["09-01"]},
+            {"id": "B_id", "layover_city": "B", "dates": ["09-02"]},
+        ]
+    }
+    bundle.context.default_weights = {"layovers": 1.0, "days_off": 1.0}
+    before = [c.model_dump() for c in select_topk(bundle, 2)]
+
+    bundle.preference_schema.hard_constraints.days_off = ["09-02"]
+    after = select_topk(bundle, 2)
+    assert [c.model_dump() for c in after] == before
+    assert all(c.soft_breakdown["days_off"] == 0.0 for c in after)
+
+
+def test_optimizer_v2_tolerates_loosely_typed_preferences():
+    from app.services import optimizer_v2
+    from app.services.optimizer import ScoringPlan
+
+    bundle = {
+        "context": {"seniority_percentile": "high", "default_weights": {"layovers": 1.0}},
+        "preference_schema": {
+            "soft_prefs": {
+                "layovers": {"prefer": ["SAN", {"city": "DEN"}], "weight": "heavy"},
+                "pairing_length": {"weight": "n/a"},
+                "credit": {"min": "lots"},
+            },
+            "hard_constraints": {"days_off": [{"day": 5}]},
+        },
+        "pairing_features": {
+            "pairings": [
+                {"id": "P1", "layover_city": "DEN"},
+                {"id": "P2", "layover_city": "SAN"},
+            ]
+        },
+    }
+    with pytest.raises((TypeError, ValueError)):
+        ScoringPlan.from_bundle(bundle)
+
+    ranked = optimizer_v2.select_topk(bundle, top_k=2)
+    assert [r.candidate_id for r in ranked] == ["P2", "P1"]
+    assert ranked[0].rationale == "+layovers(SAN)"
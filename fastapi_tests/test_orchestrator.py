@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import pytest
+
+from app.models import ContextSnapshot
+from app.orchestrator import Stage, compile_inputs, run_stages
+from app.orchestrator.run import critical_path
+
+
+def _ctx() -> ContextSnapshot:
+    return ContextSnapshot(
+        ctx_id="orch-1",
+        pilot_id="p1",
+        airline="UAL",
+        base="SFO",
+        seat="FO",
+        equip=["73G"],
+        seniority_percentile=0.4,
+        default_weights={"award_rate": 1.0},
+    )
+
+
+def test_compile_inputs_builds_bundle_with_stage_timings():
+    pairings = {
+        "pairings": [
+            {"id": "P1", "rest_hours": 12, "redeye": True},
+            {"id": "P2", "rest_hours": 8},
+            {"id": "P3", "rest_hours": 14},
+        ]
+    }
+    out = asyncio.run(
+        compile_inputs(_ctx(), "No red-eyes please", {"layovers": 0.7}, pairings=pairings)
+    )
+
+    bundle = out.bundle
+    assert bundle.preference_schema.hard_constraints.no_red_eyes is True
+    assert bundle.context.default_weights == {"award_rate": 1.0, "layovers": 0.7}
+    rules = {v["pairing_id"]: v["rule"] for v in bundle.compliance_flags["violations"]}
+    assert rules == {"P1": "NO_REDEYE_IF_SET", "P2": "FAR117_MIN_REST"}
+    assert set(out.timings) == {"parse", "enrich", "analytics", "precheck", "fuse"}
+    assert out.timings["precheck"].start_ms >= out.timings["parse"].end_ms
+    assert out.critical_path[-1] == "fuse"
+    assert out.critical_path[0] in {"parse", "enrich", "analytics"}
+
+
+def test_blocking_stages_run_concurrently_and_slowest_is_critical():
+    stages = [
+        Stage("fast", lambda: time.sleep(0.05) or 1),
+        Stage("slow", lambda: time.sleep(0.3) or 2),
+        Stage("join", lambda fast, slow: fast + slow, ("fast", "slow")),
+    ]
+    start = time.perf_counter()
+    results, timings = asyncio.run(run_stages(stages))
+    assert time.perf_counter() - start < 0.5
+    assert results["join"] == 3
+    assert critical_path(stages, timings) == ["slow", "join"]
+
+
+def test_stage_timeout_cancels_siblings():
+    cancelled = []
+
+    async def sibling():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def stuck():
+        await asyncio.sleep(5)
+
+    stages = [Stage("sibling", sibling), Stage("stuck", stuck, timeout=0.05)]
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run_stages(stages))
+    assert cancelled == [True]
+
+
+def test_unknown_dependency_rejected():
+    with pytest.raises(ValueError):
+        asyncio.run(run_stages([Stage("a", lambda b: b, ("b",))]))
+
+
+def test_parse_stage_matches_parse_preview():
+    from app.api.routes import parse_preview
+    from app.orchestrator.run import _parse_preferences
+
+    text = "Weekends off, no redeyes"
+    schema = _parse_preferences(_ctx(), text, {})
+    preview = parse_preview({"text": text})["preference_schema"]
+    assert schema.hard_constraints.model_dump() == preview["hard_constraints"]
+    assert schema.soft_prefs.model_dump() == preview["soft_prefs"]
+    assert schema.pilot_id == "p1"
+
+
+def test_unparseable_text_fails_the_parse_stage():
+    with pytest.raises(ValueError, match="preference text"):
+        asyncio.run(compile_inputs(_ctx(), None, {}))
@@ -0,0 +1,137 @@
+import numpy as np
+
+from app.models import CandidateSchedule, IngestionRequest
+from app.parsers.ual_pdf import TripBlock
+from app.rules import engine
+from app.services.candidate_store import candidate_store
+from app.services.ingestion import ingestion_service
+from app.services.pairing_repo import PairingDelta, pairing_repository
+from app.services.store import bid_package_store
+
+REQUEST = dict(airline="UAL", month="2024-12", base="IAH", fleet="737", seat="FO", pilot_id="p")
+
+
+def _packet_pdf(text: str) -> bytes:
+    import pymupdf
+
+    doc = pymupdf.open()
+    page = doc.new_page(width=1000, height=1400)
+    page.insert_text((20, 20), text, fontname="cour", fontsize=9)
+    return doc.tobytes()
+
+
+def _packets() -> tuple[bytes, bytes]:
+    with open("tests/fixtures/bid_packages/202508_first.txt", encoding="utf-8") as fh:
+        lines = fh.read().splitlines()[:80]
+    original = "\n".join(lines)
+    # H5002 gets a new credit; H5005's block is dropped.
+    start = next(i for i, line in enumerate(lines) if "ID H5005" in line)
+    revised = "\n".join(lines[:start] + lines[start + 7 :]).replace("CRD- 7.36*", "CRD- 8.36*")
+    return _packet_pdf(original), _packet_pdf(revised)
+
+
+def test_revised_packet_reparses_only_changed_blocks(monkeypatch):
+    original, revised = _packets()
+    first = ingestion_service.ingest(original, "rev0.pdf", IngestionRequest(**REQUEST))
+    old_id = first.summary["pairing_set_id"]
+
+    parsed = []
+    parse = TripBlock.parse
+    monkeypatch.setattr(bid_package_store, "get_parsed", lambda *args: None)
+    monkeypatch.setattr(TripBlock, "parse", lambda block: parsed.append(block) or parse(block))
+    second = ingestion_service.ingest(
+        revised, "rev1.pdf", IngestionRequest(**REQUEST, revises=old_id)
+    )
+
+    assert second.success
+    assert second.summary["delta"] == {
+        "revises": old_id,
+        "exact": True,
+        "added": 0,
+        "removed": 1,
+        "changed": 1,
+    }
+    assert [b.match.group("id") for b in parsed] == ["H5002"]
+    trips = {p["id"]: p for p in pairing_repository.get(second.summary["pairing_set_id"]).pairings}
+    assert "H5005" not in trips
+    assert trips["H5002"]["credit_hours"] == 8.36
+    assert trips["H5001"] == next(
+        p for p in pairing_repository.get(old_id).pairings if p["id"] == "H5001"
+    )
+
+
+def test_revising_an_unknown_set_fails():
+    original, _ = _packets()
+    response = ingestion_service.ingest(
+        original, "rev.pdf", IngestionRequest(**REQUEST, revises="missing")
+    )
+    assert not response.success
+    assert "missing" in response.error
+
+
+def _pairings(rest_b: float) -> list[dict]:
+    return [
+        {"id": "A", "rest_hours": 12, "redeye": True},
+        {"id": "B", "rest_hours": rest_b},
+        {"id": "C", "rest_hours": 8},
+        {"id": "D", "rest_hours": 11},
+    ]
+
+
+def test_delta_lists_added_removed_and_changed():
+    old = pairing_repository.put(_pairings(12))
+    new = pairing_repository.put(_pairings(9)[:3] + [{"id": "E", "rest_hours": 14}])
+    delta = PairingDelta.between(old, new)
+    assert [p["id"] for p in delta.added] == ["E"]
+    assert delta.removed == ("D",)
+    assert [p["id"] for p in delta.changed] == ["B"]
+    assert delta.affected_ids == {"B", "D"}
+
+
+def test_feasibility_cache_follows_a_revision():
+    old = pairing_repository.put(_pairings(12) + [{"id": "X", "rest_hours": 20}])
+    new = pairing_repository.put(_pairings(9) + [{"id": "Y", "redeye": True}])
+    engine._PAIRING_CACHE.put(old.set_id, engine._base_feasibility(old.pairings))
+
+    pairing_repository.revise(old.set_id, new)
+
+    patched = engine._PAIRING_CACHE.get(new.set_id)
+    full = engine._base_feasibility(new.pairings)
+    assert patched.violations == full.violations
+    assert patched.feasible_pairings == full.feasible_pairings
+    assert np.array_equal(patched.redeye, full.redeye)
+
+
+def test_candidates_touching_changed_pairings_are_dropped():
+    old = pairing_repository.put(_pairings(12) + [{"id": "Z", "rest_hours": 13}])
+    new = pairing_repository.put(_pairings(9) + [{"id": "Z", "rest_hours": 13}])
+
+    def cand(cid: str, pairings: list[str]) -> CandidateSchedule:
+        return CandidateSchedule(
+            candidate_id=cid, score=1.0, hard_ok=True, soft_breakdown={}, pairings=pairings
+        )
+
+    candidate_store.put(cand("rev-uses-b", ["A", "B"]), old.set_id)
+    candidate_store.put(cand("rev-keeps", ["A", "Z"]), old.set_id)
+
+    pairing_repository.revise(old.set_id, new)
+
+    assert candidate_store.get("rev-uses-b") is None
+    assert candidate_store.get("rev-keeps") is not None
+    assert candidate_store.set_of("rev-keeps") == new.set_id
+
+
+def test_unmatchable_sets_give_an_inexact_delta_without_counts():
+    old = pairing_repository.put(_pairings(12) + [{"id": "Z"}])
+    new = pairing_repository.put(_pairings(9) + [{"id": "A", "rest_hours": 1}])  # "A" twice
+    delta = PairingDelta.between(old, new)
+    assert not delta.exact
+    assert (delta.added, delta.removed, delta.changed) == ((), (), ())
+    assert delta.summary() == {
+        "revises": old.set_id,
+        "exact": False,
+        "added": None,
+        "removed": None,
+        "changed": None,
+    }
+    assert PairingDelta.between(old, old).summary()["exact"] is True
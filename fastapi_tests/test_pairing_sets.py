@@ -0,0 +1,130 @@
+import io
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.pairing_repo import PairingRepository, pairing_frame_for, pairing_repository
+
+client = TestClient(app)
+
+PAIRINGS = [
+    {"id": "P1", "layover_city": "SAN", "rest_hours": 12, "dates": ["2025-09-01"]},
+    {"id": "P2", "layover_city": "SJU", "rest_hours": 9, "dates": ["2025-09-02"]},
+    {"id": "P3", "layover_city": "ORD", "rest_hours": 11, "dates": ["2025-09-03"]},
+]
+
+
+def _bundle(pairing_features: dict) -> dict:
+    return {
+        "context": {
+            "ctx_id": "ctx-sets",
+            "pilot_id": "p1",
+            "airline": "UAL",
+            "base": "SFO",
+            "seat": "FO",
+            "equip": ["73G"],
+            "seniority_percentile": 0.5,
+        },
+        "preference_schema": {
+            "pilot_id": "p1",
+            "airline": "UAL",
+            "base": "SFO",
+            "seat": "FO",
+            "equip": ["73G"],
+            "soft_prefs": {"layovers": {"prefer": ["SAN"], "weight": 1.0}},
+        },
+        "analytics_features": {},
+        "compliance_flags": {},
+        "pairing_features": pairing_features,
+    }
+
+
+def test_optimize_by_pairing_set_id_matches_inline():
+    r = client.post("/api/pairing_sets", json={"pairings": PAIRINGS, "base": "SFO"})
+    assert r.status_code == 200
+    set_id = r.json()["pairing_set_id"]
+    assert r.json()["count"] == 3
+
+    inline = client.post(
+        "/api/optimize", json={"feature_bundle": _bundle({"pairings": PAIRINGS}), "K": 3}
+    )
+    by_id = client.post(
+        "/api/optimize", json={"feature_bundle": _bundle({"pairing_set_id": set_id}), "K": 3}
+    )
+    assert by_id.status_code == 200
+    assert by_id.json() == inline.json()
+    assert client.get(f"/api/pairing_sets/{set_id}").json()["base"] == "SFO"
+
+
+def test_unknown_pairing_set_is_404():
+    r = client.post(
+        "/api/optimize", json={"feature_bundle": _bundle({"pairing_set_id": "nope"}), "K": 3}
+    )
+    assert r.status_code == 404
+    assert client.get("/api/pairing_sets/nope").status_code == 404
+
+
+def test_frame_is_built_once_per_set():
+    pset = pairing_repository.put(PAIRINGS)
+    features = {"pairing_set_id": pset.set_id}
+    assert pairing_frame_for(features) is pairing_frame_for(features)
+
+
+def test_repository_is_bounded_and_tracks_latest_per_packet_key():
+    repo = PairingRepository(max_sets=2)
+    a = repo.put(PAIRINGS[:1], "UAL", "2025-09", "SFO", "73G", packet_hash="a")
+    repo.put(PAIRINGS[:2], "UAL", "2025-09", "EWR", "73G", packet_hash="b")
+    assert repo.latest("UAL", "2025-09", "SFO", "73G") is a
+    repo.put(PAIRINGS, "UAL", "2025-09", "SFO", "73G", packet_hash="c")
+    assert len(repo) == 2
+    assert repo.latest("UAL", "2025-09", "SFO", "73G").set_id == "c"
+
+
+def test_ingest_registers_the_packet():
+    csv_content = b"pairing_id,base,fleet,month\nSFO-73G-900,SFO,73G,2025-09-01\n"
+    r = client.post(
+        "/api/ingest",
+        files={"file": ("packet.csv", io.BytesIO(csv_content), "text/csv")},
+        data={
+            "airline": "UAL",
+            "month": "2025-09",
+            "base": "SFO",
+            "fleet": "73G",
+            "seat": "FO",
+            "pilot_id": "pilot_sets",
+        },
+    )
+    set_id = r.json()["summary"]["pairing_set_id"]
+    latest = pairing_repository.latest("UAL", "2025-09", "SFO", "73G")
+    assert pairing_repository.get(set_id) is latest
+
+
+def test_other_workers_open_the_snapshot(tmp_path):
+    writer = PairingRepository(snapshot_dir=tmp_path)
+    pairings = [dict(p, block=f"b{i}") for i, p in enumerate(PAIRINGS)]
+    pset = writer.put(pairings, airline="UAL", base="SFO")
+    writer.save_snapshot(pset)
+
+    reader = PairingRepository(snapshot_dir=tmp_path)
+    opened = reader.get(pset.set_id)
+    assert opened.key == pset.key
+    assert list(opened.frame.ids) == ["P1", "P2", "P3"]
+    assert not opened.frame.rest_hours.flags.writeable
+    assert list(opened.pairings) == pairings
+    assert reader.latest("UAL", "", "SFO", "") is opened
+
+
+def test_registering_a_set_requires_the_api_key(monkeypatch):
+    monkeypatch.delenv("JWT_SECRET", raising=False)
+    monkeypatch.setenv("VECTORBID_API_KEY", "secret")
+    body = {"pairings": PAIRINGS}
+    assert client.post("/api/pairing_sets", json=body).status_code == 401
+    r = client.post("/api/pairing_sets", json=body, headers={"x-api-key": "secret"})
+    assert r.status_code == 200
+
+
+def test_saving_prunes_the_snapshot_dir(tmp_path):
+    repo = PairingRepository(snapshot_dir=tmp_path, snapshot_max_bytes=1)
+    first = repo.save_snapshot(repo.put(PAIRINGS[:1]))
+    second = repo.save_snapshot(repo.put(PAIRINGS[:2]))
+    assert second.exists() and not first.exists()
@@ -0,0 +1,118 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from app.models import FeatureBundle
+from app.services.optimizer import ScoringPlan, _score_frame, _score_pairing, _topk_candidates
+from app.services.pairing_frame import PairingFrame
+from app.services.pairing_snapshot import (
+    SnapshotFormatError,
+    open_snapshot,
+    prune_snapshots,
+    snapshot_path,
+    write_snapshot,
+)
+
+PAIRINGS = [
+    {
+        "id": "A1",
+        "layover_city": "SAN",
+        "rest_hours": 12,
+        "duty_time": 9.5,
+        "credit_hours": 18.2,
+        "report_time": "05:45",
+        "days": 3,
+        "is_commutable": True,
+        "equipment": "73G",
+        "dates": ["2025-09-01", "2025-09-02", "2025-09-03"],
+        "route": "SFO-SAN-SFO",
+        "block": "9f3c",
+    },
+    {"id": "B2", "layover_city": "ORD", "redeye": True, "equip": "320", "duty_days": [4, 5]},
+    {"id": "Ç3", "rest_hours": 8, "block_hours": 40, "report_time": "bad", "trip_length": 1},
+    {"id": "D4"},
+]
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = write_snapshot(
+        PairingFrame(PAIRINGS), tmp_path / "set.vbps", ("UAL", "2025-09", "SFO", "73G")
+    )
+    return open_snapshot(path)
+
+
+def test_columns_round_trip_without_copies(snapshot):
+    frame = PairingFrame(PAIRINGS)
+    for name in PairingFrame.ARRAY_FIELDS:
+        stored = getattr(snapshot.frame, name)
+        assert stored.dtype == getattr(frame, name).dtype
+        np.testing.assert_array_equal(stored, getattr(frame, name))
+        assert not stored.flags.owndata
+    for name in ("city_vocab", "equip_vocab", "day_vocab"):
+        assert getattr(snapshot.frame, name) == getattr(frame, name)
+    assert list(snapshot.frame.ids) == ["A1", "B2", "Ç3", "D4"]
+    assert snapshot.key == ("UAL", "2025-09", "SFO", "73G")
+
+
+def test_records_score_like_the_source(snapshot):
+    bundle = FeatureBundle(
+        context={
+            "ctx_id": "c",
+            "pilot_id": "p",
+            "airline": "UAL",
+            "base": "SFO",
+            "seat": "FO",
+            "equip": ["73G"],
+            "seniority_percentile": 0.5,
+        },
+        preference_schema={
+            "pilot_id": "p",
+            "airline": "UAL",
+            "base": "SFO",
+            "seat": "FO",
+            "equip": ["73G"],
+            "hard_constraints": {"days_off": ["2025-09-02"], "no_red_eyes": True},
+            "soft_prefs": {"layovers": {"prefer": ["SAN"], "weight": 1.0}},
+        },
+        analytics_features={},
+        compliance_flags={},
+        pairing_features={"pairings": PAIRINGS},
+    )
+    plan = ScoringPlan.from_bundle(bundle)
+    assert [_score_pairing(plan, r) for r in snapshot.records] == [
+        _score_pairing(plan, p) for p in PAIRINGS
+    ]
+    np.testing.assert_array_equal(
+        _score_frame(plan, snapshot.frame), _score_frame(plan, PairingFrame(PAIRINGS))
+    )
+    assert [c.model_dump() for c in _topk_candidates(plan, snapshot.frame, 4)] == [
+        c.model_dump() for c in _topk_candidates(plan, PairingFrame(PAIRINGS), 4)
+    ]
+    assert list(snapshot.records) == PAIRINGS
+    assert snapshot.records[-1] == {"id": "D4"}
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not.vbps"
+    path.write_bytes(b"x" * 64)
+    with pytest.raises(SnapshotFormatError):
+        open_snapshot(path)
+
+
+def test_prune_drops_expired_then_least_recently_used(tmp_path):
+    frame = PairingFrame(PAIRINGS)
+    paths = [write_snapshot(frame, snapshot_path(tmp_path, f"s{i}")) for i in range(4)]
+    size = paths[0].stat().st_size
+    now = time.time()
+    for age, path in zip((30 * 86400, 300, 200, 100), paths):
+        os.utime(path, (now - age, now - age))
+    (tmp_path / "stale.part").write_bytes(b"x")
+    os.utime(tmp_path / "stale.part", (now - 7200, now - 7200))
+
+    removed = prune_snapshots(tmp_path, max_bytes=2 * size, max_age=3600, keep=paths[1])
+
+    assert sorted(removed) == sorted([paths[0], paths[2], tmp_path / "stale.part"])
+    assert paths[1].exists() and paths[3].exists()
@@ -0,0 +1,140 @@
+import threading
+import uuid
+
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base, Candidate, Pilot, Preference, SessionLocal, persistence
+from app.db.writer import PersistenceQueue
+from app.models import ContextSnapshot, FeatureBundle, PreferenceSchema
+from app.services.optimizer import select_topk
+
+
+def _factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'q.db'}", future=True)
+    Base.metadata.create_all(engine)
+    return engine, sessionmaker(bind=engine, expire_on_commit=False)
+
+
+def _count(factory, model) -> int:
+    with factory() as db:
+        return db.scalar(select(func.count()).select_from(model))
+
+
+def test_rows_are_written_in_one_transaction_per_flush(tmp_path):
+    engine, factory = _factory(tmp_path)
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    q = PersistenceQueue(factory, flush_interval=0.2)
+
+    q.merge(Pilot, pilot_id="p1")
+    q.merge(Pilot, pilot_id="p1")
+    for i in range(50):
+        q.add(Preference, ctx_id=f"c{i}", pilot_id="p1", data={"i": i})
+    assert q.flush(timeout=5)
+
+    assert _count(factory, Pilot) == 1
+    assert _count(factory, Preference) == 50
+    assert len(commits) == 1
+    q.close()
+
+
+def test_merge_skips_existing_rows_and_close_drains(tmp_path):
+    _, factory = _factory(tmp_path)
+    q = PersistenceQueue(factory)
+    q.merge(Pilot, pilot_id="p1")
+    q.flush(timeout=5)
+    q.merge(Pilot, pilot_id="p1")
+    q.merge(Pilot, pilot_id="p2")
+    q.close(timeout=5)
+
+    assert _count(factory, Pilot) == 2
+    assert q.failed == 0
+
+
+def test_full_queue_writes_inline(tmp_path):
+    _, factory = _factory(tmp_path)
+    gate = threading.Event()
+
+    def slow_factory():
+        # Stall only the writer thread so the queue stays full.
+        if threading.current_thread().name == "persistence-writer":
+            gate.wait(5)
+        return factory()
+
+    q = PersistenceQueue(slow_factory, maxsize=1, flush_interval=0, put_timeout=0.01)
+    for i in range(5):
+        q.add(Preference, ctx_id=f"c{i}", pilot_id=None, data={})
+    assert q.inline_writes > 0
+    gate.set()
+    q.close(timeout=5)
+    assert _count(factory, Preference) == 5
+
+
+def test_select_topk_queues_candidate_rows():
+    ctx = ContextSnapshot(
+        ctx_id=f"persist-queue-{uuid.uuid4().hex}",
+        pilot_id="p1",
+        airline="UAL",
+        base="SFO",
+        seat="FO",
+        equip=["73G"],
+        seniority_percentile=0.5,
+    )
+    bundle = FeatureBundle(
+        context=ctx,
+        preference_schema=PreferenceSchema(
+            pilot_id="p1", airline="UAL", base="SFO", seat="FO", equip=["73G"]
+        ),
+        analytics_features={},
+        compliance_flags={},
+        pairing_features={"pairings": [{"id": "A", "layover_city": "SAN"}]},
+    )
+    select_topk(bundle, K=1)
+    assert persistence.flush(timeout=5)
+
+    with SessionLocal() as db:
+        rows = db.query(Candidate).filter_by(ctx_id=ctx.ctx_id).all()
+    assert [r.data["candidate_id"] for r in rows] == ["A"]
+
+
+def test_a_failing_row_does_not_drop_its_batch(tmp_path):
+    _, factory = _factory(tmp_path)
+    q = PersistenceQueue(factory, flush_interval=0.2)
+    q.add(Pilot, pilot_id="p1")
+    for i in range(3):
+        q.add(Preference, ctx_id=f"c{i}", pilot_id="p1", data={"i": i})
+    q.add(Pilot, pilot_id="p1")  # primary-key clash fails the batch
+    q.merge(Pilot, pilot_id="p2")
+    q.close(timeout=5)
+
+    assert _count(factory, Pilot) == 2
+    assert _count(factory, Preference) == 3
+    assert (q.written, q.failed) == (5, 1)
+
+
+def test_batch_optimize_queues_candidate_rows():
+    from app.models import BatchPilot
+    from app.services.batch import optimize_batch
+
+    ctx = ContextSnapshot(
+        ctx_id=f"persist-batch-{uuid.uuid4().hex}",
+        pilot_id="p1",
+        airline="UAL",
+        base="SFO",
+        seat="FO",
+        equip=["73G"],
+        seniority_percentile=0.5,
+    )
+    pilot = BatchPilot(
+        context=ctx,
+        preference_schema=PreferenceSchema(
+            pilot_id="p1", airline="UAL", base="SFO", seat="FO", equip=["73G"]
+        ),
+    )
+    list(optimize_batch({"pairings": [{"id": "A", "layover_city": "SAN"}]}, [pilot], K=1))
+    assert persistence.flush(timeout=5)
+
+    with SessionLocal() as db:
+        rows = db.query(Candidate).filter_by(ctx_id=ctx.ctx_id).all()
+    assert [r.data["candidate_id"] for r in rows] == ["A"]
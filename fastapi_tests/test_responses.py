@@ -0,0 +1,70 @@
+import json
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.api.responses import dumps
+from app.main import app
+from app.models import CandidateSchedule
+
+client = TestClient(app)
+
+
+def _candidate(score: float, note: str = "") -> CandidateSchedule:
+    return CandidateSchedule(
+        candidate_id="C1",
+        score=score,
+        hard_ok=True,
+        soft_breakdown={"layovers": score / 3, "award_rate": 1e16},
+        pairings=["P1", "P2"],
+        rationale={"notes": [note] if note else []},
+    )
+
+
+def _standard(content) -> bytes:
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+@pytest.mark.parametrize(
+    "score, note",
+    [
+        (0.75, ""),
+        (2.5e-7, ""),
+        (1e-05, ""),
+        (0.00012, "rest 1e5 hours"),
+        (0.5, 'quoted ":1e-05," and back\\slash'),
+        (3.0, "title-14 part-117"),
+    ],
+)
+def test_dumps_matches_standard_encoding(score, note):
+    cand = _candidate(score, note)
+    assert dumps({"candidates": [cand]}) == _standard({"candidates": [cand.model_dump()]})
+
+
+def test_dumps_handles_plain_values():
+    content = {"a": [1, 2.0, None, True], "é": "ü", "n": -1e-300, "big": 1.5e300}
+    assert dumps(content) == _standard(content)
+
+
+def test_non_finite_floats():
+    with pytest.raises(ValueError):
+        dumps({"score": float("nan")})
+    body = json.loads(dumps({"candidate": _candidate(float("nan"))}))
+    assert body["candidate"]["score"] is None
+
+
+def test_optimize_response_bytes_match_model_dump():
+    from fastapi_tests.test_candidate_rationale import _bundle
+
+    r = client.post("/api/optimize", json={"feature_bundle": _bundle(), "K": 3})
+    assert r.status_code == 200
+    cands = [CandidateSchedule(**c) for c in r.json()["candidates"]]
+    assert r.content == _standard({"candidates": [c.model_dump() for c in cands]})
+
+    r = client.post(
+        "/api/optimize/retune", json={"candidates": json.loads(r.content)["candidates"]}
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/json"
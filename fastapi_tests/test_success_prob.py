@@ -0,0 +1,139 @@
+import time
+
+import numpy as np
+import pytest
+
+from app.analytics import (
+    AwardHistory,
+    AwardHistoryStore,
+    estimate_layer_probs,
+    estimate_success_prob,
+)
+from app.models import ContextSnapshot
+
+PAIRINGS = [
+    {
+        "id": "A",
+        "layover_city": "HNL",
+        "trip_length": 4,
+        "block_hours": 22,
+        "dates": ["2025-09-01"],
+    },
+    {
+        "id": "B",
+        "layover_city": "HNL",
+        "trip_length": 3,
+        "block_hours": 18,
+        "dates": ["2025-09-10"],
+    },
+    {
+        "id": "C",
+        "layover_city": "ORD",
+        "trip_length": 2,
+        "block_hours": 10,
+        "dates": ["2025-09-12"],
+    },
+    {"id": "D", "layover_city": "EWR", "trip_length": 1, "block_hours": 6, "report_time": "0530"},
+]
+CUTOFFS = {"A": 0.9, "B": 0.6}
+
+
+def _ctx(seniority: float) -> ContextSnapshot:
+    return ContextSnapshot(
+        ctx_id="c1",
+        pilot_id="p1",
+        airline="UAL",
+        base="SFO",
+        seat="FO",
+        equip=["73G"],
+        seniority_percentile=seniority,
+    )
+
+
+def _analytics():
+    return {"award_history": AwardHistory(PAIRINGS, CUTOFFS), "spread": 0.05}
+
+
+def test_single_pairing_layer_tracks_cutoff():
+    hnl = [{"type": "PairingId", "op": "IN", "values": ["A"]}]
+    junior = estimate_success_prob(hnl, _ctx(0.3), _analytics())
+    senior = estimate_success_prob(hnl, _ctx(0.95), _analytics())
+    assert junior < 0.01 < 0.5 < senior
+    open_layer = [{"type": "LayoverCity", "op": "IN", "values": ["ORD"]}]
+    assert estimate_success_prob(open_layer, _ctx(0.0), _analytics()) == pytest.approx(1.0)
+
+
+def test_layer_filters_combine_and_match_any_pairing():
+    ctx = _ctx(0.6)
+    layers = [
+        [{"type": "LayoverCity", "op": "IN", "values": ["HNL"]}],
+        [
+            {"type": "LayoverCity", "op": "IN", "values": ["HNL"]},
+            {"type": "TripLength", "op": ">=", "values": [4]},
+        ],
+        [{"type": "Credit", "op": "BETWEEN", "values": [5, 11]}],
+        [{"type": "LayoverCity", "op": "NOT IN", "values": ["HNL", "ORD", "EWR"]}],
+        [{"type": "ReportTime", "op": "<", "values": ["0600"]}],
+        [{"type": "DutyDate", "op": "IN", "values": ["2025-09-10"]}],
+    ]
+    probs = estimate_layer_probs(layers, ctx, _analytics())
+    hold = AwardHistory(PAIRINGS, CUTOFFS).hold_probs(0.6)
+    assert probs[0] == pytest.approx(1 - (1 - hold[0]) * (1 - hold[1]))
+    assert probs[1] == pytest.approx(hold[0])
+    assert probs[2] == pytest.approx(1.0)
+    assert probs[3] == 0.0
+    assert probs[4] == pytest.approx(1.0)
+    assert probs[5] == pytest.approx(0.5)
+
+
+def test_awardee_is_scored_against_the_next_cutoff():
+    history = AwardHistory(PAIRINGS, CUTOFFS, next_cutoffs={"A": 0.7}, awards={"p1": ["A", "B"]})
+    own = history.hold_probs(0.9, 0.05, "p1")
+    assert own[0] == pytest.approx(1 / (1 + np.exp(-(0.9 - 0.7) / 0.05)))
+    # Nobody else was turned away from B.
+    assert own[1] == 1.0
+    assert history.hold_probs(0.9, 0.05)[0] == pytest.approx(0.5)
+
+    hnl = [{"type": "PairingId", "op": "IN", "values": ["A"]}]
+    prob = estimate_success_prob(hnl, _ctx(0.9), {"award_history": history})
+    assert prob == pytest.approx(own[0])
+
+
+def test_history_store_lookup_and_default():
+    store = AwardHistoryStore()
+    store.put("SFO", "73G", "FO", "2025-09", AwardHistory(PAIRINGS, CUTOFFS))
+    layer = [{"type": "PairingId", "op": "IN", "values": ["B"]}]
+    analytics = {"award_history": store, "month": "2025-09"}
+    assert estimate_success_prob(layer, _ctx(0.6), analytics) == pytest.approx(0.5)
+    assert estimate_success_prob(layer, _ctx(0.6), {"month": "2025-10"}) == 0.5
+    with pytest.raises(ValueError):
+        estimate_success_prob([{"type": "Bogus", "op": "IN", "values": []}], _ctx(0.6), analytics)
+
+
+def test_hundreds_of_layers_score_quickly():
+    rng = np.random.default_rng(0)
+    cities = ["HNL", "ORD", "EWR", "LAX", "DEN"]
+    pairings = [
+        {
+            "id": f"P{i}",
+            "layover_city": cities[i % 5],
+            "trip_length": 1 + i % 4,
+            "block_hours": 5 + i % 20,
+        }
+        for i in range(5000)
+    ]
+    cutoffs = {f"P{i}": float(rng.random()) for i in range(0, 5000, 2)}
+    analytics = {"award_history": AwardHistory(pairings, cutoffs)}
+    layers = [
+        [
+            {"type": "LayoverCity", "op": "IN", "values": [cities[i % 5]]},
+            {"type": "TripLength", "op": "<=", "values": [1 + i % 4]},
+            {"type": "PairingId", "op": "IN", "values": [f"P{j}" for j in range(i, i + 40)]},
+        ]
+        for i in range(300)
+    ]
+    estimate_layer_probs(layers, _ctx(0.4), analytics)
+    start = time.perf_counter()
+    probs = estimate_layer_probs(layers, _ctx(0.4), analytics)
+    assert time.perf_counter() - start < 0.5
+    assert probs.shape == (300,) and ((probs >= 0) & (probs <= 1)).all()
@@ -8,6 +8,7 @@ from typing import Any
 
 from fastapi.testclient import TestClient
 
+from app import legality
 from app.main import app
 
 
@@ -127,6 +128,24 @@ def run_once(n: int, k: int) -> None:
     if lint.get("warnings"):
         print(f"lint.warnings (first 3): {lint['warnings'][:3]}")
 
+    trips = [
+        {
+            "id": f"T{i:05d}",
+            "duty_hours": 8 + i % 6,
+            "flight_time": 4 + i % 5,
+            "rest_hours": 9 + i % 4,
+            "break_minutes": 20 + i % 30,
+        }
+        for i in range(n)
+    ]
+    t0 = time.time()
+    report = legality.validate(trips, {"days_off": 10})
+    elapsed = time.time() - t0
+    print(
+        f"legality: {n / elapsed:,.0f} trips/s "
+        f"({len(report.valid_trips):,} valid, {len(report.rule_hits):,} hits)"
+    )
+
 
 def main():
     ap = argparse.ArgumentParser(description="Benchmark VectorBid pipeline on a large batch.")
@@ -1,6 +1,14 @@
+from itertools import islice
+
 import pytest
 
-from app.parsers.ual_pdf import _parse_trip_block, parse_bid_pdf
+from app.parsers.ual_pdf import (
+    _parse_trip_block,
+    iter_pdf_trips,
+    iter_trip_records,
+    iter_trips,
+    parse_bid_pdf,
+)
 
 FIXTURES = [
     "tests/fixtures/bid_packages/202508_first.txt",
@@ -36,3 +44,60 @@ def test_month_rollover_and_timezone():
     # timezone awareness
     assert leg1.departure.tzinfo is not None
     assert leg1.arrival.tzinfo is not None
+
+
+@pytest.mark.parametrize("chunk_size", [16, 1000, 1 << 20])
+def test_iter_trips_matches_parse_bid_pdf(chunk_size):
+    path = FIXTURES[0]
+    records = list(iter_trips(path, chunk_size=chunk_size))
+    assert [r.to_model() for r in records] == parse_bid_pdf(path)
+    assert isinstance(records[0].legs[0], tuple)
+    assert records[0].legs[0].departure_airport == "IAH"
+
+
+def test_iter_trip_records_shares_tz_per_airport():
+    with open(FIXTURES[0], encoding="utf-8") as fh:
+        records = list(iter_trip_records(fh.read()))
+    tzs = {
+        leg.departure.tzinfo.zone
+        for r in records
+        for leg in r.legs
+        if leg.departure_airport == "IAH"
+    }
+    assert tzs == {"America/Chicago"}
+
+
+def _packet_pdf(lines_per_page: int) -> bytes:
+    """A PDF of the first fixture's text, paged so trip blocks straddle pages."""
+    import pymupdf
+
+    with open(FIXTURES[0], encoding="utf-8") as fh:
+        lines = fh.read().splitlines()[:80]
+    doc = pymupdf.open()
+    for i in range(0, len(lines), lines_per_page):
+        page = doc.new_page(width=1000, height=900)
+        page.insert_text((20, 20), "\n".join(lines[i : i + lines_per_page]), fontname="cour")
+    return doc.tobytes()
+
+
+def _summary(records):
+    return [(r.trip_id, r.credit, [(leg.flight, leg.departure) for leg in r.legs]) for r in records]
+
+
+def test_iter_pdf_trips_joins_blocks_across_pages():
+    with open(FIXTURES[0], encoding="utf-8") as fh:
+        expected = _summary(iter_trip_records("\n".join(fh.read().splitlines()[:80])))
+    assert len(expected) >= 8
+    assert _summary(iter_pdf_trips(_packet_pdf(lines_per_page=7), workers=1)) == expected
+
+
+def test_iter_pdf_trips_parallel_matches_serial():
+    data = _packet_pdf(lines_per_page=7)
+    serial = _summary(iter_pdf_trips(data, workers=1))
+    assert _summary(iter_pdf_trips(data, workers=2, batch=3)) == serial
+
+
+def test_iter_pdf_trips_reads_real_packet():
+    first = list(islice(iter_pdf_trips("bids/202508.pdf", workers=1), 32))
+    with open(FIXTURES[0], encoding="utf-8") as fh:
+        assert first == list(iter_trip_records(fh.read()))
@@ -1,5 +1,6 @@
 from pathlib import Path
 
+from app.audit import flush_events
 from app.db import Audit, SessionLocal
 from app.ingestion.packet import parse_bid_packet
 from app.models import ContextSnapshot, FeatureBundle, PreferenceSchema
@@ -42,6 +43,7 @@ def test_audit_trail_created():
     rules = load_rule_pack("rule_packs/UAL/2025.08.yml")
     validate_feasibility(bundle, rules)
     select_topk(bundle, K=1)
+    flush_events()
 
     with SessionLocal() as db:
         rows = db.query(Audit).filter_by(ctx_id=ctx.ctx_id).all()
@@ -361,5 +361,87 @@ class TestDSLParserIntegration:
         assert result is True
 
 
+class TestCompiledFunctions:
+    """Test lowering to plain functions and fused rule packs."""
+
+    def test_compiled_expression_is_thread_safe(self):
+        """Concurrent calls must not see each other's obj/ctx."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        parser = DSLParser()
+        func = parser.compile_expr("obj.duty_hours + ctx['bonus']")
+
+        def run(i):
+            return [func(Mock(duty_hours=i), {"bonus": i}) for _ in range(200)]
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(run, range(16)))
+        assert all(set(r) == {2 * i} for i, r in enumerate(results))
+
+    def test_unknown_name_raises_at_call(self):
+        """Names outside obj/ctx/safe functions fail when evaluated."""
+        parser = DSLParser()
+        func = parser.compile_expr("pairing > 3")
+
+        with pytest.raises(NameError):
+            func(None, None)
+
+    def test_compile_pack_reports_failing_rules(self):
+        """A fused pack returns failing rule ids in pack order."""
+        parser = DSLParser()
+        pack = parser.compile_pack(
+            [
+                {"id": "DUTY", "check": "obj.duty_hours <= 16"},
+                {"id": "REST", "check": "obj.rest_hours >= 10"},
+                {"id": "BROKEN", "check": "obj.missing.attr > 1"},
+            ]
+        )
+
+        assert pack.rule_ids == ("DUTY", "REST", "BROKEN")
+        obj = Mock(duty_hours=17, rest_hours=12, spec=["duty_hours", "rest_hours"])
+        assert pack(obj, {}) == ["DUTY", "BROKEN"]
+        assert parser.get_stats()["rules_compiled"] == 3
+
+    def test_compile_pack_from_rule_pack(self):
+        """compile_pack accepts a compiled RulePack."""
+        from app.rules_engine import compile_rule_pack
+
+        rule_pack = compile_rule_pack(
+            {
+                "airline": "TEST",
+                "version": "2025.08",
+                "effective_start": "2025-08-01",
+                "hard": [{"id": "DUTY_LIMIT", "check": "obj.duty_hours <= 16"}],
+            }
+        )
+        pack = DSLParser().compile_pack(rule_pack)
+
+        assert pack(Mock(duty_hours=12), {}) == []
+        assert pack(Mock(duty_hours=20), {}) == ["DUTY_LIMIT"]
+
+    def test_compile_pack_rejects_unsafe_rule(self):
+        """Unsafe expressions are rejected with the rule id."""
+        parser = DSLParser()
+
+        with pytest.raises(DSLSecurityError, match="rule EVIL"):
+            parser.compile_pack([{"id": "EVIL", "check": "obj.__class__"}])
+
+    def test_underscore_access_is_rejected_anywhere_in_a_chain(self):
+        """Neither nested attributes nor names may start with an underscore."""
+        parser = DSLParser()
+
+        for expr in (
+            "get(obj, 'x').__class__",
+            "get(obj, 'x').__class__.__bases__",
+            "obj.legs._private",
+            "get(obj, '__dict__')",
+            "_failed",
+        ):
+            with pytest.raises(DSLSecurityError):
+                parser.compile_expr(expr)
+            with pytest.raises(DSLSecurityError):
+                parser.compile_pack([{"id": "EVIL", "check": expr}])
+
+
 # Test markers for pytest
 pytestmark = [pytest.mark.dsl, pytest.mark.rules_engine, pytest.mark.unit]
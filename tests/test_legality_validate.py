@@ -122,3 +122,91 @@ def test_min_break_minutes_rule() -> None:
     report = validate(trips, context)
     assert {t["id"] for t in report.valid_trips} == {"T1"}
     assert any(hit.id == "MIN_BREAK_MINUTES" and hit.trip_id == "T2" for hit in report.rule_hits)
+
+
+def test_context_rule_mentioning_trip_in_a_string_runs_once() -> None:
+    from app.legality.validate import CompiledLegality, Rule
+
+    engine = CompiledLegality(
+        [
+            Rule(
+                id="TRIP_POLICY",
+                desc="Context-only rule whose text mentions trip",
+                clause="X",
+                severity="hard",
+                evaluate="context.get('trip_policy', 'none') == 'strict'",
+            )
+        ]
+    )
+    trips = [{"id": "T1"}, {"id": "T2"}]
+    report = engine.validate(trips, {"trip_policy": "loose"})
+    assert [h.trip_id for h in report.rule_hits] == [None]
+    assert report.valid_trips == trips
+
+
+def test_missing_fields_fall_back_per_trip() -> None:
+    trips = [
+        {"id": "T1", "duty_hours": 13},
+        {"id": "T2", "duty_hours": "n/a"},
+        {"id": "T3"},
+    ]
+    report = validate(trips, {"days_off": 10})
+    hits = {(h.id, h.trip_id) for h in report.rule_hits}
+    assert ("MAX_DUTY_HOURS", "T1") in hits
+    assert ("MAX_DUTY_HOURS", "T2") in hits
+    assert ("MIN_REST_HOURS", "T3") in hits
+    assert report.valid_trips == []
+
+
+def test_rule_rejected_by_the_dsl_fails_closed() -> None:
+    from app.legality.validate import CompiledLegality, Rule
+
+    engine = CompiledLegality(
+        [
+            Rule(
+                id="NUMERIC_DUTY",
+                desc="Duty hours must be numeric",
+                clause="X",
+                severity="hard",
+                evaluate="isinstance(trip.get('duty_hours'), (int, float))",
+            ),
+            Rule(
+                id="ESCAPE",
+                desc="Sandbox escape",
+                clause="Y",
+                severity="soft",
+                evaluate="context.__class__ is dict",
+            ),
+            Rule(id="BROKEN", desc="Unparseable", clause="Z", severity="soft", evaluate="trip ="),
+        ]
+    )
+    trips = [{"id": "T1", "duty_hours": 9}, {"id": "T2", "duty_hours": "n/a"}]
+    report = engine.validate(trips, {})
+    assert report.valid_trips == []
+    assert {(h.id, h.trip_id) for h in report.rule_hits} == {
+        ("NUMERIC_DUTY", "T1"),
+        ("NUMERIC_DUTY", "T2"),
+        ("ESCAPE", None),
+        ("BROKEN", "T1"),
+        ("BROKEN", "T2"),
+    }
+
+
+def test_rule_scope_comes_from_the_names_it_reads() -> None:
+    from app.legality.validate import CompiledLegality, Rule
+
+    engine = CompiledLegality(
+        [
+            Rule(
+                id="TRIP_CAP",
+                desc="Context rule with trip in a key",
+                clause="X",
+                severity="hard",
+                evaluate="isinstance(context.get('trip_cap'), int)",
+            )
+        ]
+    )
+    assert engine.trip_rules == []
+    report = engine.validate([{"id": "T1"}], {"trip_cap": 3})
+    assert [h.trip_id for h in report.rule_hits] == [None]
+    assert report.valid_trips == [{"id": "T1"}]
@@ -0,0 +1,140 @@
+"""
+Tests for the vectorized rule-pack backend.
+
+Every rule must give the same pass/fail mask as per-row evaluation.
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from app.rules_engine import ColumnTable, compile_pack_vectorized
+from app.rules_engine.dsl import DSLSecurityError
+
+RULES = [
+    {
+        "id": "MAX_DUTY_HOURS",
+        "evaluate": "trip.get('duty_hours', 0) <= context.get('max_duty_hours', 12)",
+    },
+    {"id": "MIN_REST", "check": "pairing.rest_hours >= 10"},
+    {"id": "BREAK", "check": "trip.get('break_minutes', 0) >= 30"},
+    {"id": "HUBS", "check": "obj.city not in ['EWR', 'JFK'] or obj.rest_hours > 14"},
+    {"id": "RANGE", "check": "8 <= obj.rest_hours < 15 and not obj.redeye"},
+    {"id": "MIXED", "check": "max(obj.block, 2) * 2 - abs(obj.rest_hours - 12) > 5"},
+    {"id": "RATIO", "check": "obj.block / obj.duty < 0.9"},
+    {"id": "ROUNDED", "check": "round(obj.duty) < 12"},
+    {"id": "CTX_ONLY", "check": "ctx.get('days_off', 0) >= 8"},
+]
+
+
+def _records(n=2000, seed=7):
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        rec = {
+            "id": f"P{i}",
+            "duty_hours": rng.uniform(5, 14),
+            "rest_hours": rng.uniform(8, 16),
+            "city": rng.choice(["EWR", "SFO", "JFK", "DEN"]),
+            "block": rng.uniform(1, 8),
+            "duty": rng.choice([0.0, 5.0, 9.0, 12.5]),
+            "redeye": rng.random() < 0.2,
+        }
+        if i % 9 == 0:
+            del rec["duty_hours"]
+        out.append(rec)
+    return out
+
+
+def _per_row(pack, records, ctx):
+    return np.array([[rule._row(r, ctx) for rule in pack.rules] for r in records])
+
+
+class TestVectorPack:
+    """Vectorized masks against per-row evaluation."""
+
+    def test_masks_match_per_row(self):
+        pack = compile_pack_vectorized(RULES)
+        records = _records()
+        ctx = {"max_duty_hours": 12, "days_off": 9}
+
+        masks = pack.evaluate(records, ctx)
+
+        assert masks.shape == (len(records), len(RULES))
+        np.testing.assert_array_equal(masks, _per_row(pack, records, ctx))
+        assert masks[:, pack.rule_ids.index("CTX_ONLY")].all()
+
+    def test_vectorizable_rules_are_lowered(self):
+        pack = compile_pack_vectorized(RULES)
+        lowered = {r.rule_id for r in pack.rules if r.vectorized}
+
+        assert "ROUNDED" not in lowered
+        assert {"MAX_DUTY_HOURS", "MIN_REST", "HUBS", "RANGE", "MIXED"} <= lowered
+
+    def test_missing_field_falls_back_and_fails_row(self):
+        pack = compile_pack_vectorized([{"id": "REST", "check": "pairing.rest_hours >= 10"}])
+        records = [{"rest_hours": 12}, {"id": "no-rest"}, {"rest_hours": 8}]
+
+        assert pack.feasible(records, {}).tolist() == [True, False, False]
+
+    def test_mixed_type_column_matches_per_row(self):
+        pack = compile_pack_vectorized(
+            [
+                {"id": "EQ", "check": "obj.seat == 1"},
+                {"id": "NE", "check": "obj.seat != 2"},
+                {"id": "IN", "check": "obj.seat in [1, 'CA']"},
+            ]
+        )
+        records = [{"seat": 1}, {"seat": "1"}, {"seat": 2}, {"seat": "CA"}, {"seat": True}]
+
+        masks = pack.evaluate(records, {})
+
+        np.testing.assert_array_equal(masks, _per_row(pack, records, {}))
+        assert masks[:, 0].tolist() == [True, False, False, False, True]
+
+    def test_and_or_used_as_values_match_per_row(self):
+        pack = compile_pack_vectorized(
+            [
+                {"id": "OR", "check": "(pairing.rest_hours or 999) >= 10"},
+                {"id": "AND", "check": "(pairing.duty and 20) > 10"},
+                {"id": "NOT", "check": "not (pairing.duty and pairing.rest_hours < 10)"},
+            ]
+        )
+        records = [
+            {"rest_hours": 0, "duty": 0},
+            {"rest_hours": 12, "duty": 5},
+            {"rest_hours": 8, "duty": 30},
+        ]
+
+        masks = pack.evaluate(records, {})
+
+        np.testing.assert_array_equal(masks, _per_row(pack, records, {}))
+        assert masks.T.tolist() == [[True, True, False], [False, True, True], [True, True, False]]
+        assert [r.vectorized for r in pack.rules] == [False, False, True]
+
+    def test_membership_in_a_mixed_literal_list_matches_per_row(self):
+        pack = compile_pack_vectorized([{"id": "IN", "check": "pairing.rest_hours in [12, 'x']"}])
+        records = [{"rest_hours": 12}, {"rest_hours": 8}, {"rest_hours": 10}]
+
+        masks = pack.evaluate(records, {})
+
+        np.testing.assert_array_equal(masks, _per_row(pack, records, {}))
+        assert masks[:, 0].tolist() == [True, False, False]
+
+    def test_columns_are_shared_across_rules(self):
+        pack = compile_pack_vectorized(RULES[:2])
+        table = ColumnTable(_records(50))
+
+        pack.evaluate(table, {})
+        first = table.column("rest_hours")
+        pack.evaluate(table, {})
+
+        assert table.column("rest_hours") is first
+
+    def test_unsafe_rule_rejected(self):
+        with pytest.raises(DSLSecurityError, match="rule EVIL"):
+            compile_pack_vectorized([{"id": "EVIL", "check": "trip.get('__class__')"}])
+
+
+pytestmark = [pytest.mark.rules_engine, pytest.mark.unit]